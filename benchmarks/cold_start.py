@@ -0,0 +1,119 @@
+"""
+generator 콜드 스타트: 체크포인트 로드 시간·피크 RSS·첫 추론까지 시간을 포맷별로, 매번 새 프로세스에서 잰다.
+  - ckpt_copy:   예전 경로 (make_generator → torch.load → load_state_dict 복사)
+  - ckpt_mmap:   torch.load(mmap=True) + meta 장치 생성 + assign
+  - safetensors: modules/flat_weights 로 변환한 파일을 mmap + assign
+매 실행 전에 posix_fadvise(DONTNEED) 로 가중치 파일을 page cache 에서 내린다 (root 불필요, --warm 이면 생략).
+
+    python -m benchmarks.cold_start --repeat 3 --out cold_start.json
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import DEFAULT_CONFIG, ROOT_DIR, write_random_checkpoint_config
+
+MODES = ["ckpt_copy", "ckpt_mmap", "safetensors"]
+
+
+def _evict(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def child(mode, config_path, weights_path, size):
+    import torch
+    from modules import predict_lama
+    from modules.procmem import memory_usage
+    from saicinpainting.training.modules import make_generator
+
+    torch.set_num_threads(1)
+    config = predict_lama._read_config(config_path)
+    rss_before = memory_usage()["rss"]
+    start = time.perf_counter()
+    if mode == "ckpt_copy":
+        model = make_generator(**config.generator)
+        model.load_state_dict(torch.load(weights_path, map_location="cpu"), strict=False)
+        model.eval()
+    else:
+        model = predict_lama._load_checkpoint(config, Path(weights_path))
+    load_s = time.perf_counter() - start
+    rss_after_load = memory_usage()["rss"]
+    with torch.no_grad():
+        model(torch.rand(1, 4, size, size))
+    first_inference_s = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    mb = 2 ** 20
+    print(json.dumps({
+        "load_ms": load_s * 1000,
+        "to_first_inference_ms": first_inference_s * 1000,
+        "load_rss_mb": (rss_after_load - rss_before) / mb,
+        "peak_rss_over_baseline_mb": (peak_rss - rss_before) / mb,
+    }))
+
+
+def run(mode, config_path, weights_path, size, cold):
+    if cold:
+        _evict(weights_path)
+    out = subprocess.check_output(
+        [sys.executable, "-m", "benchmarks.cold_start", "--child", mode, str(config_path), str(weights_path),
+         "--size", str(size)],
+        cwd=ROOT_DIR, text=True, stderr=subprocess.DEVNULL)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "CONFIG", "WEIGHTS"), help=argparse.SUPPRESS)
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--ckpt", default=None, help="기존 .ckpt (없으면 랜덤 초기화 체크포인트)")
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--warm", action="store_true", help="page cache 를 비우지 않음")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child, size=args.size)
+        return
+
+    from modules.flat_weights import convert
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        config_path = write_random_checkpoint_config(tmp / "model", args.config, device="cpu")
+        ckpt = Path(args.ckpt) if args.ckpt else tmp / "model" / "models" / "random_generator.ckpt"
+        flat = convert(ckpt, tmp / "generator.safetensors")
+        weights = {"ckpt_copy": ckpt, "ckpt_mmap": ckpt, "safetensors": flat}
+        weights_mb = ckpt.stat().st_size / 2 ** 20
+        for mode in args.modes:
+            runs = [run(mode, config_path, weights[mode], args.size, cold=not args.warm) for _ in range(args.repeat)]
+            results[mode] = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+            row = results[mode]
+            print(f"{mode:<12} load {row['load_ms']:8.1f} ms  "
+                  f"to first inference {row['to_first_inference_ms']:8.1f} ms  load RSS {row['load_rss_mb']:7.1f} MB  peak RSS {row['peak_rss_over_baseline_mb']:7.1f} MB",
+                  file=sys.stderr, flush=True)
+
+    report = {"weights_mb": weights_mb, "cold": not args.warm, "size": args.size, "results": results}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
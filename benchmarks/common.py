@@ -0,0 +1,106 @@
+import io
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+import yaml
+from omegaconf import OmegaConf
+from PIL import Image, ImageDraw
+
+from saicinpainting.training.modules import make_generator
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_CONFIG = ROOT_DIR / "modules" / "configs" / "prediction" / "lama-fourier.yaml"
+
+
+def load_generator_config(config_path=DEFAULT_CONFIG, **overrides):
+    """generator 섹션을 dict 로 읽는다 (${...} 보간 해소). overrides 로 키 덮어쓰기."""
+    with open(config_path, "r") as f:
+        config = OmegaConf.create(yaml.safe_load(f))
+    generator = OmegaConf.to_container(config.generator, resolve=True)
+    generator.update(overrides)
+    return generator
+
+
+def build_generator(config_path=DEFAULT_CONFIG, ckpt_path=None, device="cpu", **overrides):
+    """체크포인트가 없으면 랜덤 초기화 가중치로 만든다 (타이밍 용도로는 충분)."""
+    model = make_generator(**load_generator_config(config_path, **overrides))
+    if ckpt_path is not None:
+        model.load_state_dict(torch.load(ckpt_path, map_location="cpu"), strict=False)
+    return model.eval().to(device)
+
+
+def write_random_checkpoint_config(out_dir, config_path=DEFAULT_CONFIG, device="cpu", seed=0, **generator_overrides):
+    """
+    랜덤 초기화 generator 체크포인트와 그걸 가리키는 예측 설정 파일을 out_dir 에 쓴다.
+    실제 체크포인트 없이 run_lama_for_uid / FastAPI 앱 전체를 돌려보기 위한 것.
+    """
+    out_dir = Path(out_dir)
+    with open(config_path, "r") as f:
+        config = OmegaConf.create(yaml.safe_load(f))
+    config.generator = load_generator_config(config_path, **generator_overrides)
+    config.device = device
+    config.pretrained.path = str(out_dir)
+    config.pretrained.generator_checkpoint = "random_generator.ckpt"
+
+    torch.manual_seed(seed)
+    ckpt_path = out_dir / "models" / config.pretrained.generator_checkpoint
+    ckpt_path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save(make_generator(**config.generator).state_dict(), ckpt_path)
+
+    out_config = out_dir / "config.yaml"
+    out_config.write_text(OmegaConf.to_yaml(config, resolve=True), encoding="utf-8")
+    return out_config
+
+
+def make_character_image(width, height, seed=0):
+    """투명 배경 위의 캐릭터 비슷한 RGBA 그림 (몸통 타원 + 팔다리 선 + 외곽선)."""
+    rng = np.random.default_rng(seed)
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    cx, cy = width / 2, height / 2
+    rx, ry = width * 0.22, height * 0.3
+    fill = tuple(int(c) for c in rng.integers(60, 255, 3)) + (255,)
+    draw.ellipse([cx - rx, cy - ry, cx + rx, cy + ry], fill=fill, outline=(0, 0, 0, 255),
+                 width=max(2, width // 100))
+    stroke = max(3, min(width, height) // 40)
+    for _ in range(4):
+        x0, y0 = cx + rng.uniform(-rx, rx), cy + rng.uniform(-ry, ry)
+        x1, y1 = rng.uniform(0.05, 0.95) * width, rng.uniform(0.05, 0.95) * height
+        draw.line([x0, y0, x1, y1], fill=(0, 0, 0, 255), width=stroke)
+    return img
+
+
+def encode_image(img, fmt="png"):
+    buf = io.BytesIO()
+    if fmt.lower() in ("jpg", "jpeg"):
+        img.convert("RGB").save(buf, format="JPEG", quality=90)
+    else:
+        img.save(buf, format=fmt.upper())
+    return buf.getvalue()
+
+
+def _sync(device):
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize()
+
+
+def time_fn(fn, repeat=10, warmup=2, device="cpu"):
+    """fn() 을 repeat 번 재서 ms 단위 통계를 돌려준다."""
+    for _ in range(warmup):
+        fn()
+    _sync(device)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        _sync(device)
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "mean_ms": statistics.mean(times),
+        "median_ms": statistics.median(times),
+        "min_ms": min(times),
+        "repeat": repeat,
+    }
@@ -0,0 +1,113 @@
+"""
+큰 업로드 디코드 비용: 예전 경로(원본 크기 디코드 → RGBA, 필요하면 그 뒤에 축소) vs modules/decode.decode_rgba
+(JPEG draft / reduce 로 처음부터 작게 + 줄인 뒤 EXIF 방향 적용). 라마 입력 PNG 저장까지 포함한 시간도 잰다
+(예전: compress_level 6, 지금: INPUT_PNG_COMPRESS_LEVEL).
+입력은 사진 비슷한 합성 이미지 (EXIF orientation=6 을 넣은 JPEG, RGBA PNG).
+
+    python -m benchmarks.decode --max-side 1024 2048 --out decode.json
+"""
+import argparse
+import io
+import json
+import math
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.common import time_fn
+from modules.decode import INPUT_PNG_COMPRESS_LEVEL, decode_rgba, fit_size
+
+DEFAULT_INPUTS = ["4032x3024.jpg", "6000x4000.jpg", "3840x2160.png"]
+
+
+def make_photo(width, height, seed=0):
+    """저주파 색 + 고주파 잡음 — JPEG 압축률이 실제 사진과 비슷하게."""
+    rng = np.random.default_rng(seed)
+    low = Image.fromarray(rng.integers(0, 255, (max(2, height // 256), max(2, width // 256), 3), dtype=np.uint8))
+    image = np.asarray(low.resize((width, height), Image.Resampling.BICUBIC), dtype=np.int16)
+    image = image + rng.integers(-12, 12, image.shape, dtype=np.int16)
+    return Image.fromarray(np.clip(image, 0, 255).astype(np.uint8))
+
+
+def write_input(path, width, height):
+    image = make_photo(width, height)
+    if path.suffix == ".jpg":
+        exif = Image.Exif()
+        exif[0x0112] = 6  # 90° 돌려서 찍은 폰 사진
+        image.save(path, format="JPEG", quality=90, exif=exif)
+    else:
+        alpha = Image.new("L", image.size, 0)
+        alpha.paste(255, (width // 8, height // 8, width * 7 // 8, height * 7 // 8))
+        image.putalpha(alpha)
+        image.save(path, format="PNG")
+
+
+def old_decode(path, max_side):
+    """예전 _ensure_png_for_lama (방향 무시) + 이후 단계에서 하던 것 같은 축소."""
+    with Image.open(path) as im:
+        im = im.convert("RGBA")
+    target = fit_size(im.size, max_side)
+    return im.resize(target, Image.Resampling.LANCZOS) if target != im.size else im
+
+
+def _save_png(im, compress_level=6):
+    im.save(io.BytesIO(), format="PNG", compress_level=compress_level)
+
+
+def psnr(a, b):
+    mse = np.mean((np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)) ** 2)
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--inputs", nargs="+", default=DEFAULT_INPUTS, help="WIDTHxHEIGHT.(jpg|png)")
+    parser.add_argument("--max-side", nargs="+", type=int, default=[1024, 2048])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.inputs:
+            width, height = (int(v) for v in Path(name).stem.split("x"))
+            path = Path(tmp) / name
+            write_input(path, width, height)
+            for max_side in [0, *args.max_side]:
+                old = old_decode(path, max_side)
+                new = decode_rgba(path, max_side)
+                # 방향만 맞춰서 비교 (예전 경로는 EXIF 를 무시했다)
+                reference = old.transpose(Image.Transpose.ROTATE_270) if path.suffix == ".jpg" else old
+                row = {
+                    "input": name,
+                    "megapixels": width * height / 1e6,
+                    "max_side": max_side,
+                    "output_size": list(new.size),
+                    "old_decode": time_fn(lambda: old_decode(path, max_side), args.repeat, warmup=1),
+                    "new_decode": time_fn(lambda: decode_rgba(path, max_side), args.repeat, warmup=1),
+                    "old_decode_and_save": time_fn(lambda: _save_png(old_decode(path, max_side)),
+                                                   args.repeat, warmup=0),
+                    "new_decode_and_save": time_fn(lambda: _save_png(decode_rgba(path, max_side),
+                                                                     INPUT_PNG_COMPRESS_LEVEL),
+                                                   args.repeat, warmup=0),
+                    "psnr_vs_old_db": psnr(new, reference) if new.size == reference.size else None,
+                }
+                results.append(row)
+                print(f"{name:<15} max_side {max_side:>5} -> {new.size[0]}x{new.size[1]:<5} "
+                      f"decode {row['old_decode']['median_ms']:7.1f} -> {row['new_decode']['median_ms']:7.1f} ms  "
+                      f"+png {row['old_decode_and_save']['median_ms']:7.1f} -> "
+                      f"{row['new_decode_and_save']['median_ms']:7.1f} ms  psnr {row['psnr_vs_old_db']}",
+                      file=sys.stderr, flush=True)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+convl2l + convl2g 융합(fuse_ffc_local_convs) 전후로 9개 bottleneck 블록을 블록별로 잰다.
+
+    python -m benchmarks.ffc_fused --size 512 --device cpu
+"""
+import argparse
+import copy
+import json
+
+import torch
+
+from benchmarks.common import DEFAULT_CONFIG, build_generator, time_fn
+from saicinpainting.training.modules.ffc import FFCResnetBlock, fuse_ffc_local_convs
+
+
+def _bottleneck_input(model, size, device):
+    # resnet 블록 직전까지 흘려서 실제 (x_l, x_g) 모양을 얻는다
+    x = torch.rand(1, model.model[1].ffc.convl2l.in_channels, size, size, device=device)
+    for layer in model.model:
+        if isinstance(layer, FFCResnetBlock):
+            break
+        x = layer(x)
+    return x
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--ckpt", default=None)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    model = build_generator(args.config, args.ckpt, args.device)
+    fused = fuse_ffc_local_convs(copy.deepcopy(model))
+
+    results = []
+    with torch.no_grad():
+        x = _bottleneck_input(model, args.size, args.device)
+        blocks = [m for m in model.model if isinstance(m, FFCResnetBlock)]
+        fused_blocks = [m for m in fused.model if isinstance(m, FFCResnetBlock)]
+        for i, (block, fused_block) in enumerate(zip(blocks, fused_blocks)):
+            ref, out = block(x), fused_block(x)
+            max_diff = max((r - o).abs().max().item() for r, o in zip(ref, out))
+            results.append({
+                "block": i,
+                "baseline": time_fn(lambda: block(x), args.repeat, device=args.device),
+                "fused": time_fn(lambda: fused_block(x), args.repeat, device=args.device),
+                "max_abs_diff": max_diff,
+            })
+            x = ref
+
+    for r in results:
+        print(f"block {r['block']}: {r['baseline']['median_ms']:.2f} ms -> {r['fused']['median_ms']:.2f} ms "
+              f"(max diff {r['max_abs_diff']:.2e})")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+구멍 채우기 백엔드 비교 (modules/hole_fill.py): telea vs push_pull.
+정답 이미지(캐릭터 그림 + 그라디언트/줄무늬 배경)에 마스크를 씌워 채운 뒤, 마스크 영역 PSNR 과 시간을 잰다.
+마스크: 면적 비율별 랜덤 원판 + 실제 파이프라인 모양(캐릭터 밖 투명 배경 전체 + 외곽선 띠).
+
+    python -m benchmarks.hole_fill --sizes 512 1024 --coverage 0.01 0.05 0.2 0.5 --out hole_fill.json
+"""
+import argparse
+import json
+import math
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+from benchmarks.common import make_character_image, time_fn
+from modules.hole_fill import FILL_BACKENDS, fill_holes
+
+
+def make_ground_truth(size, seed=0):
+    """(3, H, W) uint8: 알파로 합성한 캐릭터 + 부드러운 배경. 반환: (이미지, 캐릭터 알파 (H, W) uint8)."""
+    rng = np.random.default_rng(seed)
+    character = np.asarray(make_character_image(size, size, seed=seed).convert("RGBA"), dtype=np.float32)
+    yy, xx = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    background = np.stack([
+        200 * xx + 30,
+        120 + 60 * np.sin(6 * math.pi * yy),
+        180 * (1 - yy) + 40 * np.cos(4 * math.pi * xx),
+    ], axis=2)
+    background += rng.normal(0, 4, background.shape)
+    alpha = character[:, :, 3:4] / 255
+    image = character[:, :, :3] * alpha + background * (1 - alpha)
+    return np.clip(image, 0, 255).astype(np.uint8).transpose(2, 0, 1), character[:, :, 3].astype(np.uint8)
+
+
+def disk_mask(size, coverage, seed=0):
+    """면적 비율이 coverage 에 닿을 때까지 랜덤 원판을 찍는다."""
+    rng = np.random.default_rng(seed)
+    mask = np.zeros((size, size), np.uint8)
+    radius_range = (max(2, size // 64), max(3, size // 12))
+    while mask.mean() / 255 < coverage:
+        center = tuple(int(v) for v in rng.integers(0, size, 2))
+        cv2.circle(mask, center, int(rng.integers(*radius_range)), 255, -1)
+    return mask > 0
+
+
+def pipeline_mask(alpha, band=3):
+    """predict_lama 와 같은 모양: 불투명하지 않은 곳 전부 + 캐릭터 외곽선 안쪽 band px (모델 예측 대신)."""
+    kernel = np.ones((2 * band + 1, 2 * band + 1), np.uint8)
+    edge = cv2.morphologyEx((alpha == 255).astype(np.uint8), cv2.MORPH_GRADIENT, kernel)
+    return (alpha < 255) | (edge > 0)
+
+
+def masked_psnr(filled, truth, holes):
+    diff = (filled.astype(np.float64) - truth.astype(np.float64))[:, holes]
+    mse = float(np.mean(diff ** 2))
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def compare(truth, holes, backends, device, repeat, batch):
+    images = torch.from_numpy(truth)[None].repeat(batch, 1, 1, 1).to(device)
+    hole_t = torch.from_numpy(holes)[None, None].repeat(batch, 1, 1, 1).to(device)
+    images = torch.where(hole_t, torch.zeros_like(images), images)  # 구멍 속 원래 색은 보이지 않게
+    row = {"coverage": float(holes.mean())}
+    for backend in backends:
+        filled = fill_holes(images, hole_t, backend)
+        row[backend] = {
+            "psnr_db": masked_psnr(filled[0].cpu().numpy(), truth, holes),
+            **time_fn(lambda: fill_holes(images, hole_t, backend), repeat, warmup=1, device=device),
+        }
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", type=int, default=[512, 1024])
+    parser.add_argument("--coverage", nargs="+", type=float, default=[0.01, 0.05, 0.2, 0.5])
+    parser.add_argument("--backends", nargs="+", default=list(FILL_BACKENDS), choices=list(FILL_BACKENDS))
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--batch", type=int, default=1, help="배치 크기 (telea 는 이미지마다 순차)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        truth, alpha = make_ground_truth(size)
+        masks = {f"disks_{c:g}": disk_mask(size, c) for c in args.coverage}
+        masks["pipeline"] = pipeline_mask(alpha)
+        for name, holes in masks.items():
+            row = {"size": size, "mask": name, **compare(truth, holes, args.backends, args.device, args.repeat,
+                                                          args.batch)}
+            results.append(row)
+            print(f"{size:>5} {name:<12} cov {row['coverage']:5.2f}  " + "  ".join(
+                f"{b} {row[b]['psnr_db']:5.1f} dB {row[b]['median_ms']:8.1f} ms" for b in args.backends),
+                file=sys.stderr, flush=True)
+
+    text = json.dumps({"device": args.device, "batch": args.batch, "results": results}, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
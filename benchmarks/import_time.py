@@ -0,0 +1,85 @@
+"""
+워커 부팅 비용: 새 프로세스에서 모듈 import 에 걸리는 시간과 import 직후 RSS, 무거운 의존성이 딸려 오는지.
+-X importtime 으로 누적 시간이 큰 모듈도 같이 뽑는다.
+
+    python -m benchmarks.import_time --repeat 5 --out import_time.json
+    python -m benchmarks.import_time --modules main modules.predict_lama saicinpainting.training.modules
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.common import ROOT_DIR
+
+DEFAULT_MODULES = ["main", "modules.predict_lama", "saicinpainting.training.modules"]
+HEAVY_MODULES = ["torchvision", "kornia", "torch._dynamo", "saicinpainting.training.data.datasets",
+                 "saicinpainting.training.modules.pix2pixhd", "saicinpainting.training.modules.spatial_transform"]
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+from modules.procmem import memory_usage
+print(json.dumps({{"import_ms": elapsed * 1000, "rss_mb": memory_usage()["rss"] / 2 ** 20,
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _run(module, env):
+    out = subprocess.check_output([sys.executable, "-c", _CHILD.format(module=module, heavy=HEAVY_MODULES)],
+                                  cwd=ROOT_DIR, env=env, text=True, stderr=subprocess.DEVNULL)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _top_imports(module, env, limit):
+    """-X importtime 출력에서 누적 시간 상위 모듈 (ms)."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT_DIR, env=env, text=True, capture_output=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, name.strip()))
+    return [{"module": name, "cumulative_ms": ms} for ms, name in sorted(rows, reverse=True)[:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # main 은 import 시점에 저장소 디렉토리를 만든다
+        env = dict(os.environ, CHARACTERS_STORE_DIR=str(Path(tmp) / "characters"))
+        for module in args.modules:
+            runs = [_run(module, env) for _ in range(args.repeat)]
+            report[module] = {
+                "import_ms": statistics.median(r["import_ms"] for r in runs),
+                "rss_mb": statistics.median(r["rss_mb"] for r in runs),
+                "heavy_loaded": runs[-1]["loaded"],
+                "top_imports": _top_imports(module, env, args.top),
+            }
+            row = report[module]
+            print(f"{module:<36} {row['import_ms']:8.1f} ms  {row['rss_mb']:7.1f} MB  heavy: {row['heavy_loaded']}",
+                  file=sys.stderr, flush=True)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+generator 최대 활성값 메모리: module(x) vs lean_forward (saicinpainting/training/modules/lean_inference.py).
+modules/memtrack.TensorMemoryTracker 로 추론 중 새로 잡힌 텐서 바이트의 최댓값을 재고, 시간과 출력 차이도 본다.
+BatchNorm 통계는 랜덤으로 흔들어서 (랜덤 초기화는 항등 정규화라) in-place 정규화 경로가 실제 값으로 비교되게 한다.
+
+    python -m benchmarks.lean_inference --size 512 1024 --out lean_inference.json
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import torch
+
+from benchmarks.common import DEFAULT_CONFIG, build_generator, load_generator_config, time_fn
+from modules.memtrack import TensorMemoryTracker
+from saicinpainting.training.modules.lean_inference import DEFAULT_TILE_BYTES, lean_forward
+
+
+def _randomize_norms(model, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            for tensor, low, high in ((module.running_mean, -0.1, 0.1), (module.running_var, 0.5, 1.5),
+                                      (module.weight.data, 0.5, 1.5), (module.bias.data, -0.1, 0.1)):
+                tensor.copy_(torch.rand(tensor.shape, generator=generator) * (high - low) + low)
+    return model
+
+
+def _measure(fn):
+    with torch.no_grad(), TensorMemoryTracker() as tracker:
+        out = fn()
+    return out, {"peak_mb": tracker.peak_bytes / 2 ** 20, "allocations": tracker.allocations,
+                 "allocated_mb": tracker.allocated_bytes / 2 ** 20}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--ckpt", default=None)
+    parser.add_argument("--size", nargs="+", type=int, default=[512, 1024])
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--tile-mb", type=float, default=DEFAULT_TILE_BYTES / 2 ** 20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    model = build_generator(args.config, args.ckpt, args.device)
+    if args.ckpt is None:
+        _randomize_norms(model)
+    tile_bytes = int(args.tile_mb * 2 ** 20)
+    input_nc = load_generator_config(args.config)["input_nc"]
+
+    results = []
+    for size in args.size:
+        x = torch.rand(1, input_nc, size, size, device=args.device)
+        ref, module_memory = _measure(lambda: model(x))
+        out, lean_memory = _measure(lambda: lean_forward(model, x, tile_bytes))
+        with torch.no_grad():
+            row = {
+                "size": size,
+                "module": {**module_memory, **time_fn(lambda: model(x), args.repeat, warmup=1, device=args.device)},
+                "lean": {**lean_memory, **time_fn(lambda: lean_forward(model, x, tile_bytes), args.repeat,
+                                                  warmup=1, device=args.device)},
+                "max_abs_diff": (ref - out).abs().max().item(),
+            }
+        row["peak_reduction"] = 1 - lean_memory["peak_mb"] / module_memory["peak_mb"]
+        results.append(row)
+        print(f"{size}px peak {module_memory['peak_mb']:.1f} -> {lean_memory['peak_mb']:.1f} MB "
+              f"(-{row['peak_reduction']:.0%}), allocated {module_memory['allocated_mb']:.0f} -> "
+              f"{lean_memory['allocated_mb']:.0f} MB, {row['module']['median_ms']:.0f} -> "
+              f"{row['lean']['median_ms']:.0f} ms, max diff {row['max_abs_diff']:.1e}", file=sys.stderr, flush=True)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+/characters 부하 테스트: 동시 클라이언트 수를 바꿔 가며 (기본 1, 8, 32, 128) 업로드 → 결과까지 걸린 시간을 잰다.
+클라이언트마다 POST /characters 후 GET ?wait= 롱폴링으로 done/failed 까지 — 닫힌 루프 (끝나면 다음 요청).
+수준별 처리량, p50/p95/p99, 오류율, 서버 최대 RSS/PSS 를 JSON 과 표로 낸다.
+모델은 아주 작은 랜덤 초기화 FFCResNetGenerator (--ngf/--n-blocks) — 실제 체크포인트 없이 CPU 만으로 돈다.
+업로드는 요청마다 픽셀 하나를 바꿔 내용(과 디코드 픽셀)이 모두 다르다 → 캐시/중복 합치기 없이 매번 LaMa 까지.
+--cache-hit-ratio 로 이미 보낸 업로드를 섞을 수 있다.
+
+    python -m benchmarks.load_test --out load.json                        # 앱을 이 프로세스 안에서 (ASGI)
+    python -m benchmarks.load_test --target http --workers 2              # serve.py 를 localhost 에 띄워서
+    python -m benchmarks.load_test --corpus ~/drawings --concurrency 1 8  # 실제 그림 섞기
+"""
+import argparse
+import asyncio
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+import torch
+from PIL import Image
+
+from benchmarks.common import DEFAULT_CONFIG, ROOT_DIR, make_character_image, write_random_checkpoint_config
+from benchmarks.pipeline import _git_commit
+from benchmarks.serving_memory import _free_port, _wait_ready
+from modules.decode import fit_size
+from modules.procmem import memory_usage
+
+DEFAULT_SIZES = ["256x256", "384x256", "256x384"]
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
+REQUEST_TIMEOUT = 600.0
+KEEPALIVE_EXPIRY = 4.0
+
+
+def load_corpus(sizes, corpus_dir, max_side):
+    """합성 그림 (sizes) + corpus_dir 의 실제 그림 (긴 변 max_side 로 줄여서) → RGBA PIL 이미지 목록."""
+    images = []
+    for i, size in enumerate(sizes):
+        width, height = (int(v) for v in size.lower().split("x"))
+        images.append(make_character_image(width, height, seed=i).convert("RGBA"))
+    if corpus_dir:
+        for path in sorted(Path(corpus_dir).expanduser().rglob("*")):
+            if path.suffix.lower() in IMAGE_SUFFIXES:
+                with Image.open(path) as im:
+                    im = im.convert("RGBA")
+                images.append(im.resize(fit_size(im.size, max_side), Image.Resampling.LANCZOS))
+    return images
+
+
+class Payloads:
+    """요청마다 내용이 다른 PNG: 기본 그림을 돌아가며 쓰고 (0, 0) 픽셀에 일련번호를 새긴다."""
+
+    def __init__(self, images, cache_hit_ratio, seed=0):
+        self.images = images
+        self.cache_hit_ratio = cache_hit_ratio
+        self.sent: list[bytes] = []
+        self._serial = 0
+        self._rng = random.Random(seed)
+
+    def make(self, count):
+        payloads = []
+        for _ in range(count):
+            if self.sent and self._rng.random() < self.cache_hit_ratio:
+                payloads.append(self._rng.choice(self.sent))
+                continue
+            image = np.array(self.images[self._serial % len(self.images)])
+            image[0, 0] = list(self._serial.to_bytes(4, "little"))
+            buf = io.BytesIO()
+            Image.fromarray(image, "RGBA").save(buf, format="PNG", compress_level=1)
+            self._serial += 1
+            self.sent.append(buf.getvalue())
+            payloads.append(self.sent[-1])
+        return payloads
+
+
+class MemorySampler:
+    """pids() 가 돌려주는 프로세스들의 RSS/PSS 합을 주기적으로 재서 최댓값을 남긴다."""
+
+    def __init__(self, pids, interval=0.05):
+        self.pids = pids
+        self.interval = interval
+        self.peak = {"rss": 0, "pss": 0}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="load-test-memory", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        total = {"rss": 0, "pss": 0}
+        for pid in self.pids():
+            try:
+                usage = memory_usage(pid)
+            except (FileNotFoundError, ProcessLookupError):
+                continue  # 그 사이 끝난 워커
+            for key in total:
+                total[key] += usage.get(key, 0)
+        for key, value in total.items():
+            self.peak[key] = max(self.peak[key], value)
+
+
+def process_tree(pid):
+    """pid 와 그 자손들 (/proc/<pid>/task/*/children)."""
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        for children in Path(f"/proc/{current}/task").glob("*/children"):
+            try:
+                stack.extend(int(child) for child in children.read_text().split())
+            except OSError:
+                pass
+    return pids
+
+
+async def one_request(client, data):
+    """업로드 → done/failed 까지. 반환: (걸린 초, 오류 문자열 또는 None)."""
+    start = time.perf_counter()
+    try:
+        response = await client.post("/characters", files={"file": ("drawing.png", data, "image/png")})
+        if response.status_code != 202:
+            return time.perf_counter() - start, f"POST {response.status_code}"
+        job = response.json()
+        while job["state"] not in ("done", "failed"):
+            response = await client.get(job["url"], params={"wait": 60})
+            if response.status_code != 200:
+                return time.perf_counter() - start, f"GET {response.status_code}"
+            job = response.json()
+        return time.perf_counter() - start, job.get("error") if job["state"] == "failed" else None
+    except httpx.HTTPError as e:
+        return time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+async def run_level(client, payloads, concurrency, pids):
+    """동시 클라이언트 concurrency 개가 payloads 를 나눠 보낸다."""
+    pending = list(reversed(payloads))
+    latencies, errors = [], []
+
+    async def worker():
+        while pending:
+            seconds, error = await one_request(client, pending.pop())
+            latencies.append(seconds)
+            if error is not None:
+                errors.append(error)
+
+    with MemorySampler(pids) as memory:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_rate": len(errors) / len(latencies),
+        "error_samples": sorted(set(errors))[:5],
+        "seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "peak_rss_mb": memory.peak["rss"] / 2 ** 20,
+        "peak_pss_mb": memory.peak["pss"] / 2 ** 20,
+    }
+
+
+async def sweep(client, args, payloads, pids):
+    # 워밍업이 끝난 뒤 한 번 돌려 두고 잰다
+    while (ready := await client.get("/readyz")).status_code != 200:
+        if ready.json()["state"] == "failed":
+            raise RuntimeError(f"warm-up failed: {ready.json()['error']}")
+        await asyncio.sleep(0.2)
+    await one_request(client, payloads.make(1)[0])
+    levels = []
+    for concurrency in args.concurrency:
+        count = args.requests or max(args.min_requests, args.requests_per_client * concurrency)
+        levels.append(await run_level(client, payloads.make(count), concurrency, pids))
+        print_row(levels[-1])
+    return levels
+
+
+def print_row(row):
+    print(f"{row['concurrency']:>5} {row['requests']:>8} {row['error_rate'] * 100:>6.1f} {row['throughput_rps']:>8.2f} "
+          f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['peak_rss_mb']:>9.1f} "
+          f"{row['peak_pss_mb']:>9.1f}", file=sys.stderr, flush=True)
+
+
+async def run_inprocess(args, payloads):
+    """앱을 이 프로세스 안에서 (httpx ASGITransport). RSS 에는 클라이언트와 미리 만든 업로드도 들어간다."""
+    main = importlib.import_module("main")
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://characters",
+                                     timeout=REQUEST_TIMEOUT) as client:
+            return await sweep(client, args, payloads, lambda: [os.getpid()])
+
+
+async def run_http(args, payloads, env):
+    """serve.py 를 localhost 에 띄우고 HTTP 로. RSS/PSS 는 서버 프로세스 트리 (부모 + 워커) 합."""
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers),
+         "--report-interval", "0", "--log-level", "warning"],
+        cwd=ROOT_DIR, env=env, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        await asyncio.to_thread(_wait_ready, base, proc)
+        # uvicorn 은 5초 쉰 keep-alive 연결을 닫는다 — 그보다 먼저 버려야 닫히는 연결을 재사용하는 경합이 오류로 안 잡힌다
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency),
+                              keepalive_expiry=KEEPALIVE_EXPIRY)
+        async with httpx.AsyncClient(base_url=base, timeout=REQUEST_TIMEOUT, limits=limits) as client:
+            return await sweep(client, args, payloads, lambda: process_tree(proc.pid))
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--target", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="--target http: serve.py 워커 수")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32, 128])
+    parser.add_argument("--requests", type=int, default=None, help="수준마다 요청 수 (기본: 아래 두 값으로 계산)")
+    parser.add_argument("--requests-per-client", type=int, default=2)
+    parser.add_argument("--min-requests", type=int, default=16)
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="합성 그림 WIDTHxHEIGHT")
+    parser.add_argument("--corpus", default=None, help="실제 그림 디렉토리 (하위 폴더 포함)")
+    parser.add_argument("--max-side", type=int, default=512, help="corpus 그림을 이 긴 변으로 줄여서 보낸다")
+    parser.add_argument("--cache-hit-ratio", type=float, default=0.0, help="이미 보낸 업로드를 다시 보낼 비율")
+    parser.add_argument("--ngf", type=int, default=16, help="랜덤 generator 폭 (실제 설정은 64)")
+    parser.add_argument("--n-blocks", type=int, default=2, help="랜덤 generator ResNet 블록 수 (실제 설정은 9)")
+    parser.add_argument("--job-workers", type=int, default=1, help="워커 프로세스당 LaMa 작업 스레드 수")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    payloads = Payloads(load_corpus(args.sizes, args.corpus, args.max_side), args.cache_hit_ratio)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        config_path = write_random_checkpoint_config(tmp / "model", args.config, device="cpu",
+                                                     ngf=args.ngf, n_blocks=args.n_blocks)
+        env = {
+            "CHARACTERS_STORE_DIR": str(tmp / "characters"),
+            "LAMA_CONFIG_PATH": str(config_path),
+            "CHARACTERS_JOB_WORKERS": str(args.job_workers),
+            "LAMA_WARMUP_SIZES": ",".join(f"{im.width}x{im.height}" for im in payloads.images[:len(args.sizes)]),
+        }
+        print(f"{'conc':>5} {'requests':>8} {'err%':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+              f"{'RSS MB':>9} {'PSS MB':>9}", file=sys.stderr, flush=True)
+        if args.target == "http":
+            levels = asyncio.run(run_http(args, payloads, dict(os.environ, **env)))
+        else:
+            # main 은 import 시점에 저장소/설정 경로를 읽는다
+            os.environ.update(env)
+            levels = asyncio.run(run_inprocess(args, payloads))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "target": args.target,
+            "workers": args.workers if args.target == "http" else 1,
+            "job_workers": args.job_workers,
+            "generator": {"ngf": args.ngf, "n_blocks": args.n_blocks},
+            "images": [f"{im.width}x{im.height}" for im in payloads.images],
+            "cache_hit_ratio": args.cache_hit_ratio,
+            "cpu_count": os.cpu_count(),
+        },
+        "levels": levels,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
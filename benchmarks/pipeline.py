@@ -0,0 +1,171 @@
+"""
+/characters 파이프라인 벤치마크: 단계별 단독 측정 + FastAPI 앱 end-to-end.
+합성 RGBA 픽스처(여러 크기/비율, png/jpeg)를 만들고, 랜덤 초기화 체크포인트로 돌린다.
+결과는 커밋 간 비교할 수 있게 JSON 으로 낸다.
+
+    python -m benchmarks.pipeline --out bench.json
+    python -m benchmarks.pipeline --sizes 256x256 512x768 --formats png --repeat 3 --e2e-repeat 2
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import cv2
+import torch
+from torch.utils.data._utils.collate import default_collate
+
+from benchmarks.common import (DEFAULT_CONFIG, ROOT_DIR, build_generator, encode_image, make_character_image,
+                               time_fn, write_random_checkpoint_config)
+
+DEFAULT_SIZES = ["256x256", "512x512", "768x512", "512x1024", "1024x1024"]
+DEFAULT_FORMATS = ["png", "jpeg"]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_size(size):
+    width, height = size.lower().split("x")
+    return int(width), int(height)
+
+
+def bench_generator_layers(model, input_tensor, repeat, device):
+    """model.model (nn.Sequential) 을 레이어별로 흘리며 재고 레이어 타입별로 합친다."""
+    per_type = defaultdict(lambda: {"count": 0, "median_ms": 0.0})
+    x = input_tensor
+    with torch.no_grad():
+        for layer in model.model:
+            stats = time_fn(lambda: layer(x), repeat, warmup=1, device=device)
+            entry = per_type[type(layer).__name__]
+            entry["count"] += 1
+            entry["median_ms"] += stats["median_ms"]
+            x = layer(x)
+    return dict(per_type)
+
+
+def bench_stages(main, predict_lama, model, data, fmt, work_dir, repeat, device):
+    content_type = "image/jpeg" if fmt == "jpeg" else f"image/{fmt}"
+    ext = main._detect_ext(data, content_type)
+    src = work_dir / f"input.{ext}"
+    src.write_bytes(data)
+    png = work_dir / "char" / "input.png"
+
+    stages = {
+        "detect_ext": time_fn(lambda: main._detect_ext(data, content_type), repeat),
+        "hash_bytes": time_fn(lambda: main._hash_bytes(data), repeat),
+        "ensure_png_for_lama": time_fn(lambda: main._ensure_png_for_lama(src, png), repeat),
+        "dataset": time_fn(lambda: predict_lama._OneImageDataset(str(png)), repeat),
+    }
+
+    dataset = predict_lama._OneImageDataset(str(png))
+    batch = predict_lama._move_to_device(default_collate([dataset[0]]), device)
+    with torch.no_grad():
+        stages["generator_forward"] = time_fn(lambda: model(batch["input"]), repeat, device=device)
+        batch["predicted"] = model(batch["input"])
+        layers = bench_generator_layers(model, batch["input"], repeat, device)
+
+    out_dir = work_dir / "char"
+    stages["save_inpainted"] = time_fn(lambda: predict_lama._save_inpainted(batch, out_dir, "bench"), repeat)
+    written = cv2.imread(str(out_dir / "bench_inpainted.png"), cv2.IMREAD_UNCHANGED)
+    stages["png_write"] = time_fn(lambda: cv2.imwrite(str(out_dir / "bench_write.png"), written), repeat)
+    return stages, layers
+
+
+def bench_e2e(main, payloads, repeat):
+    from fastapi.testclient import TestClient
+
+    results = {}
+    with TestClient(main.app) as client:
+        # startup 워밍업이 끝난 뒤에 잰다 (그 전에는 워밍업 스레드와 CPU 를 나눠 쓴다)
+        while client.get("/readyz").json()["state"] == main.WARMING:
+            time.sleep(main.JOB_POLL_INTERVAL)
+        for name, (data, content_type) in payloads.items():
+            job_id = main._hash_bytes(data)
+
+            def request():
+                # 같은 내용은 이전 job 결과로 합쳐지므로 매번 저장소를 비워 LaMa 까지 돌게 한다
+                shutil.rmtree(main.entry_dir(main.STORE_DIR, job_id), ignore_errors=True)
+                response = client.post("/characters", files={"file": ("upload", data, content_type)})
+                assert response.status_code == 202, response.text
+                while response.json()["state"] not in ("done", "failed"):
+                    response = client.get(f"/characters/{job_id}", params={"wait": main.MAX_WAIT_SECONDS})
+                return response.json()
+
+            results[name] = time_fn(request, repeat, warmup=1)
+            # 앱은 LaMa 실패를 job 상태와 logs.txt 에만 남기므로 따로 확인
+            job = request()
+            log_path = main.entry_dir(main.STORE_DIR, job_id) / "logs.txt"
+            results[name]["errors"] = job.get("error") or (
+                log_path.read_text(encoding="utf-8") if log_path.exists() else None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="WIDTHxHEIGHT (8의 배수)")
+    parser.add_argument("--formats", nargs="+", default=DEFAULT_FORMATS)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--e2e-repeat", type=int, default=2)
+    parser.add_argument("--out", default=None, help="JSON 출력 경로 (없으면 stdout)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        config_path = write_random_checkpoint_config(tmp / "model", args.config, device=args.device)
+        # main 은 import 시점에 저장소/설정 경로를 읽는다
+        os.environ["CHARACTERS_STORE_DIR"] = str(tmp / "characters")
+        os.environ["LAMA_CONFIG_PATH"] = str(config_path)
+        main_module = importlib.import_module("main")
+        predict_lama = importlib.import_module("modules.predict_lama")
+
+        model = build_generator(args.config, device=args.device)
+        fixtures, payloads = [], {}
+        for i, size in enumerate(args.sizes):
+            width, height = _parse_size(size)
+            image = make_character_image(width, height, seed=i)
+            for fmt in args.formats:
+                name = f"{width}x{height}.{fmt}"
+                data = encode_image(image, fmt)
+                work_dir = tmp / "stages" / name
+                work_dir.mkdir(parents=True)
+                stages, layers = bench_stages(main_module, predict_lama, model, data, fmt, work_dir,
+                                              args.repeat, args.device)
+                fixtures.append({"name": name, "width": width, "height": height, "format": fmt,
+                                 "bytes": len(data), "stages": stages, "generator_layers": layers})
+                payloads[name] = (data, "image/jpeg" if fmt == "jpeg" else f"image/{fmt}")
+
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "python": platform.python_version(),
+                "torch": torch.__version__,
+                "device": args.device,
+                "threads": torch.get_num_threads(),
+            },
+            "fixtures": fixtures,
+            "e2e": bench_e2e(main_module, payloads, args.e2e_repeat),
+        }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+serve.py 워커 수별 메모리: 공유 가중치(기본) vs 워커마다 로드(--per-worker-load, uvicorn --workers 와 같은 모양).
+랜덤 초기화 체크포인트로 서버를 띄우고, 요청 몇 개를 끝까지 돌린 뒤 serve.py 의 메모리 리포트를 모은다.
+
+    python -m benchmarks.serving_memory --workers 1 2 4 --out serving_memory.json
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from pathlib import Path
+
+from benchmarks.common import DEFAULT_CONFIG, ROOT_DIR, encode_image, make_character_image, write_random_checkpoint_config
+
+MODES = {"shared": [], "per_worker": ["--per-worker-load"]}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(url, data=None, headers=None, timeout=600):
+    req = urllib.request.Request(url, data=data, headers=headers or {})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def _post_image(base, data):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.png\"\r\n"
+            f"Content-Type: image/png\r\n\r\n").encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return _request(f"{base}/characters", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+
+def _wait_ready(base, proc, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"serve.py exited with {proc.returncode}")
+        try:
+            urllib.request.urlopen(f"{base}/readyz", timeout=2).read()
+            return
+        except OSError:  # 워밍업 중(503), 또는 아직 accept 하는 워커가 없으면 연결은 되고 읽기에서 timeout
+            time.sleep(0.5)
+    raise TimeoutError("server did not start")
+
+
+def _stable_report(path, timeout=300):
+    """워커들이 로드를 마칠 때까지: 연속 두 리포트의 총 PSS 차이가 1% 안쪽이 되면 그 리포트."""
+    deadline = time.monotonic() + timeout
+    previous = None
+    while True:
+        time.sleep(1.5)
+        report = json.loads(path.read_text(encoding="utf-8"))
+        pss = report["total"].get("pss", 0)
+        if previous is not None and abs(pss - previous) <= 0.01 * previous or time.monotonic() > deadline:
+            return report
+        previous = pss
+
+
+def run(mode, workers, env, requests, size, tmp):
+    port = _free_port()
+    report_path = tmp / f"report_{mode}_{workers}.json"
+    proc = subprocess.Popen(
+        [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+         "--report-interval", "1", "--report-json", str(report_path), "--log-level", "warning", *MODES[mode]],
+        cwd=ROOT_DIR, env=env, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(base, proc)
+        # 서로 다른 이미지를 워커 수 배만큼 돌려서 워커들이 실제로 추론까지 하게 한다
+        for i in range(requests * workers):
+            data = encode_image(make_character_image(size, size, seed=i), "png")
+            job = _post_image(base, data)
+            while job["state"] not in ("done", "failed"):
+                job = _request(f"{base}{job['url']}?wait=60")
+        report = _stable_report(report_path)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+    mb = 2 ** 20
+    return {
+        "mode": mode,
+        "workers": workers,
+        "total_pss_mb": report["total"].get("pss", 0) / mb,
+        "total_rss_mb": report["total"].get("rss", 0) / mb,
+        "worker_rss_mb": [usage.get("rss", 0) / mb for usage in report["workers"].values()],
+        "worker_uss_mb": [usage.get("uss", 0) / mb for usage in report["workers"].values()],
+        "parent_pss_mb": report["parent"].get("pss", 0) / mb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--requests", type=int, default=2, help="워커당 요청 수")
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        config_path = write_random_checkpoint_config(tmp / "model", args.config, device="cpu")
+        for mode in args.modes:
+            for workers in args.workers:
+                env = dict(os.environ, CHARACTERS_STORE_DIR=str(tmp / f"characters_{mode}_{workers}"),
+                           LAMA_CONFIG_PATH=str(config_path))
+                results.append(run(mode, workers, env, args.requests, args.size, tmp))
+                row = results[-1]
+                print(f"{mode:<11} workers={workers:<3} total PSS {row['total_pss_mb']:8.1f} MB  "
+                      f"total RSS {row['total_rss_mb']:8.1f} MB", file=sys.stderr, flush=True)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
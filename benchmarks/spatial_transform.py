@@ -0,0 +1,57 @@
+"""
+spatial_transform_layers 를 켠 생성기에서 LearnableSpatialTransformWrapper 변형별 전체 forward 시간.
+- baseline: 매 호출마다 kornia rotate (기존 동작)
+- cached:   (shape, device, dtype) 별 sampling grid 캐시
+- tight:    cached + 각도로부터 계산한 최소 패딩 (결과가 조금 달라짐)
+
+    python -m benchmarks.spatial_transform --size 512 --layers 0 4 8
+"""
+import argparse
+import json
+
+import torch
+
+from benchmarks.common import DEFAULT_CONFIG, build_generator, time_fn
+from saicinpainting.training.modules.spatial_transform import LearnableSpatialTransformWrapper
+
+VARIANTS = {
+    "baseline": dict(cache_grids=False, tight_padding=False),
+    "cached": dict(cache_grids=True, tight_padding=False),
+    "tight": dict(cache_grids=True, tight_padding=True),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--layers", type=int, nargs="+", default=list(range(9)))
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = build_generator(args.config, device=args.device, spatial_transform_layers=args.layers)
+    wrappers = [m for m in model.modules() if isinstance(m, LearnableSpatialTransformWrapper)]
+    x = torch.rand(1, 4, args.size, args.size, device=args.device)
+
+    results, reference = {}, None
+    with torch.no_grad():
+        for name, attrs in VARIANTS.items():
+            for wrapper in wrappers:
+                wrapper._grid_cache.clear()
+                for key, value in attrs.items():
+                    setattr(wrapper, key, value)
+            out = model(x)
+            if reference is None:
+                reference = out
+            results[name] = time_fn(lambda: model(x), args.repeat, device=args.device)
+            results[name]["max_abs_diff"] = (out - reference).abs().max().item()
+
+    for name, r in results.items():
+        print(f"{name:>8}: {r['median_ms']:.1f} ms (max diff vs baseline {r['max_abs_diff']:.2e})")
+    print(json.dumps({"size": args.size, "layers": args.layers, "results": results}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+생성기 업샘플링 스택(deconv_factory) 마이크로벤치마크.
+bilinear 스택을 기존 모듈 / fuse_depthwise_convs (NCHW, channels_last) 로 비교하고 convtranspose 를 참고로 잰다.
+
+    python -m benchmarks.upsampling --size 64 --ngf 64 --n-downsampling 3
+"""
+import argparse
+import copy
+import json
+
+import torch
+import torch.nn as nn
+
+from benchmarks.common import time_fn
+from saicinpainting.training.modules.base import deconv_factory
+from saicinpainting.training.modules.depthwise_sep_conv import fuse_depthwise_convs
+
+
+def make_upsampling_stack(kind, ngf, n_downsampling, max_features=1024):
+    layers = []
+    for i in range(n_downsampling):
+        mult = 2 ** (n_downsampling - i)
+        layers += deconv_factory(kind, ngf, mult, nn.BatchNorm2d, nn.ReLU(True), max_features)
+    return nn.Sequential(*layers).eval()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=64, help="bottleneck spatial size")
+    parser.add_argument("--ngf", type=int, default=64)
+    parser.add_argument("--n-downsampling", type=int, default=3)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    bilinear = make_upsampling_stack("bilinear", args.ngf, args.n_downsampling).to(args.device)
+    variants = {
+        "bilinear": bilinear,
+        "bilinear_fused": fuse_depthwise_convs(copy.deepcopy(bilinear), channels_last=False),
+        "bilinear_fused_channels_last": fuse_depthwise_convs(copy.deepcopy(bilinear), channels_last=True),
+        "convtranspose": make_upsampling_stack("convtranspose", args.ngf, args.n_downsampling).to(args.device),
+    }
+    in_channels = min(1024, args.ngf * 2 ** args.n_downsampling)
+    x = torch.rand(1, in_channels, args.size, args.size, device=args.device)
+
+    results = {}
+    with torch.no_grad():
+        reference = bilinear(x)
+        for name, stack in variants.items():
+            results[name] = time_fn(lambda: stack(x), args.repeat, device=args.device)
+            if name.startswith("bilinear"):
+                results[name]["max_abs_diff"] = (stack(x) - reference).abs().max().item()
+
+    for name, r in results.items():
+        print(f"{name:>30}: {r['median_ms']:.2f} ms")
+    print(json.dumps({"size": args.size, "ngf": args.ngf, "results": results}))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,100 @@
 
 from __future__ import annotations
 
+import asyncio
 import base64
 import hashlib
+import io
+import json
+import mimetypes
 import os
-from pathlib import Path
-from typing import Optional
+import re
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from collections import Counter
+from pathlib import Path, PurePosixPath
+from typing import Iterator, Optional
 import imghdr
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
+from starlette.datastructures import UploadFile as FormFile
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 
-# === 추가: PIL, 라마 러너 ===
-from PIL import Image
-from modules.predict_lama import run_lama_for_uid
+# === 추가: 디코드, 라마 러너 ===
+from modules.accounting import ResourceAccounting, note_ids
+from modules.admission import AdmissionController, Tier
+from modules.decode import INPUT_PNG_COMPRESS_LEVEL, decode_rgba
+from modules.predict_lama import degrade_settings, model_version, run_lama_batch, run_lama_for_uid, warmup_model
+from modules.jobs import DONE, FINISHED_STATES, Job, JobQueue
+from modules.metrics import (BATCH_ITEMS, CACHE_LOOKUPS, PIXEL_DEDUPES, PROCESS_MEMORY, QUALITY_LEVEL, QUALITY_TIERS,
+                             READINESS, REGISTRY, REQUEST_SECONDS, REQUESTS, stage)
+from modules.pixel_index import PIXEL_INDEX_FILE, PixelIndex, pixel_hash
+from modules.procmem import memory_usage
+from modules.store import INDEX_FILE, StoreIndex, entry_dir
 
 # ===== 설정 =====
 BASE_DIR = Path(__file__).resolve().parent
-STORE_DIR = BASE_DIR / "characters"
+# 환경변수로 덮어쓰기 가능 (벤치마크/테스트용 임시 저장소, 다른 설정 파일)
+# 항목은 STORE_DIR/ab/cd/<sha256>/ (modules/store.py — 평평한 예전 레이아웃은 python -m modules.store migrate)
+STORE_DIR = Path(os.environ.get("CHARACTERS_STORE_DIR", BASE_DIR / "characters"))
 STORE_DIR.mkdir(parents=True, exist_ok=True)
+LAMA_CONFIG_PATH = Path(os.environ.get(
+    "LAMA_CONFIG_PATH", BASE_DIR / "lama_runner" / "configs" / "prediction" / "lama-fourier.yaml"))
+
+# 업로드 스트리밍: 청크 단위로 읽어 임시 파일에 쓰고, 해시가 나오면 characters/<h>/ 로 rename.
+# 임시 디렉토리는 rename 이 원자적이도록 STORE_DIR 과 같은 파일시스템에 둔다.
+UPLOAD_TMP_DIR = STORE_DIR / ".tmp"
+UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("CHARACTERS_MAX_UPLOAD_BYTES", 32 * 1024 * 1024))
+SNIFF_BYTES = 32  # imghdr 가 보는 헤더 길이
+# 라마 입력의 긴 변 상한 (px). 기본 0 = 원본 크기 그대로. 켜면 큰 업로드를 디코드 단계에서부터 줄이고
+# (modules/decode.py) 결과 PNG 도 그 해상도로 나온다 — 출력 해상도를 낮춰도 되는 배포에서만 켠다
+MAX_INPUT_SIDE = int(os.environ.get("CHARACTERS_MAX_INPUT_SIDE", 0))
+
+# 일괄 업로드 (POST /characters/batch): 요청당 항목 수 상한, 임시 파일로 받는 zip 본문 상한,
+# 작업 큐 한 단위로 묶는 새 항목 수 (묶음 안에서 generator 배치 크기는 설정 batch 섹션)
+MAX_BATCH_ITEMS = int(os.environ.get("CHARACTERS_MAX_BATCH_ITEMS", 500))
+MAX_BATCH_BYTES = int(os.environ.get("CHARACTERS_MAX_BATCH_BYTES", 1024 * 1024 * 1024))
+BATCH_JOB_SIZE = int(os.environ.get("CHARACTERS_BATCH_JOB_SIZE", 8))
+ZIP_TYPES = {"application/zip", "application/x-zip-compressed"}
+TAR_TYPES = {"application/x-tar", "application/tar", "application/x-gtar", "application/gzip", "application/x-gzip",
+             "application/x-bzip2", "application/x-xz"}
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# 항목별 manifest 상태: 새 job / 이미 있던 job (진행 중, 결과 있음, 픽셀이 같은 결과 재사용) / 같은 요청 안 중복 / 거부
+NEW, EXISTING, DUPLICATE, REJECTED = "new", "existing", "duplicate", "rejected"
+
+# 작업 큐: LaMa 워커 스레드 수, GET 롱폴링 최대 대기(초), SSE keep-alive 주기(초)
+JOB_WORKERS = int(os.environ.get("CHARACTERS_JOB_WORKERS", 1))
+MAX_WAIT_SECONDS = 60.0
+SSE_KEEPALIVE_SECONDS = 15.0
+JOB_POLL_INTERVAL = 0.05
+JOB_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# 워밍업: 표준 입력 크기로 generator 를 미리 돌린 뒤에야 /readyz 가 200 (프로세스당 한 번)
+WARMING, READY, WARMUP_FAILED = "warming", "ready", "failed"
+_WARMUP = {"state": WARMING, "sizes": [], "error": None}
+_WARMUP_LOCK = threading.Lock()
+
+# 요청별 단계 자원 기록 (modules/accounting.py): 기록할 요청 비율 (0 = 끔), JSON 한 줄씩 쌓는 파일,
+# 단계별 값을 /metrics 히스토그램(characters_stage_*)에도 넣을지
+RESOURCE_SAMPLE_RATE = float(os.environ.get("CHARACTERS_RESOURCE_SAMPLE_RATE", 0))
+RESOURCE_LOG_PATH = Path(os.environ.get("CHARACTERS_RESOURCE_LOG", STORE_DIR / "resources.jsonl"))
+RESOURCE_METRICS = os.environ.get("CHARACTERS_RESOURCE_METRICS", "0").lower() not in ("", "0", "false")
+ACCOUNTING = ResourceAccounting(RESOURCE_SAMPLE_RATE, RESOURCE_LOG_PATH, metrics=RESOURCE_METRICS)
+
+# 워커 여러 개의 /metrics 를 합쳐 보여 줄 공유 디렉토리 (modules/metrics.py). serve.py 는 스스로 정하므로
+# uvicorn --workers 로 띄울 때만 준다 (worker 라벨 = pid)
+METRICS_DIR = os.environ.get("CHARACTERS_METRICS_DIR")
+
+# 부하에 따른 품질 단계 (modules/admission.py) — 설정 degrade 섹션으로 처음 job 을 돌릴 때 만든다
+_ADMISSION: Optional[AdmissionController] = None
 
 ALLOWED_MIME_PREFIX = "image/"
 IMGHDR_TO_EXT = {
@@ -41,11 +116,77 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=False,
-    allow_methods=["POST", "OPTIONS"],
+    allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
 )
 
 
+@app.middleware("http")
+async def _characters_metrics(request: Request, call_next):
+    route = request.url.path
+    if route not in ("/characters", "/characters/batch") or request.method != "POST":
+        return await call_next(request)
+    status = 500
+    try:
+        with REQUEST_SECONDS.time(route=route):
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS.inc(route=route, status=status)
+
+
+async def _resource_accounting(request: Request, call_next):
+    # 업로드 요청 중 샘플로 뽑힌 것만 단계별 자원을 기록 (LaMa 실행은 작업 큐 워커에서 job 별로 따로)
+    kind = {"/characters": "upload", "/characters/batch": "batch_upload"}.get(request.url.path)
+    if kind is None or request.method != "POST":
+        return await call_next(request)
+    with ACCOUNTING.request(kind):
+        return await call_next(request)
+
+
+if RESOURCE_SAMPLE_RATE > 0:  # 꺼져 있으면 미들웨어 한 겹도 더하지 않는다
+    app.middleware("http")(_resource_accounting)
+
+
+def _refresh_process_memory() -> None:
+    for kind, value in memory_usage().items():
+        PROCESS_MEMORY.set(value, kind=kind)
+
+
+REGISTRY.on_collect(_refresh_process_memory)
+
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus text exposition format 0.0.4 — 워커 공유가 켜져 있으면 모든 워커의 시리즈 (worker 라벨)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/readyz")
+def readyz():
+    """로드밸런서용 readiness: 워밍업이 끝나기 전(또는 실패하면) 503."""
+    return JSONResponse(dict(_WARMUP), status_code=200 if _WARMUP["state"] == READY else 503)
+
+
+def warm_up() -> dict:
+    """
+    generator 로드 + 표준 크기 워밍업 (modules/predict_lama.warmup_model). 여러 번 불려도 한 번만 돈다.
+    serve.py 워커는 accept 를 시작하기 전에 직접 부르고, 단독 uvicorn 은 startup 에서 백그라운드 스레드로 부른다.
+    실패해도 서버는 뜨고 /readyz 가 failed + error 를 보여 준다.
+    """
+    with _WARMUP_LOCK:
+        if _WARMUP["state"] == WARMING:
+            try:
+                with stage("warmup"):
+                    _WARMUP["sizes"] = warmup_model(str(LAMA_CONFIG_PATH))
+                _WARMUP["state"] = READY
+                READINESS.set(1)
+            except Exception as e:
+                _WARMUP.update(state=WARMUP_FAILED, error=f"{type(e).__name__}: {e}")
+    return dict(_WARMUP)
+
+
 def _detect_ext(data: bytes, content_type: Optional[str]) -> str:
     kind = imghdr.what(None, data)
     if kind:
@@ -66,14 +207,77 @@ def _hash_bytes(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()
 
 
-def _ensure_png_for_lama(src_path: Path, dst_png: Path) -> None:
-    """라마 입력용 RGBA PNG로 통일."""
+class _Spool:
+    """
+    청크를 받아 sha256 누적 + 임시 파일(UPLOAD_TMP_DIR)에 기록. limit 을 넘으면 쓰는 도중 413.
+    끝나면 close() → (임시 파일 경로, sha256 hex, 포맷 감지용 앞부분 바이트, 전체 크기). 실패하면 discard().
+    """
+
+    def __init__(self, limit: int = MAX_UPLOAD_BYTES):
+        fd, tmp_name = tempfile.mkstemp(dir=UPLOAD_TMP_DIR, suffix=".upload")
+        self.path = Path(tmp_name)
+        self.limit = limit
+        self._fp = os.fdopen(fd, "wb")
+        self._hasher = hashlib.sha256()
+        self._head = b""
+        self._size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._size += len(chunk)
+        if self._size > self.limit:
+            raise HTTPException(status_code=413, detail=f"file larger than {self.limit} bytes")
+        if len(self._head) < SNIFF_BYTES:
+            self._head += chunk[:SNIFF_BYTES - len(self._head)]
+        self._hasher.update(chunk)
+        self._fp.write(chunk)
+
+    def close(self) -> tuple[Path, str, bytes, int]:
+        self._fp.close()
+        return self.path, self._hasher.hexdigest(), self._head, self._size
+
+    def discard(self) -> None:
+        self._fp.close()
+        self.path.unlink(missing_ok=True)
+
+
+async def _spool_upload(file: UploadFile) -> tuple[Path, str, bytes, int]:
+    """
+    UploadFile 을 청크로 읽으면서 sha256 누적 + 임시 파일에 기록 (_Spool).
+    MAX_UPLOAD_BYTES 를 넘으면 읽는 도중 413.
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"file larger than {MAX_UPLOAD_BYTES} bytes")
+    spool = _Spool()
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            spool.write(chunk)
+    except BaseException:
+        spool.discard()
+        raise
+    return spool.close()
+
+
+def _spool_file(fp) -> tuple[Path, str, bytes, int]:
+    """_spool_upload 의 동기판 (워커 스레드에서 아카이브 멤버/폼 파트를 읽을 때)."""
+    spool = _Spool()
+    try:
+        while chunk := fp.read(UPLOAD_CHUNK_SIZE):
+            spool.write(chunk)
+    except BaseException:
+        spool.discard()
+        raise
+    return spool.close()
+
+
+def _ensure_png_for_lama(src_path: Path, dst_png: Path) -> tuple[str, tuple[int, int]]:
+    """
+    라마 입력용 RGBA PNG로 통일 (EXIF 방향 적용, MAX_INPUT_SIDE 가 켜져 있으면 긴 변을 그 이하로).
+    반환: (디코드된 RGBA 픽셀의 해시 (modules/pixel_index.py), (width, height)).
+    """
     dst_png.parent.mkdir(parents=True, exist_ok=True)
-    with Image.open(src_path) as im:
-        # RGBA로 맞추고 저장
-        if im.mode != "RGBA":
-            im = im.convert("RGBA")
-        im.save(dst_png, format="PNG")
+    im = decode_rgba(src_path, MAX_INPUT_SIDE)
+    im.save(dst_png, format="PNG", compress_level=INPUT_PNG_COMPRESS_LEVEL)
+    return pixel_hash(im), im.size
 
 
 @app.post("/characters")
@@ -82,42 +286,502 @@ async def upload_character_image(file: UploadFile = File(...)):
     if not file.content_type or not file.content_type.startswith(ALLOWED_MIME_PREFIX):
         raise HTTPException(status_code=415, detail="only image/* accepted")
 
-    # 2) 내용 읽기 & 2차 포맷 감지
-    data = await file.read()
-    if not data:
+    # 2) 스트리밍으로 읽기 (해시 누적 + 임시 파일) & 앞부분으로 2차 포맷 감지
+    with stage("read"):
+        tmp_path, h, head, size = await _spool_upload(file)
+    note_ids(h)
+    if size == 0:
+        tmp_path.unlink(missing_ok=True)
         raise HTTPException(status_code=400, detail="empty file")
 
-    ext = _detect_ext(data, file.content_type)
+    ext = _detect_ext(head, file.content_type)
+
+    # 3) 캐시 조회는 저장소 색인으로 (디렉토리를 stat 하지 않음)
+    indexed = STORE_INDEX.get(h) is not None
+    CACHE_LOOKUPS.inc(result="hit" if indexed else "miss")
+    if indexed:
+        STORE_INDEX.touch(h)
+    # 같은 내용의 job 이 진행 중이거나 결과가 있으면 입력 파일을 다시 쓰지 않고 그 job 을 돌려준다 (락 없는 fast path)
+    existing = JOB_QUEUE.join(h)
+    if existing is not None:
+        tmp_path.unlink(missing_ok=True)
+        return JSONResponse({"status": "ok", **_job_payload(existing)}, status_code=202)
+
+    # 4~6) 해시별 single-flight: 동시에 들어온 같은 내용(다른 워커 프로세스 포함) 중 하나만 파일을 쓰고 job 을 만든다
+    # (락 획득부터 해제까지 한 스레드에서 — 요청이 취소돼도 락이 남지 않게)
+    job, _ = await asyncio.to_thread(_ingest_single_flight, h, tmp_path, ext, size)
+
+    # 7) job id 와 상태를 바로 반환 — 결과는 GET /characters/{job_id}
+    return JSONResponse({"status": "ok", **_job_payload(job)}, status_code=202)
+
+
+@app.post("/characters/batch")
+async def upload_character_batch(request: Request, wait: float = 0.0):
+    """
+    여러 이미지를 한 요청으로. 본문은
+    - multipart/form-data: 파일 파트 여러 개 (이미지, 또는 .zip / .tar[.gz|.bz2|.xz] 아카이브)
+    - application/x-tar (gzip/bz2/xz 압축 포함): 요청 스트림을 받는 대로 풀면서 처리 — 본문 전체를 모으지 않는다
+    - application/zip: 목록(central directory)이 끝에 있어 임시 파일로 받은 뒤 푼다 (상한 MAX_BATCH_BYTES)
+    항목마다 sha256 으로 거른다 (같은 요청 안 중복, 이미 있는 job). 새 항목은 BATCH_JOB_SIZE 개씩 묶어 작업 큐에
+    넣고, 워커가 묶음을 generator 배치로 돌린다 (_run_lama_batch). 저장 레이아웃은 POST /characters 와 같다.
+    반환: 항목별 manifest (name, status, job 상태). wait>0 이면 전부 끝나거나 wait 초(상한 MAX_WAIT_SECONDS)까지 기다린다.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    loop = asyncio.get_running_loop()
+    if content_type == "multipart/form-data":
+        form = await request.form(max_files=MAX_BATCH_ITEMS)
+        try:
+            parts = [value for _, value in form.multi_items() if isinstance(value, FormFile)]
+            manifest, error = await asyncio.to_thread(_ingest_batch, _form_members(parts))
+        finally:
+            await form.close()
+    elif content_type in TAR_TYPES:
+        body = io.BufferedReader(_RequestBodyReader(request, loop), UPLOAD_CHUNK_SIZE)
+        manifest, error = await asyncio.to_thread(_ingest_batch, _tar_members(body))
+    elif content_type in ZIP_TYPES:
+        spool = _Spool(limit=MAX_BATCH_BYTES)
+        try:
+            async for chunk in request.stream():
+                spool.write(chunk)
+        except BaseException:
+            spool.discard()
+            raise
+        archive_path = spool.close()[0]
+        try:
+            with open(archive_path, "rb") as fp:
+                manifest, error = await asyncio.to_thread(_ingest_batch, _zip_members(fp))
+        finally:
+            archive_path.unlink(missing_ok=True)
+    else:
+        raise HTTPException(status_code=415, detail="multipart/form-data, a tar stream or a zip archive expected")
+
+    note_ids(*dict.fromkeys(item["job_id"] for item in manifest if "job_id" in item))
+    if not manifest and error is not None:
+        raise HTTPException(status_code=400, detail=error)
+
+    # wait>0: 이 요청의 job 들이 전부 끝날 때까지 롱폴링, 항목 상태는 마지막에 한 번 새로 읽는다
+    job_ids = {item["job_id"] for item in manifest if "job_id" in item}
+    deadline = loop.time() + min(max(wait, 0.0), MAX_WAIT_SECONDS)
+    while job_ids and loop.time() < deadline:
+        job_ids = {job_id for job_id in job_ids
+                   if (job := JOB_QUEUE.get(job_id)) is not None and job.state not in FINISHED_STATES}
+        if job_ids:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+    for item in manifest:
+        job = JOB_QUEUE.get(item["job_id"]) if "job_id" in item else None
+        if job is not None:
+            item.update(_job_payload(job))
+
+    payload = {"status": "ok", "count": len(manifest), "summary": dict(Counter(item["status"] for item in manifest)),
+               "items": manifest}
+    if error is not None:
+        payload["error"] = error
+    return JSONResponse(payload, status_code=202)
+
+
+@app.get("/characters/{job_id}")
+async def get_character_job(job_id: str, wait: float = 0.0):
+    """
+    job 상태 조회. wait>0 이면 끝날 때까지 최대 wait 초(상한 MAX_WAIT_SECONDS) 롱폴링.
+    """
+    job = _get_job_or_404(job_id)
+    deadline = asyncio.get_running_loop().time() + min(max(wait, 0.0), MAX_WAIT_SECONDS)
+    while job.state not in FINISHED_STATES and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+        job = _get_job_or_404(job_id)
+    return JSONResponse(_job_payload(job))
+
+
+@app.get("/characters/{job_id}/events")
+async def stream_character_job(job_id: str):
+    """상태가 바뀔 때마다 server-sent event 로 보내고, done/failed 에서 스트림을 닫는다."""
+    job = _get_job_or_404(job_id)
+
+    async def events():
+        current, last_state = job, None
+        idle = 0.0
+        while True:
+            if current.state != last_state:
+                last_state, idle = current.state, 0.0
+                yield f"event: {current.state}\ndata: {json.dumps(_job_payload(current))}\n\n"
+                if current.state in FINISHED_STATES:
+                    return
+            elif idle >= SSE_KEEPALIVE_SECONDS:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            idle += JOB_POLL_INTERVAL
+            current = JOB_QUEUE.get(job_id) or current
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/characters/{job_id}/result")
+async def get_character_result(job_id: str):
+    """인페인팅 결과 PNG. 아직 안 끝났으면 409, 실패했으면 500 + error."""
+    job = _get_job_or_404(job_id)
+    if job.state != DONE:
+        raise HTTPException(status_code=500 if job.state == "failed" else 409, detail=_job_payload(job))
+    STORE_INDEX.touch(job_id)
+    return FileResponse(entry_dir(STORE_DIR, job_id) / job.result, media_type="image/png")
+
+
+class _RequestBodyReader(io.RawIOBase):
+    """
+    요청 본문(이벤트 루프의 비동기 스트림)을 워커 스레드에서 동기 파일처럼 읽는다 — tarfile 스트림 모드에 그대로 넘긴다.
+    청크는 읽을 때마다 루프에서 하나씩 받아 오므로 본문 전체가 메모리에 쌓이지 않는다.
+    """
+
+    def __init__(self, request: Request, loop: asyncio.AbstractEventLoop):
+        self._chunks = request.stream()
+        self._loop = loop
+        self._pending = b""
+        self._eof = False
 
-    # 3) 해시 디렉토리 생성
-    h = _hash_bytes(data)
-    dest_dir = STORE_DIR / h
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and not self._eof:
+            chunk = asyncio.run_coroutine_threadsafe(self._next_chunk(), self._loop).result()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._pending = chunk
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    async def _next_chunk(self) -> Optional[bytes]:
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+
+def _skip_member(name: str) -> bool:
+    """아카이브 안의 macOS 메타데이터(__MACOSX/, ._*) 와 숨김 파일."""
+    path = PurePosixPath(name)
+    return not path.name or path.name.startswith(".") or "__MACOSX" in path.parts
+
+
+def _tar_members(fileobj) -> Iterator[tuple[str, object]]:
+    """스트림 모드(r|*): 앞에서부터 한 번만 읽고 되감지 않는다. 멤버는 다음 멤버로 넘어가기 전에 다 읽어야 한다."""
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile() and not _skip_member(member.name):
+                yield member.name, archive.extractfile(member)
+
+
+def _zip_members(fileobj) -> Iterator[tuple[str, object]]:
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and not _skip_member(info.filename):
+                with archive.open(info) as member:
+                    yield info.filename, member
+
+
+def _form_members(parts: list[FormFile]) -> Iterator[tuple[str, object]]:
+    """multipart 파트: 아카이브는 풀어서, 나머지는 이미지 한 장으로."""
+    for part in parts:
+        name = (part.filename or "").lower()
+        if part.content_type in ZIP_TYPES or name.endswith(".zip"):
+            yield from _zip_members(part.file)
+        elif part.content_type in TAR_TYPES or name.endswith(TAR_SUFFIXES):
+            yield from _tar_members(part.file)
+        else:
+            yield part.filename or "", part.file
+
+
+def _ingest_batch(members: Iterator[tuple[str, object]]) -> tuple[list[dict], Optional[str]]:
+    """
+    워커 스레드에서: (이름, 파일) 을 하나씩 저장소에 넣고 새 job 은 BATCH_JOB_SIZE 개씩 묶어 큐에 넣는다.
+    반환: (항목별 manifest, 중간에 멈췄으면 그 이유). 멈춰도 그때까지 만든 job 은 큐에 들어간다.
+    """
+    manifest: list[dict] = []
+    first_seen: dict[str, str] = {}
+    deferred: list[str] = []
+    error = None
+    try:
+        for name, fp in members:
+            if len(manifest) >= MAX_BATCH_ITEMS:
+                error = f"more than {MAX_BATCH_ITEMS} items; the rest was not read"
+                break
+            item = _ingest_member(name, fp, first_seen, deferred)
+            BATCH_ITEMS.inc(status=item["status"])
+            manifest.append(item)
+            if len(deferred) >= BATCH_JOB_SIZE:
+                JOB_QUEUE.enqueue(deferred)
+                deferred.clear()
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError, zlib.error) as e:
+        error = f"unreadable archive: {type(e).__name__}: {e}"
+    finally:
+        JOB_QUEUE.enqueue(deferred)
+    return manifest, error
+
+
+def _ingest_member(name: str, fp, first_seen: dict[str, str], deferred: list[str]) -> dict:
+    """항목 하나: 스풀 + sha256 → 포맷 확인 → 요청 안 중복 / 기존 job 합류 → single-flight 로 저장 (job 은 보류)."""
+    item = {"name": name}
+    try:
+        with stage("read"):
+            tmp_path, h, head, size = _spool_file(fp)
+    except HTTPException as e:
+        return {**item, "status": REJECTED, "error": e.detail}
+    mime = mimetypes.guess_type(name)[0]
+    if size == 0 or (imghdr.what(None, head) is None and not (mime or "").startswith(ALLOWED_MIME_PREFIX)):
+        tmp_path.unlink(missing_ok=True)
+        return {**item, "status": REJECTED, "error": "empty file" if size == 0 else "not an image"}
+    if h in first_seen:
+        tmp_path.unlink(missing_ok=True)
+        return {**item, "status": DUPLICATE, "duplicate_of": first_seen[h], "job_id": h}
+
+    indexed = STORE_INDEX.get(h) is not None
+    CACHE_LOOKUPS.inc(result="hit" if indexed else "miss")
+    if indexed:
+        STORE_INDEX.touch(h)
+    existing = JOB_QUEUE.join(h)
+    if existing is not None:
+        tmp_path.unlink(missing_ok=True)
+        first_seen[h] = name
+        return {**item, "status": EXISTING, "job_id": h}
+    job, created = _ingest_single_flight(h, tmp_path, _detect_ext(head, mime), size, enqueue=False)
+    first_seen[h] = name
+    if created:
+        deferred.append(h)
+    return {**item, "status": NEW if created else EXISTING, "job_id": job.id}
+
+
+def _ingest_single_flight(h: str, tmp_path: Path, ext: str, size: int, enqueue: bool = True) -> tuple[Job, bool]:
+    """
+    JOB_QUEUE.flight(h) 안에서 원본 저장 → 라마 입력 PNG → job 등록. 임시 파일은 항상 정리.
+    반환: (job, 새로 만들었는지). enqueue=False 면 새 job 을 큐에 넣지 않는다 (호출한 쪽이 묶어서 JOB_QUEUE.enqueue).
+    """
+    flight = JOB_QUEUE.flight(h)
+    try:
+        with stage("singleflight_wait"):
+            flight.acquire()
+        try:
+            return _ingest_locked(h, tmp_path, ext, size, enqueue)
+        finally:
+            flight.release()
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _ingest_locked(h: str, tmp_path: Path, ext: str, size: int, enqueue: bool = True) -> tuple[Job, bool]:
+    # 락을 기다리는 사이 먼저 온 요청이 job 을 만들었으면 그대로 합류
+    existing = JOB_QUEUE.join(h)
+    if existing is not None:
+        return existing, False
+    dest_dir = entry_dir(STORE_DIR, h)
     dest_dir.mkdir(parents=True, exist_ok=True)
+    STORE_INDEX.upsert(h, ext=ext, input_bytes=size, last_access=time.time())
 
-    # 4) 원본 저장 (input.<ext>)
+    # 4) 원본 저장 (input.<ext>) — 임시 파일을 원자적으로 이동
     orig_path = dest_dir / f"input.{ext}"
-    orig_path.write_bytes(data)
+    with stage("write_input"):
+        os.replace(tmp_path, orig_path)
 
-    # 5) 라마 입력 PNG 준비: characters/<h>/char/input.png
+    # 5) 라마 입력 PNG 준비: <항목 디렉토리>/char/input.png
     char_dir = dest_dir / "char"
     lama_input_png = char_dir / "input.png"
     try:
-        _ensure_png_for_lama(orig_path, lama_input_png)
+        with stage("convert"):
+            pixels, (width, height) = _ensure_png_for_lama(orig_path, lama_input_png)
+        PIXEL_INDEX.add(h, pixels)
+        STORE_INDEX.upsert(h, width=width, height=height)
     except Exception as e:
         (dest_dir / "logs.txt").write_text(f"[PNG-CONVERT] {e}\n", encoding="utf-8")
 
-    # 6) 라마 실행 (실패해도 API는 ok)
+    # 바이트는 달라도 픽셀이 같은 업로드의 결과가 이미 있으면 링크하고 끝낸다
+    result = _reuse_pixel_twin(h)
+    if result is not None:
+        PIXEL_DEDUPES.inc(at="ingest")
+        return JOB_QUEUE.complete(h, result), False
+
+    # 6) 라마 실행은 작업 큐로
+    return JOB_QUEUE.submit(h, enqueue=enqueue)
+
+
+def _run_lama_job(h: str) -> Path:
+    """작업 큐 워커에서 실행. 실패는 기존처럼 logs.txt 에도 남기고 job 상태로 올린다."""
+    try:
+        # 큐에서 기다리는 동안 픽셀이 같은 job 이 먼저 끝났을 수도 있다
+        result = _reuse_pixel_twin(h)
+        if result is not None:
+            PIXEL_DEDUPES.inc(at="queued")
+            return result
+        tier = _choose_tier([h])
+        started = time.time()
+        try:
+            # 전체 LaMa 실행 (세부 단계는 predict_lama 가 따로 기록), 샘플로 뽑히면 job 별 자원 기록
+            with ACCOUNTING.request("lama", [h]), stage("lama"):
+                result = run_lama_for_uid(
+                    config_path=str(LAMA_CONFIG_PATH),
+                    indir=str(entry_dir(STORE_DIR, h).parent),  # <uid> 디렉토리의 부모 (characters/ab/cd)
+                    uid=h,
+                    scale=tier.scale,
+                    fill_backend=tier.fill,
+                )
+        finally:
+            _observe_latency([h], started)
+        _record_lama_result(h, result, _result_version(tier))
+        return result
+    except Exception as e:
+        _log_lama_failure(h, e)
+        raise
+
+
+def _run_lama_batch(hs: list[str]) -> dict[str, Path | Exception]:
+    """작업 큐 워커에서 묶음 실행 (POST /characters/batch). 항목별 처리는 _run_lama_job 과 같고 generator 만 배치로."""
+    results: dict[str, Path | Exception] = {}
+    todo = []
+    for h in hs:
+        result = _reuse_pixel_twin(h)
+        if result is not None:
+            PIXEL_DEDUPES.inc(at="queued")
+            results[h] = result
+        else:
+            todo.append(h)
+    if not todo:
+        return results
     try:
-        cfg_path = BASE_DIR / "lama_runner" / "configs" / "prediction" / "lama-fourier.yaml"
-        run_lama_for_uid(
-            config_path=str(cfg_path),
-            indir=str(STORE_DIR),  # characters 루트
-            uid=h,
-        )
+        tier = _choose_tier(todo)
+        started = time.time()
+        try:
+            with ACCOUNTING.request("lama", todo), stage("lama"):
+                outputs = run_lama_batch(str(LAMA_CONFIG_PATH), [(entry_dir(STORE_DIR, h).parent, h) for h in todo],
+                                         scale=tier.scale, fill_backend=tier.fill)
+        finally:
+            _observe_latency(todo, started)
+        version = _result_version(tier)
     except Exception as e:
-        # 요구사항상 응답은 status만이므로, 실패는 로그에만 기록
-        with open(dest_dir / "logs.txt", "a", encoding="utf-8") as fp:
-            fp.write(f"[LaMa] {e}\n")
+        outputs, version = dict.fromkeys(todo, e), None
+    for h in todo:
+        result = outputs[h]
+        if isinstance(result, Exception):
+            _log_lama_failure(h, result)
+        else:
+            _record_lama_result(h, result, version)
+        results[h] = result
+    return results
+
+
+def _admission() -> AdmissionController:
+    global _ADMISSION
+    if _ADMISSION is None:
+        _ADMISSION = AdmissionController.from_settings(degrade_settings(LAMA_CONFIG_PATH), workers=JOB_WORKERS)
+    return _ADMISSION
+
+
+def _choose_tier(hs: list[str]) -> Tier:
+    """지금 지연/큐 깊이로 품질 단계를 골라 job 마다 기록한다 (job.json 의 tier, 응답 payload)."""
+    admission = _admission()
+    tier = admission.choose(JOB_QUEUE.depth())
+    QUALITY_LEVEL.set(admission.level)
+    for h in hs:
+        JOB_QUEUE.annotate(h, tier=tier.name)
+        QUALITY_TIERS.inc(tier=tier.name)
+    return tier
+
+
+def _observe_latency(hs: list[str], started: float) -> None:
+    """끝난 job 들의 end-to-end 지연(생성 → 지금)과 처리 시간(묶음이면 나눠서)을 품질 단계 판단에 넣는다."""
+    now = time.time()
+    service = (now - started) / len(hs)
+    for h in hs:
+        job = JOB_QUEUE.get(h)
+        _admission().observe(now - (job.created if job is not None else started), service)
+
+
+def _result_version(tier: Tier) -> str:
+    return model_version(LAMA_CONFIG_PATH, tier.name if tier.degraded else None)
+
+
+def _record_lama_result(h: str, result: Path, version: str) -> None:
+    PIXEL_INDEX.mark_done(h)
+    STORE_INDEX.upsert(h, result_bytes=result.stat().st_size, model_version=version)
+
+
+def _log_lama_failure(h: str, error: Exception) -> None:
+    """실패는 기존처럼 항목 디렉토리의 logs.txt 에도 남긴다."""
+    with open(entry_dir(STORE_DIR, h) / "logs.txt", "a", encoding="utf-8") as fp:
+        fp.write(f"[LaMa] {error}\n")
+
+
+def _reuse_pixel_twin(h: str) -> Optional[Path]:
+    """
+    h 와 디코드 픽셀이 같고 결과가 남아 있는 이전 job 을 찾아 그 결과를 h 의 항목 디렉토리 아래 같은 경로로
+    hard link (안 되면 복사) 하고 그 경로를 돌려준다. 없으면 None.
+    """
+    pixels = PIXEL_INDEX.pixel_hash_of(h)
+    if pixels is None:
+        return None
+    for twin_id in PIXEL_INDEX.done_twins(pixels, exclude=h):
+        twin = JOB_QUEUE.get(twin_id)
+        if twin is None or twin.state != DONE:
+            continue
+        src = entry_dir(STORE_DIR, twin_id) / twin.result
+        dst = entry_dir(STORE_DIR, h) / twin.result
+        if not src.exists():
+            continue
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        dst.unlink(missing_ok=True)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+        PIXEL_INDEX.mark_done(h)
+        source = STORE_INDEX.get(twin_id) or {}
+        STORE_INDEX.upsert(h, result_bytes=dst.stat().st_size, model_version=source.get("model_version"))
+        return dst
+    return None
+
+
+def _get_job_or_404(job_id: str) -> Job:
+    job = JOB_QUEUE.get(job_id) if JOB_ID_RE.match(job_id) else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
+
+
+def _job_payload(job: Job) -> dict:
+    payload = {"job_id": job.id, "state": job.state, "url": f"/characters/{job.id}",
+               "events_url": f"/characters/{job.id}/events"}
+    if job.state == DONE:
+        payload["result_url"] = f"/characters/{job.id}/result"
+    if job.tier:
+        payload["tier"] = job.tier
+    if job.error:
+        payload["error"] = job.error
+    return payload
+
+
+# 해시별 크기/상태/시간/모델 버전/마지막 접근 색인 — 캐시 조회, GC, 재처리 (modules/store.py)
+STORE_INDEX = StoreIndex(STORE_DIR / INDEX_FILE)
+JOB_QUEUE = JobQueue(STORE_DIR, _run_lama_job, workers=JOB_WORKERS, index=STORE_INDEX, batch_runner=_run_lama_batch)
+# 디코드 픽셀 해시 → job 색인 (원본 바이트가 달라도 같은 그림이면 결과 재사용)
+PIXEL_INDEX = PixelIndex(STORE_DIR / PIXEL_INDEX_FILE)
+
+
+@app.on_event("startup")
+def _share_metrics():
+    # fork/spawn 된 워커 안에서 — serve.py 워커는 이미 켜져 있다
+    if METRICS_DIR and REGISTRY.worker is None:
+        REGISTRY.share(Path(METRICS_DIR), str(os.getpid()))
+
+
+@app.on_event("startup")
+def _recover_jobs():
+    # 이전 프로세스에서 queued/running 으로 끝난 job 재실행
+    JOB_QUEUE.recover()
+
 
-    # 7) 상태만 반환
-    return JSONResponse({"status": "ok"})
+@app.on_event("startup")
+def _start_warmup():
+    # 이벤트 루프를 막지 않도록 스레드에서 — 그동안 /readyz 는 503, 업로드는 받아서 큐에 쌓는다
+    if _WARMUP["state"] == WARMING:
+        threading.Thread(target=warm_up, name="lama-warmup", daemon=True).start()
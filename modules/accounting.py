@@ -0,0 +1,215 @@
+"""
+요청별 자원 기록 (샘플링).
+샘플로 뽑힌 요청 하나(업로드, 배치 업로드, LaMa job 실행)마다 modules/metrics.stage() 단계별로
+- wall 시간, 그 단계를 돈 스레드의 CPU 시간, 프로세스 전체 CPU 시간 (torch intra-op 스레드 포함 — 동시에 도는 다른
+  요청도 섞인다)
+- 파이썬 할당 최댓값: tracemalloc 으로 본 단계 시작 대비 최대 증가량 (numpy 버퍼 포함, PIL·torch 내부 버퍼는 안 보임)
+- 텐서 최댓값: 단계에서 새로 잡힌 텐서 바이트의 최대 (modules/memtrack.py, CPU/GPU 공통)
+- 프로세스 RSS 최고점(ru_maxrss)이 단계 동안 오른 양 — 워커가 커진 순간이 어느 단계인지
+를 모아 요청이 끝나면 JSON 한 줄로 로그 파일에 쓰고, 켜면 메트릭 히스토그램(characters_stage_*)에도 넣는다.
+
+샘플이 아닌 요청은 stage() 가 ContextVar 하나 읽는 것 외에 비용이 없다. 샘플 요청은 측정 비용만큼 느려진다
+(tracemalloc 은 샘플 요청이 하나라도 도는 동안만 켠다 — 그동안 프로세스 전체의 파이썬 할당이 느려지고 섞인다).
+이벤트 루프 스레드에서 도는 단계(read)는 텐서를 재지 않고, 스레드 CPU 에 다른 코루틴 몫이 섞인다.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+from modules.memtrack import TensorMemoryTracker
+from modules.metrics import (STAGE_CPU_SECONDS, STAGE_OBSERVER, STAGE_PYTHON_PEAK_BYTES, STAGE_RSS_GROWTH_BYTES,
+                             STAGE_TENSOR_PEAK_BYTES)
+from modules.procmem import memory_usage
+
+# tracemalloc 은 프로세스 전체 하나 — 켠 샘플 요청 수와, reset_peak 전에 최댓값을 접어 넣을 모든 열린 단계
+_TRACE_LOCK = threading.Lock()
+_TRACE_USERS = 0
+_OPEN_FRAMES: set[_Frame] = set()
+
+
+@dataclass(eq=False)
+class _Frame:
+    name: str
+    thread: int
+    wall: float
+    thread_cpu: float
+    process_cpu: float
+    maxrss: int
+    python_base: int
+    python_peak: int
+    tracker: Optional[TensorMemoryTracker]
+    owns_tracker: bool
+    tensor_base: int = 0
+    tensor_peak: int = 0
+
+
+def _maxrss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Linux 는 KiB
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _start_tracing() -> None:
+    global _TRACE_USERS
+    with _TRACE_LOCK:
+        if _TRACE_USERS == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _TRACE_USERS += 1
+
+
+def _stop_tracing() -> None:
+    global _TRACE_USERS
+    with _TRACE_LOCK:
+        _TRACE_USERS -= 1
+        if _TRACE_USERS == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class ResourceRecord:
+    """샘플 요청 하나의 기록. 요청 안의 stage() 가 enter/exit 를 부른다 (metrics.STAGE_OBSERVER)."""
+
+    def __init__(self, kind: str, ids=()):
+        self.kind = kind
+        self.ids = list(ids)
+        self.started = time.time()
+        self.stages: dict[str, dict] = {}
+        self._frames: dict[int, list[_Frame]] = {}  # 스레드별 열린 단계 (스레드 안에서는 항상 중첩)
+        self._lock = threading.Lock()
+
+    def enter(self, name: str) -> _Frame:
+        thread = threading.get_ident()
+        with self._lock:
+            stack = self._frames.setdefault(thread, [])
+        # 텐서 추적기는 스레드마다 하나 (dispatch mode 가 스레드 로컬) — 바깥 단계 것을 이어 쓰고 최댓값만 새로 잰다
+        tracker = stack[-1].tracker if stack else None
+        owns_tracker = tracker is None and not _in_event_loop()
+        if owns_tracker:
+            tracker = TensorMemoryTracker()
+            tracker.__enter__()
+        elif tracker is not None:
+            for frame in stack:
+                frame.tensor_peak = max(frame.tensor_peak, tracker.peak_bytes)
+            tracker.reset_peak()
+        with _TRACE_LOCK:
+            python_now = 0
+            if tracemalloc.is_tracing():
+                python_now, python_peak = tracemalloc.get_traced_memory()
+                for frame in _OPEN_FRAMES:
+                    frame.python_peak = max(frame.python_peak, python_peak)
+                tracemalloc.reset_peak()
+            frame = _Frame(name, thread, time.perf_counter(), time.thread_time(), time.process_time(), _maxrss(),
+                           python_now, python_now, tracker, owns_tracker)
+            _OPEN_FRAMES.add(frame)
+        if tracker is not None:
+            frame.tensor_base = frame.tensor_peak = tracker.current_bytes
+        stack.append(frame)
+        return frame
+
+    def exit(self, frame: _Frame) -> None:
+        with _TRACE_LOCK:
+            _OPEN_FRAMES.discard(frame)
+            python_peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+        sample = {
+            "wall_seconds": time.perf_counter() - frame.wall,
+            "thread_cpu_seconds": time.thread_time() - frame.thread_cpu,
+            "process_cpu_seconds": time.process_time() - frame.process_cpu,
+            "python_peak_bytes": max(frame.python_peak, python_peak) - frame.python_base,
+            "tensor_peak_bytes": None,
+            "rss_peak_growth_bytes": _maxrss() - frame.maxrss,
+        }
+        if frame.tracker is not None:
+            sample["tensor_peak_bytes"] = max(frame.tensor_peak, frame.tracker.peak_bytes) - frame.tensor_base
+            if frame.owns_tracker:
+                frame.tracker.__exit__(None, None, None)
+        with self._lock:
+            self._frames[frame.thread].pop()
+            totals = self.stages.get(frame.name)
+            if totals is None:
+                self.stages[frame.name] = {"calls": 1, **sample}
+                return
+            totals["calls"] += 1
+            for key, value in sample.items():
+                if value is None:
+                    continue
+                if key.endswith("_seconds"):
+                    totals[key] += value
+                else:
+                    totals[key] = max(totals[key] or 0, value)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            stages = {name: dict(values) for name, values in self.stages.items()}
+        return {"kind": self.kind, "ids": self.ids, "started": self.started,
+                "wall_seconds": time.time() - self.started, "rss_bytes": memory_usage().get("rss"),
+                "stages": stages}
+
+
+def note_ids(*ids: str) -> None:
+    """지금 샘플 요청의 기록에 job id 를 붙인다 (업로드는 본문을 읽은 뒤에야 해시를 안다). 샘플이 아니면 no-op."""
+    record = STAGE_OBSERVER.get()
+    if record is not None:
+        record.ids.extend(ids)
+
+
+class ResourceAccounting:
+    """
+    sample_rate: 기록할 요청 비율 (0 = 끔, 1 = 전부). log_path: 기록을 JSON 한 줄씩 덧붙일 파일.
+    metrics=True 면 단계별 값을 characters_stage_* 히스토그램에도 넣는다.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, log_path: Optional[Path] = None, metrics: bool = False):
+        self.sample_rate = sample_rate
+        self.log_path = log_path
+        self.metrics = metrics
+        self._write_lock = threading.Lock()
+
+    @contextmanager
+    def request(self, kind: str, ids=()) -> Iterator[Optional[ResourceRecord]]:
+        """with 블록 = 요청 하나. 샘플로 뽑히면 ResourceRecord, 아니면 None."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            yield None
+            return
+        record = ResourceRecord(kind, ids)
+        _start_tracing()
+        token = STAGE_OBSERVER.set(record)
+        try:
+            yield record
+        finally:
+            STAGE_OBSERVER.reset(token)
+            _stop_tracing()
+            self._finish(record)
+
+    def _finish(self, record: ResourceRecord) -> None:
+        data = record.to_dict()
+        if self.metrics:
+            for name, values in data["stages"].items():
+                STAGE_CPU_SECONDS.observe(values["thread_cpu_seconds"], stage=name)
+                STAGE_PYTHON_PEAK_BYTES.observe(values["python_peak_bytes"], stage=name)
+                STAGE_RSS_GROWTH_BYTES.observe(values["rss_peak_growth_bytes"], stage=name)
+                if values["tensor_peak_bytes"] is not None:
+                    STAGE_TENSOR_PEAK_BYTES.observe(values["tensor_peak_bytes"], stage=name)
+        if self.log_path is None:
+            return
+        try:
+            with self._write_lock, open(self.log_path, "a", encoding="utf-8") as fp:
+                fp.write(json.dumps(data, sort_keys=True) + "\n")
+        except OSError as e:
+            # 기록 실패로 요청을 실패시키지 않는다
+            print(f"[accounting] {self.log_path}: {e}", file=sys.stderr)
@@ -0,0 +1,102 @@
+"""
+지연 SLO 기반 품질 단계 (admission control).
+최근 job 들의 end-to-end 지연(job 생성 → 끝) p95 와, 지금 큐 깊이 × 최근 평균 처리 시간으로 본 예상 대기 중
+큰 쪽이 목표 p95 를 넘으면 한 단계 낮추고 (generator 입력 해상도 축소 + 마스크 업샘플, 더 싼 채우기),
+목표 × recover_ratio 아래로 내려가면 한 단계씩 되돌린다. 단계를 바꾼 뒤에는 hold 개의 job 이 끝날 때까지 유지.
+지연 창은 시간 기준 (window_seconds) — 요청이 끊기면 오래된 지연이 빠지면서 원래 품질로 돌아온다.
+워커 프로세스마다 따로 판단한다 (큐도 프로세스마다 따로라서).
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class Tier:
+    name: str
+    scale: float = 1.0  # generator 입력 해상도 배율 (예측 마스크는 원래 크기로 업샘플)
+    fill: Optional[str] = None  # 채우기 백엔드 (None 이면 설정 fill.backend, 설정과 같으면 효과 없음)
+
+    @property
+    def degraded(self) -> bool:
+        return self.scale != 1.0 or self.fill is not None
+
+
+FULL = Tier("full")
+
+
+class AdmissionController:
+    def __init__(self, tiers: list[Tier], p95_target: float, window_seconds: float = 60.0,
+                 recover_ratio: float = 0.5, hold: int = 3, workers: int = 1):
+        self.tiers = tiers or [FULL]
+        self.p95_target = p95_target
+        self.window_seconds = window_seconds
+        self.recover_ratio = recover_ratio
+        self.hold = hold
+        self.workers = max(1, workers)
+        self.level = 0
+        self._samples: deque[tuple[float, float, float]] = deque()  # (끝난 시각, end-to-end 초, 처리 초)
+        self._since_change = hold
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: dict, workers: int = 1) -> "AdmissionController":
+        """predict_lama.degrade_settings() 의 dict 로. 꺼져 있으면 full 한 단계뿐."""
+        if not settings.get("enabled", False):
+            return cls([FULL], math.inf, workers=workers)
+        tiers = [Tier(str(t["name"]), float(t.get("scale", 1.0)), t.get("fill")) for t in settings.get("tiers", [])]
+        return cls(tiers, float(settings.get("p95_target_ms", 30000)) / 1000,
+                   window_seconds=float(settings.get("window_seconds", 60)),
+                   recover_ratio=float(settings.get("recover_ratio", 0.5)),
+                   hold=int(settings.get("hold", 3)), workers=workers)
+
+    def choose(self, queue_depth: int) -> Tier:
+        """다음 job 을 돌릴 단계. queue_depth = 이 프로세스에서 queued + running 인 job 수."""
+        with self._lock:
+            pressure = self._pressure(queue_depth)
+            if self._since_change >= self.hold:
+                if pressure > self.p95_target and self.level < len(self.tiers) - 1:
+                    self.level += 1
+                    self._since_change = 0
+                elif pressure < self.p95_target * self.recover_ratio and self.level > 0:
+                    self.level -= 1
+                    self._since_change = 0
+            return self.tiers[self.level]
+
+    def observe(self, latency: float, service: float) -> None:
+        """job 하나가 끝났을 때: latency = 생성부터 끝까지 초, service = 실제 처리 초."""
+        with self._lock:
+            self._samples.append((time.monotonic(), latency, service))
+            self._since_change += 1
+
+    def snapshot(self, queue_depth: int = 0) -> dict:
+        with self._lock:
+            self._expire()
+            return {"level": self.level, "tier": self.tiers[self.level].name, "p95_seconds": self._p95(),
+                    "expected_wait_seconds": self._expected_wait(queue_depth), "samples": len(self._samples)}
+
+    def _pressure(self, queue_depth: int) -> float:
+        self._expire()
+        return max(self._p95(), self._expected_wait(queue_depth))
+
+    def _expire(self) -> None:
+        horizon = time.monotonic() - self.window_seconds
+        while self._samples and self._samples[0][0] < horizon:
+            self._samples.popleft()
+
+    def _p95(self) -> float:
+        if not self._samples:
+            return 0.0
+        latencies = sorted(sample[1] for sample in self._samples)
+        return latencies[min(len(latencies) - 1, math.ceil(0.95 * len(latencies)) - 1)]
+
+    def _expected_wait(self, queue_depth: int) -> float:
+        if not self._samples:
+            return 0.0
+        mean_service = sum(sample[2] for sample in self._samples) / len(self._samples)
+        return queue_depth * mean_service / self.workers
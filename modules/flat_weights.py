@@ -0,0 +1,156 @@
+"""
+mmap 으로 바로 쓰는 평탄한 가중치 파일 (safetensors 레이아웃 — safetensors 패키지 없이 읽고 쓴다).
+
+    [8 bytes little-endian 헤더 길이 N][N bytes JSON 헤더 (8 배수로 공백 패딩)][텐서 바이트들]
+    헤더: {"<name>": {"dtype": "F32", "shape": [...], "data_offsets": [begin, end]}, "__metadata__": {...}}
+
+.ckpt 는 torch.load 로 새 텐서를 만들고 load_state_dict 가 모듈 파라미터로 한 번 더 복사한다 (가중치 2 벌).
+여기서는 파일을 통째로 mmap(MAP_PRIVATE) 하고 텐서는 그 view 로 만든 뒤, meta 장치에서 만든 모델에
+assign 으로 붙인다 → 복사 없음, 페이지는 실제로 읽힐 때만 올라오고 같은 파일을 연 프로세스끼리 page cache 를 공유.
+
+    python -m modules.flat_weights path/to/epoch=3-step=3599_generator.ckpt   # → 같은 이름의 .safetensors
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import pickle
+import struct
+import zipfile
+from itertools import chain
+from pathlib import Path
+from typing import Callable
+
+import torch
+
+FLAT_SUFFIX = ".safetensors"
+_ALIGN = 8
+
+_DTYPES = {
+    torch.float64: "F64",
+    torch.float32: "F32",
+    torch.float16: "F16",
+    torch.bfloat16: "BF16",
+    torch.int64: "I64",
+    torch.int32: "I32",
+    torch.int16: "I16",
+    torch.int8: "I8",
+    torch.uint8: "U8",
+    torch.bool: "BOOL",
+}
+_DTYPES_BY_NAME = {name: dtype for dtype, name in _DTYPES.items()}
+
+
+def save_flat(state_dict: dict[str, torch.Tensor], path, metadata: dict[str, str] | None = None) -> Path:
+    # itemsize 가 큰 것부터 → 모든 텐서 시작 오프셋이 자기 dtype 크기의 배수 (view(dtype) 가능)
+    items = sorted(((name, t.detach().cpu().contiguous()) for name, t in state_dict.items()),
+                   key=lambda item: -item[1].element_size())
+    header, offset = {}, 0
+    for name, t in items:
+        if t.dtype not in _DTYPES:
+            raise TypeError(f"{name}: unsupported dtype {t.dtype}")
+        nbytes = t.numel() * t.element_size()
+        header[name] = {"dtype": _DTYPES[t.dtype], "shape": list(t.shape), "data_offsets": [offset, offset + nbytes]}
+        offset += nbytes
+    if metadata:
+        header["__metadata__"] = {str(k): str(v) for k, v in metadata.items()}
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % _ALIGN)
+
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for _, t in items:
+            if t.numel():
+                f.write(t.reshape(-1).view(torch.uint8).numpy().tobytes())
+    tmp.replace(path)
+    return path
+
+
+def read_header(path) -> tuple[dict, int]:
+    """(헤더 dict, 데이터 시작 바이트 위치)."""
+    with open(path, "rb") as f:
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len))
+    return header, 8 + header_len
+
+
+def load_flat(path) -> dict[str, torch.Tensor]:
+    """파일 전체를 private mmap 한 uint8 텐서의 view 들. 쓰기는 프로세스 안에서만 보인다 (copy-on-write)."""
+    path = Path(path)
+    header, data_start = read_header(path)
+    header.pop("__metadata__", None)
+    size = path.stat().st_size
+    buffer = torch.from_file(str(path), shared=False, size=size, dtype=torch.uint8)
+    state = {}
+    for name, info in header.items():
+        begin, end = info["data_offsets"]
+        dtype = _DTYPES_BY_NAME[info["dtype"]]
+        state[name] = buffer[data_start + begin:data_start + end].view(dtype).view(info["shape"])
+    return state
+
+
+def load_state(path, map_location="cpu") -> dict[str, torch.Tensor]:
+    """.safetensors 는 load_flat, zip 포맷 .ckpt 는 torch.load(mmap=True), 옛 포맷은 일반 torch.load."""
+    path = Path(path)
+    if path.suffix == FLAT_SUFFIX:
+        return load_flat(path)
+    if zipfile.is_zipfile(path):
+        try:
+            return torch.load(path, map_location=map_location, mmap=True, weights_only=True)
+        except pickle.UnpicklingError:  # 텐서 외 객체가 든 체크포인트
+            return torch.load(path, map_location=map_location, mmap=True, weights_only=False)
+    return torch.load(path, map_location=map_location)
+
+
+def materialize(factory: Callable[[], torch.nn.Module], state: dict[str, torch.Tensor], strict=False):
+    """
+    factory() 를 meta 장치에서 불러 파라미터 할당/초기화를 건너뛰고, state 텐서를 그대로(assign) 붙인다.
+    state 에 없는 텐서(missing key, non-persistent buffer, 모듈 속성 텐서)가 meta 로 남으면
+    보통 장치에서 다시 만들어 붙인다 (그 경우에도 state 텐서 자체는 복사하지 않음).
+    """
+    with torch.device("meta"):
+        model = factory()
+    model.load_state_dict(state, strict=strict, assign=True)
+    if not _has_meta_tensors(model):
+        return model
+    model = factory()
+    model.load_state_dict(state, strict=strict, assign=True)
+    return model
+
+
+def _has_meta_tensors(model) -> bool:
+    tensors = chain(model.parameters(), model.buffers(),
+                    (v for m in model.modules() for v in vars(m).values() if torch.is_tensor(v)))
+    return any(t.is_meta for t in tensors)
+
+
+def is_mapped(t: torch.Tensor) -> bool:
+    """mmap 된 파일 위의 텐서인지 (from_file / torch.load(mmap=True) 의 storage 는 resizable 하지 않다)."""
+    return t.device.type == "cpu" and not t.untyped_storage().resizable()
+
+
+def convert(ckpt_path, out_path=None) -> Path:
+    ckpt_path = Path(ckpt_path)
+    out_path = Path(out_path) if out_path else ckpt_path.with_suffix(FLAT_SUFFIX)
+    state = torch.load(ckpt_path, map_location="cpu")
+    if "state_dict" in state and not torch.is_tensor(state["state_dict"]):  # lightning 체크포인트
+        state = state["state_dict"]
+    state = {k: v for k, v in state.items() if torch.is_tensor(v)}
+    return save_flat(state, out_path, metadata={"source": ckpt_path.name})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LaMa generator .ckpt → mmap 가능한 .safetensors")
+    parser.add_argument("ckpt")
+    parser.add_argument("out", nargs="?", default=None, help="기본: 같은 이름 + .safetensors")
+    args = parser.parse_args()
+    out_path = convert(args.ckpt, args.out)
+    reloaded = load_flat(out_path)
+    print(f"{out_path} ({len(reloaded)} tensors, {out_path.stat().st_size / 2 ** 20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+인페인팅 후처리의 구멍 채우기 백엔드. 인터페이스는 모두 같다:
+
+    fill_holes(images, holes, backend) → images
+    images: (B, 3, H, W) uint8 텐서, holes: (B, 1, H, W) bool (True = 채울 픽셀). 결과는 images 와 같은 장치.
+
+- telea:     cv2.inpaint(INPAINT_TELEA, radius 3). fast marching 이라 순차적이고 한 스레드, 구멍 면적에 비례해 느려진다.
+- push_pull: 다중 해상도 피라미드. 알려진 픽셀만 가중 평균으로 내려가며(push) 모으고, 거친 단계 색을 bilinear 로
+             올려 구멍만 채운다(pull). 전부 텐서 연산이라 배치째로, 모델과 같은 장치에서 돈다. 알려진 픽셀은 그대로.
+"""
+from __future__ import annotations
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+TELEA_RADIUS = 3
+
+
+def telea(images: torch.Tensor, holes: torch.Tensor) -> torch.Tensor:
+    out = []
+    for image, hole in zip(images.cpu().numpy(), holes.cpu().numpy()):
+        mask = hole[0].astype(np.uint8) * 255
+        out.append(cv2.inpaint(np.ascontiguousarray(image.transpose(1, 2, 0)), mask, TELEA_RADIUS,
+                               cv2.INPAINT_TELEA).transpose(2, 0, 1))
+    return torch.from_numpy(np.stack(out)).to(images.device)
+
+
+def push_pull(images: torch.Tensor, holes: torch.Tensor) -> torch.Tensor:
+    x = images.float()
+    known = (~holes).to(x.dtype)
+    filled = _push_pull(x * known, known)
+    return torch.where(holes, filled.round().clamp(0, 255), x).to(images.dtype)
+
+
+def _push_pull(premultiplied: torch.Tensor, weight: torch.Tensor) -> torch.Tensor:
+    """
+    premultiplied = color * weight, weight ∈ [0, 1] (이 칸에서 알려진 픽셀 비율).
+    한 단계 pull: color = premultiplied + (1 - weight) * upsample(거친 단계 color).
+    맨 아래(weight 가 0/1)에서는 알려진 픽셀은 그대로, 구멍은 위에서 올라온 색.
+    """
+    pyramid = [(premultiplied, weight)]
+    while max(premultiplied.shape[-2:]) > 1:
+        # ceil_mode: 홀수 변의 마지막 칸은 캔버스 안 픽셀만으로 평균
+        premultiplied = F.avg_pool2d(premultiplied, 2, ceil_mode=True)
+        weight = F.avg_pool2d(weight, 2, ceil_mode=True)
+        pyramid.append((premultiplied, weight))
+
+    premultiplied, weight = pyramid.pop()
+    color = premultiplied / weight.clamp_min(1e-8)  # 알려진 픽셀이 하나도 없으면 0
+    while pyramid:
+        premultiplied, weight = pyramid.pop()
+        coarse = F.interpolate(color, size=premultiplied.shape[-2:], mode="bilinear", align_corners=False)
+        color = premultiplied + (1 - weight) * coarse
+    return color
+
+
+FILL_BACKENDS = {"telea": telea, "push_pull": push_pull}
+
+
+def fill_holes(images: torch.Tensor, holes: torch.Tensor, backend: str = "telea") -> torch.Tensor:
+    if backend not in FILL_BACKENDS:
+        raise ValueError(f"unknown fill backend {backend!r} (expected one of {sorted(FILL_BACKENDS)})")
+    if not holes.any():
+        return images
+    return FILL_BACKENDS[backend](images, holes)
@@ -0,0 +1,250 @@
+"""
+/characters 비동기 작업 큐 (외부 서비스 없이 프로세스 안에서 돈다).
+- job id = 업로드 내용의 sha256 → 같은 내용의 동시 업로드는 하나의 job 으로 합쳐진다.
+- 상태는 characters/ab/cd/<h>/job.json 에 기록 (파일 기반, modules/store.py 레이아웃), 색인이 있으면 같이 갱신.
+  재시작 시 queued/running 으로 남은 job 은 다시 큐에 넣는다.
+- 여러 uvicorn 워커 프로세스: job 을 만드는 구간은 sha256 별 파일 락(single-flight)으로 막고,
+  job.json 의 owner(pid) 가 살아 있으면 다른 워커가 진행 중인 것으로 보고 그 job 에 합류한다.
+- 실행은 워커 스레드. 메모리에는 진행 중(queued/running) job 만 두고, 끝난 job 은 job.json 에서 읽는다.
+- 큐의 한 단위는 job id 묶음: submit 은 한 개짜리, enqueue 는 여러 개 — batch_runner 가 있으면 묶음을 한 번에 실행.
+"""
+from __future__ import annotations
+
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from modules.metrics import JOBS, QUEUE_DEPTH
+from modules.singleflight import FileLock, SingleFlight, pid_alive
+from modules.store import StoreIndex, entry_dir
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED_STATES = (DONE, FAILED)
+
+JOB_FILE = "job.json"
+
+
+@dataclass
+class Job:
+    id: str
+    state: str
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Optional[str] = None  # 결과 PNG 경로 (항목 디렉토리 기준 상대경로)
+    error: Optional[str] = None
+    owner: Optional[int] = None  # job 을 큐에 넣은 워커 프로세스 pid
+    tier: Optional[str] = None  # 실행한 품질 단계 (modules/admission.py)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class JobQueue:
+    """
+    runner(job_id) -> 결과 파일 Path 를 워커 스레드에서 실행.
+    batch_runner([job_id, ...]) -> {job_id: Path 또는 Exception} 은 enqueue 로 넣은 묶음용 (없으면 runner 를 차례로).
+    submit 은 같은 id 의 job 이 진행 중이거나 이미 성공했으면 새로 만들지 않고 그 job 을 돌려준다.
+    """
+
+    def __init__(self, store_dir: Path, runner: Callable[[str], Path], workers: int = 1,
+                 index: Optional[StoreIndex] = None,
+                 batch_runner: Optional[Callable[[list[str]], dict[str, Path | Exception]]] = None):
+        self.store_dir = Path(store_dir)
+        self.runner = runner
+        self.batch_runner = batch_runner
+        self.workers = workers
+        self.index = index
+        self._active: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._queue: queue.Queue[tuple[str, ...]] = queue.Queue()
+        self._threads: list[threading.Thread] = []
+        self._flights = SingleFlight(self.store_dir / ".locks")
+
+    # ----- 조회/등록 -----
+    def flight(self, job_id: str) -> FileLock:
+        """job_id 별 프로세스 간 락. 입력 파일 쓰기 ~ submit 을 이 락 안에서 하면 같은 내용은 한 번만 처리된다."""
+        return self._flights.lock(job_id)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._active.get(job_id)
+            return Job(**job.to_dict()) if job is not None else self._load(job_id)
+
+    def join(self, job_id: str) -> Optional[Job]:
+        """같은 id 의 job 이 진행 중이거나 결과가 남아 있으면 그 job (중복 업로드로 센다), 아니면 None."""
+        with self._lock:
+            job = self._reusable(job_id)
+        if job is not None:
+            JOBS.inc(result="deduplicated")
+        return job
+
+    def submit(self, job_id: str, enqueue: bool = True) -> tuple[Job, bool]:
+        """
+        반환: (job, 새로 만들었는지). 재사용 가능한 job 이 있으면 새로 만들지 않는다.
+        다른 프로세스와의 중복을 막으려면 flight(job_id) 를 잡은 채로 부른다.
+        enqueue=False 면 queued job 만 만들어 두고 (같은 내용의 다른 요청은 합류한다) 실행은 나중에 enqueue() 로.
+        """
+        with self._lock:
+            job = self._reusable(job_id)
+            if job is None:
+                job = Job(id=job_id, state=QUEUED, created=time.time(), owner=os.getpid())
+                self._active[job_id] = job
+                self._save(job)
+                QUEUE_DEPTH.inc()
+                created = True
+            else:
+                created = False
+            snapshot = Job(**job.to_dict())
+        if not created:
+            JOBS.inc(result="deduplicated")
+        elif enqueue:
+            self.enqueue([job_id])
+        return snapshot, created
+
+    def enqueue(self, job_ids) -> None:
+        """submit(enqueue=False) 로 만든 job 들을 한 단위로 큐에 넣는다."""
+        job_ids = tuple(job_ids)
+        if job_ids:
+            self._queue.put(job_ids)
+            self._ensure_workers()
+
+    def depth(self) -> int:
+        """이 프로세스에서 queued + running 인 job 수."""
+        with self._lock:
+            return len(self._active)
+
+    def annotate(self, job_id: str, **changes) -> None:
+        """진행 중인 job 에 필드를 기록 (runner 안에서, 예: 고른 품질 단계)."""
+        self._update(job_id, **changes)
+
+    def complete(self, job_id: str, result: Path) -> Job:
+        """
+        runner 없이 이미 준비된 결과로 끝난 job 을 기록한다 (예: 픽셀이 같은 이전 업로드의 결과를 링크한 경우).
+        flight(job_id) 를 잡은 채로 부른다.
+        """
+        now = time.time()
+        job = Job(id=job_id, state=DONE, created=now, started=now, finished=now,
+                  result=str(Path(result).relative_to(entry_dir(self.store_dir, job_id))), owner=os.getpid())
+        with self._lock:
+            self._save(job)
+        JOBS.inc(result=DONE)
+        return Job(**job.to_dict())
+
+    def recover(self) -> list[str]:
+        """이전 프로세스가 끝내지 못한 job 들을 다시 큐에 넣는다 (앱 시작 시 호출)."""
+        resubmitted = []
+        if self.index is not None:
+            job_ids = self.index.select(statuses=(QUEUED, RUNNING))
+        else:
+            job_ids = [path.parent.name for path in sorted(self.store_dir.glob(f"*/*/*/{JOB_FILE}"))]
+        for job_id in job_ids:
+            job = self._load(job_id)
+            if job is None or job.state in FINISHED_STATES:
+                continue
+            # 워커 여러 개가 동시에 떠도 한 곳에서만 다시 돌도록
+            with self.flight(job.id):
+                if self.submit(job.id)[1]:
+                    resubmitted.append(job.id)
+        return resubmitted
+
+    # ----- 워커 -----
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(self.workers - len(self._threads)):
+                thread = threading.Thread(target=self._work, name=f"characters-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self) -> None:
+        while True:
+            job_ids = self._queue.get()
+            try:
+                if self.batch_runner is not None and len(job_ids) > 1:
+                    self._run_batch(job_ids)
+                else:
+                    for job_id in job_ids:
+                        self._update(job_id, state=RUNNING, started=time.time())
+                        try:
+                            result = self.runner(job_id)
+                        except Exception as e:
+                            result = e
+                        self._record(job_id, result)
+            finally:
+                QUEUE_DEPTH.dec(len(job_ids))
+                self._queue.task_done()
+
+    def _run_batch(self, job_ids: tuple[str, ...]) -> None:
+        started = time.time()
+        for job_id in job_ids:
+            self._update(job_id, state=RUNNING, started=started)
+        try:
+            results = self.batch_runner(list(job_ids))
+        except Exception as e:
+            results = dict.fromkeys(job_ids, e)
+        for job_id in job_ids:
+            self._record(job_id, results.get(job_id, RuntimeError("batch runner returned no result")))
+
+    def _record(self, job_id: str, result: Path | Exception) -> None:
+        if isinstance(result, Exception):
+            self._finish(job_id, state=FAILED, error=f"{type(result).__name__}: {result}")
+        else:
+            self._finish(job_id, state=DONE, result=str(Path(result).relative_to(entry_dir(self.store_dir, job_id))))
+
+    def _update(self, job_id: str, **changes) -> None:
+        with self._lock:
+            job = self._active[job_id]
+            for key, value in changes.items():
+                setattr(job, key, value)
+            self._save(job)
+
+    def _finish(self, job_id: str, **changes) -> None:
+        self._update(job_id, finished=time.time(), **changes)
+        with self._lock:
+            del self._active[job_id]
+        JOBS.inc(result=changes["state"])
+
+    def _reusable(self, job_id: str) -> Optional[Job]:
+        job = self._active.get(job_id)
+        if job is not None:
+            return Job(**job.to_dict())
+        job = self._load(job_id)
+        if job is None:
+            return None
+        if job.state == DONE:
+            return job if self._result_exists(job) else None
+        if job.state in (QUEUED, RUNNING):
+            # 살아 있는 다른 워커의 job 이면 합류, 죽은 프로세스가 남긴 것이면 다시 돌린다
+            return job if job.owner != os.getpid() and pid_alive(job.owner) else None
+        return None
+
+    # ----- job.json -----
+    def _job_path(self, job_id: str) -> Path:
+        return entry_dir(self.store_dir, job_id) / JOB_FILE
+
+    def _result_exists(self, job: Job) -> bool:
+        return job.result is not None and (entry_dir(self.store_dir, job.id) / job.result).exists()
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        try:
+            return Job(**json.loads(self._job_path(job_id).read_text(encoding="utf-8")))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _save(self, job: Job) -> None:
+        path = self._job_path(job.id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(job.to_dict()), encoding="utf-8")
+        os.replace(tmp, path)
+        if self.index is not None:
+            self.index.record_job(job)
@@ -0,0 +1,57 @@
+"""
+텐서 메모리 추적 (장치 무관, 파이썬만으로).
+TorchDispatchMode 로 연산 출력 중 새로 잡힌 storage 를 기록하고 StorageWeakRef 로 해제를 확인해, 추적 구간에서
+잡힌 텐서 바이트의 현재값/최댓값을 잰다. 구간 전에 있던 텐서(가중치, 입력)는 세지 않는다 — 활성값 메모리.
+연산 내부의 임시 작업 공간(conv/FFT 라이브러리가 텐서 밖에서 잡는 것)은 보이지 않는다.
+
+    with TensorMemoryTracker() as tracker:
+        model(x)
+    tracker.peak_bytes
+"""
+from __future__ import annotations
+
+import torch
+from torch.multiprocessing.reductions import StorageWeakRef
+from torch.utils._python_dispatch import TorchDispatchMode
+from torch.utils._pytree import tree_leaves
+
+
+class TensorMemoryTracker(TorchDispatchMode):
+    def __init__(self):
+        super().__init__()
+        self.current_bytes = 0
+        self.peak_bytes = 0
+        self.allocated_bytes = 0  # 구간 동안 새로 잡힌 바이트 합 (해제 여부 무관)
+        self.allocations = 0
+        self._live: dict[int, tuple[StorageWeakRef, int]] = {}  # storage 주소 → (약한 참조, 바이트)
+
+    def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+        kwargs = kwargs or {}
+        out = func(*args, **kwargs)
+        self._expire()
+        inputs = {arg.untyped_storage().data_ptr() for arg in tree_leaves((args, kwargs))
+                  if isinstance(arg, torch.Tensor)}
+        for tensor in tree_leaves(out):
+            if isinstance(tensor, torch.Tensor):
+                self._record(tensor.untyped_storage(), inputs)
+        return out
+
+    def reset_peak(self) -> None:
+        """peak_bytes 를 지금 값부터 다시 잰다 (구간 안의 하위 구간 최댓값용)."""
+        self._expire()
+        self.peak_bytes = self.current_bytes
+
+    def _record(self, storage, inputs: set[int]) -> None:
+        key = storage.data_ptr()
+        nbytes = storage.nbytes()
+        if key in inputs or key in self._live or nbytes == 0:
+            return  # view, in-place/out= 결과, 이미 센 storage
+        self._live[key] = (StorageWeakRef(storage), nbytes)
+        self.current_bytes += nbytes
+        self.allocated_bytes += nbytes
+        self.allocations += 1
+        self.peak_bytes = max(self.peak_bytes, self.current_bytes)
+
+    def _expire(self) -> None:
+        for key in [key for key, (ref, _) in self._live.items() if ref.expired()]:
+            self.current_bytes -= self._live.pop(key)[1]
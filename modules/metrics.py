@@ -0,0 +1,300 @@
+"""
+의존성 없는 Prometheus 텍스트 포맷(0.0.4) 메트릭.
+prometheus_client 없이 오프라인에서도 /metrics 로 노출할 수 있게 최소한의 Counter/Gauge/Histogram 만 구현.
+
+워커 여러 개(serve.py 의 fork, uvicorn --workers)는 레지스트리를 각자 가지는데, 리슨 소켓을 같이 쓰므로 스크레이프
+한 번은 그중 아무 워커 하나에 간다. REGISTRY.share(dir, worker) 를 켜면 모든 시리즈에 worker 라벨이 붙고,
+각 워커가 자기 값을 dir/<worker>.json 에 주기적으로 덤프해서, 어느 워커가 받든 /metrics 는 전 워커의 시리즈를
+worker 라벨로 나눠 돌려준다 (다른 워커 값은 최대 덤프 주기만큼 늦다). 합계는 쿼리에서 sum without (worker).
+serve.py 는 자동으로 켠다. uvicorn --workers 는 CHARACTERS_METRICS_DIR 를 주면 pid 를 worker 라벨로 켠다.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Optional
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+BYTE_BUCKETS = tuple(4 ** k * 2 ** 16 for k in range(10)) + (math.inf,)  # 64 KiB ... 16 GiB
+
+# 샘플로 뽑힌 요청의 자원 기록 (modules/accounting.py 의 ResourceRecord). 없으면 stage() 는 시간만 잰다
+STAGE_OBSERVER: ContextVar = ContextVar("stage_observer", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=()) -> str:
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self, const=()) -> list[str]:
+        """샘플 줄들. const: 모든 샘플에 붙일 (이름, 값) 라벨 (worker)."""
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = []
+        for key, value in items:
+            lines += self._render_sample(key, value, list(const))
+        return lines
+
+    def render(self) -> list[str]:
+        return self.header() + self.samples()
+
+    def _render_sample(self, key, value, const) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key, const)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(set(buckets) | {math.inf}))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """with 블록의 소요 시간(초)을 기록. 예외가 나도 기록한다."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key, value, const) -> list[str]:
+        counts, total = value
+        lines = [
+            f"{self.name}_bucket{_format_labels(self.labelnames, key, const + [('le', _format_value(bound))])} {count}"
+            for bound, count in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key, const)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key, const)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._collectors: list[Callable[[], None]] = []
+        self._share_dir: Optional[Path] = None
+        self._worker: Optional[str] = None
+        self._share_thread: Optional[threading.Thread] = None
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"duplicate metric {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def on_collect(self, fn: Callable[[], None]) -> None:
+        """렌더/덤프 직전에 부를 함수 (스크레이프 때 새로 재는 게이지)."""
+        self._collectors.append(fn)
+
+    def share(self, share_dir: Path, worker: str, interval: float = 5.0) -> None:
+        """
+        이 프로세스를 worker 로 표시하고 share_dir 로 다른 워커들과 메트릭을 나눈다 (모듈 docstring).
+        fork 뒤 워커 안에서 부른다. interval 초마다 덤프하는 데몬 스레드를 띄운다.
+        """
+        self._share_dir = Path(share_dir)
+        self._share_dir.mkdir(parents=True, exist_ok=True)
+        self._worker = str(worker)
+        self._dump()
+        if self._share_thread is None:
+            def _loop():
+                while True:
+                    time.sleep(interval)
+                    self._dump()
+
+            self._share_thread = threading.Thread(target=_loop, name="metrics-share", daemon=True)
+            self._share_thread.start()
+
+    @property
+    def worker(self) -> Optional[str]:
+        """share() 로 정한 worker 라벨 (안 켰으면 None)."""
+        return self._worker
+
+    def _collect(self) -> dict[str, list[str]]:
+        for fn in self._collectors:
+            fn()
+        const = [("worker", self._worker)] if self._worker is not None else []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.samples(const) for metric in metrics}
+
+    def _dump(self) -> None:
+        path = self._share_dir / f"{self._worker}.json"
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self._collect()), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _shared_samples(self) -> list[dict[str, list[str]]]:
+        others = []
+        for path in sorted(self._share_dir.glob("*.json")):
+            if path.stem == self._worker:
+                continue
+            try:
+                others.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue  # 덤프 중이거나 지워진 파일
+        return others
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        own = self._collect()
+        others = self._shared_samples() if self._share_dir is not None else []
+        lines = []
+        for metric in metrics:
+            lines += metric.header() + own[metric.name]
+            for samples in others:
+                lines += samples.get(metric.name, [])
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ===== 서비스 메트릭 =====
+REQUESTS = REGISTRY.register(Counter(
+    "characters_requests_total", "Upload requests (POST /characters, /characters/batch) by route and HTTP status.",
+    ["route", "status"]))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "characters_request_seconds", "End-to-end upload request latency in seconds by route.", ["route"]))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "characters_stage_seconds",
+    "Per-stage latency in seconds (read = streamed read + sha256 + spool, singleflight_wait, write_input, convert, "
+    "lama = model_load + load_input + crop + inference + post_process + write, run by the job worker; warmup once "
+    "at startup).", ["stage"]))
+FAILURES = REGISTRY.register(Counter(
+    "characters_failures_total", "Pipeline failures by stage and exception class.", ["stage", "exception"]))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "characters_cache_lookups_total", "Uploads whose content hash was already stored (hit) or new (miss).",
+    ["result"]))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "characters_queue_depth", "LaMa jobs queued or running."))
+JOBS = REGISTRY.register(Counter(
+    "characters_jobs_total", "LaMa jobs by outcome (done, failed, or deduplicated into an existing job).",
+    ["result"]))
+PIXEL_DEDUPES = REGISTRY.register(Counter(
+    "characters_pixel_dedupes_total",
+    "Uploads with new bytes but pixels identical to an earlier result, served by linking that result "
+    "(at = ingest or queued).", ["at"]))
+BATCH_ITEMS = REGISTRY.register(Counter(
+    "characters_batch_items_total",
+    "POST /characters/batch items by manifest status (new, existing, duplicate within the request, rejected).",
+    ["status"]))
+QUALITY_TIERS = REGISTRY.register(Counter(
+    "characters_quality_tier_total", "LaMa jobs by the quality tier they ran at (modules/admission.py).", ["tier"]))
+QUALITY_LEVEL = REGISTRY.register(Gauge(
+    "characters_quality_level", "Current quality tier index of this worker (0 = full quality)."))
+MODEL_LOADS = REGISTRY.register(Counter(
+    "lama_model_loads_total", "Generator checkpoint loads."))
+READINESS = REGISTRY.register(Gauge(
+    "characters_ready", "1 once this worker finished startup warm-up (GET /readyz returns 200)."))
+PROCESS_MEMORY = REGISTRY.register(Gauge(
+    "characters_process_memory_bytes", "This worker's memory (rss, pss, uss, shared), refreshed on scrape.",
+    ["kind"]))
+# 아래는 modules/accounting.py 가 샘플로 뽑은 요청에서만, CHARACTERS_RESOURCE_METRICS 가 켜졌을 때 채운다
+STAGE_CPU_SECONDS = REGISTRY.register(Histogram(
+    "characters_stage_cpu_seconds", "CPU seconds of the thread running each stage (sampled requests).", ["stage"]))
+STAGE_PYTHON_PEAK_BYTES = REGISTRY.register(Histogram(
+    "characters_stage_python_peak_bytes",
+    "Peak Python allocations (tracemalloc) above the stage's starting level (sampled requests).", ["stage"],
+    buckets=BYTE_BUCKETS))
+STAGE_TENSOR_PEAK_BYTES = REGISTRY.register(Histogram(
+    "characters_stage_tensor_peak_bytes", "Peak memory of tensors allocated during the stage (sampled requests).",
+    ["stage"], buckets=BYTE_BUCKETS))
+STAGE_RSS_GROWTH_BYTES = REGISTRY.register(Histogram(
+    "characters_stage_rss_peak_growth_bytes",
+    "How far the process's peak RSS rose during the stage (sampled requests).", ["stage"], buckets=BYTE_BUCKETS))
+
+
+@contextmanager
+def stage(name: str):
+    """
+    파이프라인 단계 하나를 STAGE_SECONDS 에 기록하고, 예외는 FAILURES 에 세고 그대로 올린다.
+    샘플 요청 안이면 그 요청의 자원 기록에도 단계별 CPU/메모리를 남긴다 (modules/accounting.py).
+    """
+    observer = STAGE_OBSERVER.get()
+    frame = observer.enter(name) if observer is not None else None
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        FAILURES.inc(stage=name, exception=type(e).__name__)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+        if frame is not None:
+            observer.exit(frame)
@@ -0,0 +1,75 @@
+"""
+디코드된 픽셀 기준 중복 색인 (SQLite 파일 하나, 재시작해도 남는다).
+업로드 sha256 은 바이트가 같아야 맞는다 — 같은 그림을 다른 압축 수준/메타데이터/무손실 포맷으로 다시 저장하면 매번 새로 돈다.
+여기서는 RGBA 로 디코드한 버퍼(크기 포함)의 sha256 을 job id 에 묶어 두고, 같은 픽셀의 끝난 job 을 찾아 준다.
+(JPEG 처럼 손실 압축으로 다시 인코딩하면 픽셀 자체가 달라지므로 맞지 않는다)
+연결은 호출마다 새로 연다 — 스레드/워커 프로세스 어디서 불러도 되고, 동시 쓰기는 SQLite 잠금(WAL)이 맡는다.
+"""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+PIXEL_INDEX_FILE = ".pixels.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pixels (
+    job_id TEXT PRIMARY KEY,
+    pixel_hash TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS pixels_by_hash ON pixels (pixel_hash, done);
+"""
+
+
+def pixel_hash(im: Image.Image) -> str:
+    """RGBA 이미지의 크기 + 픽셀 버퍼 sha256."""
+    if im.mode != "RGBA":
+        im = im.convert("RGBA")
+    hasher = hashlib.sha256(f"RGBA {im.width}x{im.height}\n".encode())
+    hasher.update(im.tobytes())
+    return hasher.hexdigest()
+
+
+class PixelIndex:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def add(self, job_id: str, pixel_hash: str) -> None:
+        """업로드(job id)의 픽셀 해시를 기록. 같은 job id 를 다시 쓰면 갱신하고 done 은 지운다."""
+        with closing(self._connect()) as db:
+            db.execute("INSERT INTO pixels (job_id, pixel_hash, done) VALUES (?, ?, 0) "
+                       "ON CONFLICT (job_id) DO UPDATE SET pixel_hash = excluded.pixel_hash, done = 0",
+                       (job_id, pixel_hash))
+
+    def mark_done(self, job_id: str) -> None:
+        with closing(self._connect()) as db:
+            db.execute("UPDATE pixels SET done = 1 WHERE job_id = ?", (job_id,))
+
+    def remove(self, job_id: str) -> None:
+        with closing(self._connect()) as db:
+            db.execute("DELETE FROM pixels WHERE job_id = ?", (job_id,))
+
+    def pixel_hash_of(self, job_id: str) -> Optional[str]:
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT pixel_hash FROM pixels WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def done_twins(self, pixel_hash: str, exclude: str) -> list[str]:
+        """같은 픽셀로 결과까지 낸 다른 job id 들 (먼저 기록된 순)."""
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT job_id FROM pixels WHERE pixel_hash = ? AND done = 1 AND job_id != ? "
+                              "ORDER BY rowid", (pixel_hash, exclude)).fetchall()
+        return [row[0] for row in rows]
@@ -1,7 +1,15 @@
 # lama_runner/predict_lama.py
 from __future__ import annotations
 
+import atexit
+import functools
+import hashlib
+import json
 import os
+import threading
+import time
+from collections import defaultdict
+from itertools import chain
 from pathlib import Path
 import cv2
 import numpy as np
@@ -9,20 +17,302 @@ import torch
 import yaml
 from omegaconf import OmegaConf
 from torch.utils.data._utils.collate import default_collate
+import torch.nn.functional as F
 import tqdm
 
-from saicinpainting.training.data.datasets import make_default_val_dataset
+from modules.flat_weights import is_mapped, load_state, materialize
+from modules.hole_fill import fill_holes
+from modules.metrics import MODEL_LOADS, stage
 from saicinpainting.training.modules import make_generator
+from saicinpainting.training.modules.depthwise_sep_conv import fuse_depthwise_convs
+from saicinpainting.training.modules.ffc import fuse_ffc_local_convs
+from saicinpainting.training.modules.lean_inference import lean_forward
+from saicinpainting.training.modules.multidilated_conv import fold_multidilated_shuffles
+from saicinpainting.training.modules.profiling import LayerProfiler
+
+# 요청 간 누적되는 레이어 프로파일러 (켜졌을 때만 생성), 리포트를 쓸 디렉토리, 프로파일한 실행 수
+_PROFILER: LayerProfiler | None = None
+_PROFILER_LOCK = threading.Lock()
+_PROFILE_DIR: str | None = None
+_PROFILE_RUNS = 0
+
+# 프로세스 안 generator 캐시: (체크포인트, mtime, 장치, generator 설정) 별로 한 번만 로드
+_MODELS: dict[tuple, torch.nn.Module] = {}
+_MODELS_LOCK = threading.Lock()
 
 
 def _load_checkpoint(config, ckpt_path, map_location="cpu", strict=False):
-    model = make_generator(**config.generator)
-    state = torch.load(ckpt_path, map_location=map_location)
-    model.load_state_dict(state, strict=strict)
+    # .safetensors(modules/flat_weights.py 로 변환) 는 mmap view 를 복사 없이 파라미터로 붙이고,
+    # zip 포맷 .ckpt 도 torch.load(mmap=True) 로 같은 경로를 탄다 — 가중치가 메모리에 두 벌 생기지 않는다
+    state = load_state(ckpt_path, map_location=map_location)
+    model = materialize(lambda: make_generator(**config.generator), state, strict=strict)
     model.eval()
+    # shuffle_in_channels 순열을 conv 가중치에 접어 넣는다 (결과 동일, ffc_resnet 에선 no-op)
+    fold_multidilated_shuffles(model)
+    # depthwise separable conv (+ 앞의 bilinear Upsample) 을 channels_last 추론 경로로 (ffc_resnet 에선 no-op)
+    fuse_depthwise_convs(model)
+    # 추론 전용 재작성: convl2l+convl2g 를 conv 하나로 (로드 이후에만 가능)
+    if config.get("fuse_ffc_convs", False):
+        fuse_ffc_local_convs(model)
+    return model
+
+
+def _read_config(config_path):
+    with open(config_path, "r") as f:
+        return OmegaConf.create(yaml.safe_load(f))
+
+
+def get_model(predict_config):
+    """설정의 generator 를 캐시에서 꺼낸다. 처음이면 로드 (요청마다 체크포인트를 다시 읽지 않음)."""
+    device = torch.device(predict_config.device)
+    ckpt_path = Path(predict_config.pretrained.path) / "models" / predict_config.pretrained.generator_checkpoint
+    key = (
+        str(ckpt_path),
+        ckpt_path.stat().st_mtime_ns if ckpt_path.exists() else None,  # 체크포인트가 바뀌면 다시 로드
+        str(device),
+        json.dumps(OmegaConf.to_container(predict_config.generator, resolve=True), sort_keys=True),
+        bool(predict_config.get("fuse_ffc_convs", False)),
+    )
+    with _MODELS_LOCK:
+        model = _MODELS.get(key)
+        if model is None:
+            with stage("model_load"):
+                model = _load_checkpoint(predict_config, ckpt_path, map_location="cpu", strict=False).to(device)
+            MODEL_LOADS.inc()
+            # 같은 체크포인트 경로·장치의 예전 항목(교체 전 mtime)은 버린다 — 남겨 두면 교체할 때마다 모델이 한 벌씩 샌다
+            for old in [old for old in _MODELS if (old[0], old[2]) == (key[0], key[2])]:
+                del _MODELS[old]
+            _MODELS[key] = model
+    return model
+
+
+def model_version(config_path, tier: str | None = None) -> str:
+    """
+    결과를 만든 모델의 짧은 지문: generator 종류 + (체크포인트 이름/크기/mtime, generator·crop·fill 설정) 해시.
+    저장소 색인에 결과마다 기록해서, 체크포인트나 후처리를 바꾼 뒤 다시 돌릴 항목을 고르는 데 쓴다.
+    부하로 품질을 낮춰 만든 결과는 뒤에 @<tier> 가 붙는다 — reprocess --stale-model 이 다시 돌릴 대상으로 고른다.
+    """
+    predict_config = _read_config(config_path)
+    ckpt_path = Path(predict_config.pretrained.path) / "models" / predict_config.pretrained.generator_checkpoint
+    stat = ckpt_path.stat() if ckpt_path.exists() else None
+    fingerprint = json.dumps({
+        "checkpoint": ckpt_path.name,
+        "checkpoint_stat": [stat.st_size, stat.st_mtime_ns] if stat else None,
+        "generator": OmegaConf.to_container(predict_config.generator, resolve=True),
+        "crop": _crop_settings(predict_config),
+        "fill": _fill_backend(predict_config),
+        "fuse_ffc_convs": bool(predict_config.get("fuse_ffc_convs", False)),
+    }, sort_keys=True)
+    version = f"{predict_config.generator.kind}-{hashlib.sha256(fingerprint.encode()).hexdigest()[:12]}"
+    return f"{version}@{tier}" if tier else version
+
+
+def degrade_settings(config_path) -> dict:
+    """설정 degrade 섹션 (modules/admission.py 가 읽는다). 없으면 빈 dict — 품질 단계 없이 항상 full."""
+    return OmegaConf.to_container(_read_config(config_path).get("degrade", None) or OmegaConf.create({}),
+                                  resolve=True)
+
+
+def preload_model(config_path, share_memory=False):
+    """
+    서버 시작 시 generator 를 캐시에 올려 둔다.
+    share_memory=True 면 가중치를 공유 메모리로 옮긴다 — serve.py 가 워커를 fork 하기 전에 부르면
+    모든 워커가 같은 물리 페이지를 쓰므로 워커 수가 늘어도 모델 메모리는 한 벌이다.
+    """
+    model = get_model(_read_config(config_path))
+    if share_memory:
+        _share_weights(model)
+    return model
+
+
+def _share_weights(model):
+    """
+    CPU 파라미터/버퍼를 dtype 별 평탄한 공유 메모리 텐서 하나에 모으고 그 view 로 바꾼다 (stride 유지).
+    fork 의 copy-on-write 만으로는 페이지가 한 번이라도 쓰이면 워커마다 복사되지만, 공유 메모리는 복사되지 않는다.
+    Module.share_memory() 는 텐서마다 fd 를 하나씩(ffc_resnet 은 500 개 이상) 잡아서 쓰지 않는다.
+    """
+    tensors = {}
+    for t in chain(model.parameters(), model.buffers()):
+        # mmap 된 체크포인트 위의 텐서는 이미 page cache 로 프로세스 간에 공유된다
+        if t.device.type == "cpu" and not t.is_shared() and not is_mapped(t):
+            tensors.setdefault(id(t), t)
+    by_dtype = defaultdict(list)
+    for t in tensors.values():
+        if not (t.is_contiguous() or t.is_contiguous(memory_format=torch.channels_last)):
+            t.data = t.data.contiguous()
+        by_dtype[t.dtype].append(t)
+
+    for dtype, group in by_dtype.items():
+        flat = torch.empty(sum(t.numel() for t in group), dtype=dtype).share_memory_()
+        offset = 0
+        for t in group:
+            view = flat.as_strided(t.shape, t.stride(), offset)
+            view.copy_(t.data)
+            t.data = view
+            offset += t.numel()
     return model
 
 
+def _fill_backend(config) -> str:
+    """설정 fill.backend: telea (기본, cv2.inpaint) 또는 push_pull (modules/hole_fill.py)."""
+    fill_cfg = config.get("fill", None) or {}
+    return str(fill_cfg.get("backend", "telea"))
+
+
+def _batch_settings(config):
+    """
+    설정 batch 섹션: (묶음당 최대 장 수, 패딩 포함 묶음 픽셀 상한 — 0 이면 제한 없음). 섹션이 없으면 한 장씩.
+    CPU 에서는 on_cpu 가 아니면 한 장씩 — 1코어 측정에서 같은 크기 4장을 묶으면 오히려 느렸다 (7.9 s → 10.9 s).
+    """
+    batch_cfg = config.get("batch", None) or {}
+    size = max(1, int(batch_cfg.get("size", 1)))
+    if torch.device(config.device).type == "cpu" and not batch_cfg.get("on_cpu", False):
+        size = 1
+    return size, int(batch_cfg.get("max_pixels", 0))
+
+
+def _crop_settings(config):
+    """
+    설정 crop 섹션: (enabled, margin px, bucket px). 섹션이 없으면 예전처럼 캔버스 전체.
+    bucket: crop 변 길이를 올릴 배수 (0 이면 generator stride) — 모델 입력 모양의 가짓수를 줄인다.
+    """
+    crop_cfg = config.get("crop", None) or {}
+    return bool(crop_cfg.get("enabled", False)), int(crop_cfg.get("margin", 0)), int(crop_cfg.get("bucket", 0))
+
+
+def _alpha_crop_box(alpha: torch.Tensor, margin: int, stride: int):
+    """
+    alpha (H, W) bool 의 tight bbox 에 margin 을 더하고, 변 길이를 stride 배수로 올린 (top, bottom, left, right).
+    캔버스를 넘지 않게 안쪽으로 밀고, 캔버스보다 커지면 그 축은 캔버스 전체. 알파가 전부 0 이면 None.
+    """
+    rows = torch.nonzero(alpha.any(dim=1)).flatten()
+    if rows.numel() == 0:
+        return None
+    cols = torch.nonzero(alpha.any(dim=0)).flatten()
+    top, bottom = _expand_span(int(rows[0]), int(rows[-1]) + 1, margin, stride, alpha.shape[0])
+    left, right = _expand_span(int(cols[0]), int(cols[-1]) + 1, margin, stride, alpha.shape[1])
+    return top, bottom, left, right
+
+
+def _expand_span(begin: int, end: int, margin: int, stride: int, limit: int) -> tuple[int, int]:
+    begin, end = max(0, begin - margin), min(limit, end + margin)
+    size = min(limit, -(-(end - begin) // stride) * stride)
+    begin = min(begin, limit - size)
+    return begin, begin + size
+
+
+def _warmup_settings(config):
+    """
+    설정 warmup 섹션. 환경변수 LAMA_WARMUP(=1/0), LAMA_WARMUP_SIZES(=512x512,1024x1024) 가 설정보다 우선.
+    반환: (enabled, [(width, height), ...], repeats, cudnn_benchmark)
+    """
+    warmup_cfg = config.get("warmup", None) or {}
+    env = os.environ.get("LAMA_WARMUP")
+    enabled = env.lower() not in ("", "0", "false") if env is not None else bool(warmup_cfg.get("enabled", False))
+    sizes = os.environ.get("LAMA_WARMUP_SIZES")
+    sizes = sizes.split(",") if sizes else list(warmup_cfg.get("sizes", []))
+    parsed = []
+    for size in sizes:
+        width, height = str(size).lower().split("x")
+        parsed.append((int(width), int(height)))
+    return enabled, parsed, max(1, int(warmup_cfg.get("repeats", 1))), bool(warmup_cfg.get("cudnn_benchmark", False))
+
+
+def warmup_model(config_path) -> list[dict]:
+    """
+    generator 를 캐시에 올리고 표준 입력 크기마다 몇 번씩 돌려 본다.
+    새 해상도의 첫 추론이 치르는 비용(cuDNN/oneDNN 알고리즘 선택, FFT plan 생성, 할당자 확장)을
+    사용자 요청 대신 여기서 치른다. 반환: 크기별 실행 시간(ms) 목록. 꺼져 있으면 [].
+    """
+    predict_config = _read_config(config_path)
+    enabled, sizes, repeats, cudnn_benchmark = _warmup_settings(predict_config)
+    if not enabled:
+        return []
+    device = torch.device(predict_config.device)
+    if device.type == "cuda" and cudnn_benchmark:
+        # 입력 크기별로 가장 빠른 conv 알고리즘을 고른다 — 처음 보는 크기는 그때 한 번 더 튜닝한다
+        torch.backends.cudnn.benchmark = True
+    forward = _forward_fn(predict_config, get_model(predict_config))
+
+    report = []
+    for width, height in sizes:
+        x = torch.zeros(1, predict_config.generator.input_nc, height, width, device=device)
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            with torch.no_grad():
+                forward(x)
+            if device.type == "cuda":
+                torch.cuda.synchronize(device)
+            timings.append((time.perf_counter() - start) * 1000)
+        report.append({"size": f"{width}x{height}", "ms": timings})
+    return report
+
+
+def _forward_fn(config, model, profiler=None):
+    """
+    generator 호출. 설정 lean_inference.enabled 면 메모리 절약 실행기 (saicinpainting/.../lean_inference.py —
+    in-place norm/활성/residual, 큰 입력의 reflect 패딩 conv 를 행 단위로, FourierUnit 버퍼 재사용) 로 돈다.
+    프로파일러가 켜져 있으면 레이어 hook 이 불려야 하므로 module 호출 그대로.
+    """
+    lean_cfg = config.get("lean_inference", None) or {}
+    if profiler is not None or not lean_cfg.get("enabled", False):
+        return model
+    return functools.partial(lean_forward, model, tile_bytes=int(float(lean_cfg.get("tile_mb", 8)) * 2 ** 20))
+
+
+def _get_profiler(config):
+    """
+    설정 profile.enabled 또는 환경변수 LAMA_PROFILE(=1/0, 설정보다 우선)로 켠다.
+    꺼져 있으면 (None, None) — hook 을 아예 걸지 않으므로 오버헤드 없음. 켜져 있다가 꺼지면 마지막 리포트를 쓰고
+    모든 모델에서 hook 을 뗀다 (stop_profiler).
+    프로파일러는 프로세스에 하나, 캐시된 모델에 한 번 붙여 두고 요청마다 떼지 않는다 (job 워커·워밍업 스레드가 같은
+    모델을 동시에 돌리므로 요청마다 붙였다 떼면 hook 이 겹치거나 forward 중간에 빠진다).
+    """
+    global _PROFILER, _PROFILE_DIR
+    profile_cfg = config.get("profile", None) or {}
+    env = os.environ.get("LAMA_PROFILE")
+    enabled = env.lower() not in ("", "0", "false") if env is not None else bool(profile_cfg.get("enabled", False))
+    if not enabled:
+        if _PROFILER is not None:
+            stop_profiler()
+        return None, None
+    out_dir = os.environ.get("LAMA_PROFILE_DIR") or profile_cfg.get("out_dir", "profile")
+    with _PROFILER_LOCK:
+        if _PROFILER is None:
+            _PROFILER = LayerProfiler()
+            atexit.register(stop_profiler)
+        _PROFILE_DIR = out_dir
+        return _PROFILER, out_dir
+
+
+def _profile_done(config, profiler: LayerProfiler, out_dir: str) -> None:
+    """
+    프로파일한 실행 하나를 센다. 누적 트레이스를 통째로 다시 쓰므로 설정 profile.dump_every 번에 한 번만 쓴다
+    (0 이면 stop_profiler 에서만). fork 된 serve.py 워커는 atexit 이 돌지 않으니 그쪽은 dump_every 가 유일한 기록.
+    """
+    global _PROFILE_RUNS
+    every = int((config.get("profile", None) or {}).get("dump_every", 20))
+    with _PROFILER_LOCK:
+        _PROFILE_RUNS += 1
+        due = every > 0 and _PROFILE_RUNS % every == 0
+    if due:
+        profiler.dump(out_dir)
+
+
+def stop_profiler() -> None:
+    """프로파일러를 끈다: 누적 리포트를 마지막으로 쓰고 캐시된 모델들에서 hook 을 뗀다. 프로세스 종료 시에도 불린다."""
+    global _PROFILER, _PROFILE_RUNS
+    with _PROFILER_LOCK:
+        profiler, _PROFILER = _PROFILER, None
+        runs, _PROFILE_RUNS = _PROFILE_RUNS, 0
+    if profiler is None:
+        return
+    profiler.detach()
+    if runs:
+        profiler.dump(_PROFILE_DIR)
+
+
 def _move_to_device(obj, device):
     if isinstance(obj, str):
         return obj
@@ -42,50 +332,170 @@ def run_lama_for_uid(
     indir: str | os.PathLike,
     uid: str,
     save_name_override: str | None = None,
+    scale: float = 1.0,
+    fill_backend: str | None = None,
 ) -> Path:
     """
     단일 uid(=sha256 디렉토리)만 처리.
     indir/uid/char/input.png 를 읽고, char/<save_name>_inpainted.png 로 저장.
+    scale < 1 이면 generator 입력을 그만큼 줄여서 돌리고 예측 마스크를 원래 크기로 업샘플 (부하 시 품질 단계),
+    fill_backend 는 설정 fill.backend 대신 쓸 채우기.
     """
-    indir = Path(indir)
-    uid_dir = indir / uid
-    char_dir = uid_dir / "char"
-    input_png = char_dir / "input.png"
-    assert input_png.exists(), f"input not found: {input_png}"
-
-    with open(config_path, "r") as f:
-        predict_config = OmegaConf.create(yaml.safe_load(f))
+    result = run_lama_batch(config_path, [(indir, uid)], save_name_override, scale, fill_backend)[uid]
+    if isinstance(result, Exception):
+        raise result
+    return result
 
-    # 동적으로 경로/파라미터 보정
-    predict_config.indir = str(indir)           # 데이터 루트
-    predict_config.uid_json = None              # 우리는 dataset이 uid 폴더 스캔하도록 설정할 것
-    predict_config.dataset.indir = str(indir)   # 일부 dataset 구현은 이 키를 씀
-    predict_config.dataset.specific_uid = uid   # 커스텀 키(우리가 쓸 것)
 
+def run_lama_batch(
+    config_path: str,
+    items: list[tuple[str | os.PathLike, str]],
+    save_name_override: str | None = None,
+    scale: float = 1.0,
+    fill_backend: str | None = None,
+) -> dict[str, Path | Exception]:
+    """
+    여러 uid 를 generator 배치로 처리. items = [(indir, uid), ...] — 각각 indir/uid/char/input.png.
+    알파 bbox crop 을 크기 순으로 묶고 (설정 batch 섹션), 묶음마다 가장 큰 crop 크기로 오른쪽/아래를 0(투명)으로
+    채워 generator 를 한 번 호출한다. 한 장짜리 묶음은 패딩 없이 그대로 (run_lama_for_uid 와 같은 경로).
+    scale, fill_backend 는 run_lama_for_uid 와 같다.
+    반환: uid → 결과 PNG 경로. 실패한 항목은 그 예외가 들어가고 나머지 항목은 계속 진행한다.
+    """
+    predict_config = _read_config(config_path)
     device = torch.device(predict_config.device)
-    ckpt_path = Path(predict_config.pretrained.path) / "models" / predict_config.pretrained.generator_checkpoint
-    model = _load_checkpoint(predict_config, ckpt_path, map_location="cpu", strict=False).to(device)
+    model = get_model(predict_config)
+    profiler, profile_dir = _get_profiler(predict_config)
+    if profiler is not None:
+        profiler.attach(model)
+    forward = _forward_fn(predict_config, model, profiler)
 
-    # ----- dataset 구성 -----
+    crop_enabled, margin, bucket = _crop_settings(predict_config)
+    stride = 2 ** predict_config.generator.get("n_downsampling", 3)
+    # crop 변은 bucket 배수로 (stride 배수여야 하므로 올림) — 이미지마다 모양이 다르면 cudnn.benchmark 가
+    # 처음 보는 모양마다 요청 안에서 다시 튜닝한다
+    step = max(1, -(-bucket // stride)) * stride
+    max_items, max_pixels = _batch_settings(predict_config)
+    save_name = save_name_override or predict_config.generator.kind
+    fill_backend = fill_backend or _fill_backend(predict_config)
+
+    char_dirs = {uid: Path(indir) / uid / "char" for indir, uid in items}
+    results: dict[str, Path | Exception] = {}
+    inputs, boxes, predictions = {}, {}, {}
+    # ----- 입력 읽기 + crop -----
     # LaMa의 make_default_val_dataset 은 보통 디렉토리 구조/옵션을 요구한다.
     # 여기서는 "characters/<uid>/char/input.png" 만 처리하도록 작은 헬퍼 dataset을 만든다.
-    dataset = _OneImageDataset(str(input_png))
+    for uid, char_dir in char_dirs.items():
+        try:
+            with stage("load_input"):
+                x = default_collate([_OneImageDataset(str(char_dir / "input.png"))[0]])["input"]
+        except Exception as e:
+            results[uid] = e
+            continue
+        _, _, height, width = x.shape
+        # 캐릭터 알파 bbox 만 모델에 넣는다 (투명 배경에 쓰는 연산을 줄임)
+        with stage("crop"):
+            boxes[uid] = _alpha_crop_box(x[0, 3] > 0, margin, step) if crop_enabled else (0, height, 0, width)
+        inputs[uid] = x
 
     # ----- 추론 -----
-    for img_i in tqdm.trange(len(dataset), desc=f"LaMa[{uid}]"):
-        batch = default_collate([dataset[img_i]])
-        with torch.no_grad():
-            batch = _move_to_device(batch, device)
-            # LaMa generator 는 (B, C, H, W) float32 [-1, 1] or [0,1] 를 기대.
-            # 여기선 간단화를 위해 [0,1] RGB, 별도 마스크 합성 후 OpenCV 인페인팅을 적용.
-            # (네가 준 코드처럼 모델 출력으로 마스크 예측 -> inpaint)
-            predicted = model(batch["input"])  # (B,1,H,W) 과 유사한 바이너리 맵이라 가정
-            batch["predicted"] = predicted
+    # 알파가 전부 0 이면 인페인팅 마스크가 캔버스 전체라 모델 출력이 결과에 쓰이지 않는다 → 모델 호출 생략
+    pending = [uid for uid, box in boxes.items() if box is not None]
+    sizes = [(boxes[uid][1] - boxes[uid][0], boxes[uid][3] - boxes[uid][2]) for uid in pending]
+    for group in tqdm.tqdm(_group_for_batches(sizes, max_items, max_pixels), desc=f"LaMa[{len(pending)}]"):
+        uids = [pending[i] for i in group]
+        crops = []
+        for uid in uids:
+            top, bottom, left, right = boxes[uid]
+            crops.append(_rescale(inputs[uid][:, :, top:bottom, left:right], scale, step))
+        try:
+            for uid, predicted in zip(uids, _predict_padded(forward, crops, device)):
+                top, bottom, left, right = boxes[uid]
+                predictions[uid] = _upsample_to(predicted, (bottom - top, right - left))
+        except Exception as e:
+            results.update(dict.fromkeys(uids, e))
+
+    # ----- 복원/후처리 -----
+    for uid, x in inputs.items():
+        if uid in results:
+            continue
+        _, _, height, width = x.shape
+        if boxes[uid] is None:
+            canvas = torch.zeros(1, predict_config.generator.output_nc, height, width)
+        else:
+            # 전체 캔버스로 되돌린다. crop 밖은 알파가 0 이라 마스크가 어차피 255 — 채우는 값은 결과에 영향 없음
+            top, bottom, left, right = boxes[uid]
+            predicted = predictions.pop(uid)
+            canvas = predicted.new_zeros(predicted.shape[0], predicted.shape[1], height, width)
+            canvas[:, :, top:bottom, left:right] = predicted
+        try:
+            _save_inpainted({"input": x, "predicted": canvas}, char_dirs[uid], save_name, fill_backend=fill_backend)
+            results[uid] = char_dirs[uid] / f"{save_name}_inpainted.png"
+        except Exception as e:
+            results[uid] = e
+
+    if profiler is not None:
+        _profile_done(predict_config, profiler, profile_dir)
+
+    return results
+
 
-        # 복원/후처리
-        _save_inpainted(batch, char_dir, save_name_override or predict_config.generator.kind)
+def _rescale(crop: torch.Tensor, scale: float, stride: int) -> torch.Tensor:
+    """(1, C, h, w) 를 scale 배로 (변은 stride 배수로 맞춤, 최소 stride). scale 1 이면 그대로."""
+    if scale >= 1.0:
+        return crop
+    height, width = crop.shape[2:]
+    size = (max(stride, round(height * scale / stride) * stride), max(stride, round(width * scale / stride) * stride))
+    with stage("rescale"):
+        return F.interpolate(crop, size=size, mode="bilinear", align_corners=False, antialias=True)
 
-    return char_dir / f"{save_name_override or predict_config.generator.kind}_inpainted.png"
+
+def _upsample_to(predicted: torch.Tensor, size: tuple[int, int]) -> torch.Tensor:
+    """줄여서 돌린 예측 마스크를 원래 crop 크기로 (bilinear — 0.2 임계값 전의 연속값이라 경계가 부드럽게 이어진다)."""
+    if tuple(predicted.shape[2:]) == tuple(size):
+        return predicted
+    with stage("rescale"):
+        return F.interpolate(predicted, size=size, mode="bilinear", align_corners=False)
+
+
+def _predict_padded(forward, crops, device):
+    """
+    crops: [(1, C, h, w), ...] → 가장 큰 h, w 로 오른쪽/아래를 0 패딩해 한 번에 추론하고 각자 크기로 잘라 돌려준다.
+    패딩은 투명 여백이 늘어난 것과 같다 — FFC 의 전역(FFT) 분기 때문에 한 장씩 돌린 출력과 비트 단위로 같지는 않다.
+    """
+    height = max(crop.shape[2] for crop in crops)
+    width = max(crop.shape[3] for crop in crops)
+    if len(crops) == 1:
+        batch = crops[0]
+    else:
+        batch = crops[0].new_zeros(len(crops), crops[0].shape[1], height, width)
+        for i, crop in enumerate(crops):
+            batch[i, :, :crop.shape[2], :crop.shape[3]] = crop[0]
+    with torch.no_grad():
+        # LaMa generator 는 (B, C, H, W) float32 [-1, 1] or [0,1] 를 기대.
+        # 여기선 간단화를 위해 [0,1] RGB, 별도 마스크 합성 후 OpenCV 인페인팅을 적용.
+        # (네가 준 코드처럼 모델 출력으로 마스크 예측 -> inpaint)
+        with stage("inference"):
+            predicted = forward(_move_to_device(batch, device))  # (B,1,h,w) 과 유사한 바이너리 맵이라 가정
+    return [predicted[i:i + 1, :, :crop.shape[2], :crop.shape[3]] for i, crop in enumerate(crops)]
+
+
+def _group_for_batches(sizes, max_items: int, max_pixels: int) -> list[list[int]]:
+    """
+    sizes: [(h, w), ...] → 인덱스 묶음들. 크기 순으로 정렬해 이웃끼리 묶는다 (패딩 최소화).
+    한 묶음은 max_items 장 이하, 가장 큰 h·w 로 패딩한 전체 픽셀이 max_pixels 이하 (0 이면 제한 없음, 한 장은 항상 허용).
+    """
+    groups, current, height, width = [], [], 0, 0
+    for i in sorted(range(len(sizes)), key=lambda i: sizes[i]):
+        grown_h, grown_w = max(height, sizes[i][0]), max(width, sizes[i][1])
+        if current and (len(current) >= max_items
+                        or (max_pixels and (len(current) + 1) * grown_h * grown_w > max_pixels)):
+            groups.append(current)
+            current, grown_h, grown_w = [], sizes[i][0], sizes[i][1]
+        current.append(i)
+        height, width = grown_h, grown_w
+    if current:
+        groups.append(current)
+    return groups
 
 
 class _OneImageDataset:
@@ -123,25 +533,23 @@ class _OneImageDataset:
         return {"input": self.tensor, "uid": self.uid}
 
 
-def _save_inpainted(batch, char_dir: Path, save_name: str):
+def _save_inpainted(batch, char_dir: Path, save_name: str, fill_backend: str = "telea"):
     """
     batch['input']: (B,4,H,W) RGB+A
     batch['predicted']: (B,1,H,W) ~ contour mask logits 라고 가정
-    → predicted > 0.2 를 마스크로 만들고, alpha 빈 곳과 합쳐 inpaint
+    → predicted > 0.2 를 마스크로 만들고, alpha 빈 곳과 합쳐 fill_backend 로 채운다 (modules/hole_fill.py)
     """
-    import torch
-
-    x = batch["input"][0].detach().cpu().permute(1, 2, 0).numpy()  # (H,W,4)
-    img = (x[:, :, 0:3] * 255).astype("uint8")
-    alpha = (x[:, :, 3:4] * 255).astype("uint8")
-
-    pred = batch["predicted"][0][0].detach().cpu().numpy()
-    pred = np.clip((pred > 0.2) * 255, 0, 255).astype("uint8")
+    with stage("post_process"):
+        predicted = batch["predicted"].detach()
+        x = batch["input"].detach().to(predicted.device)  # 채우기는 예측과 같은 장치에서
+        img = (x[:, 0:3] * 255).to(torch.uint8)
+        alpha = (x[:, 3:4] * 255).to(torch.uint8)
 
-    inpaint_mask = np.maximum(pred, 255 - alpha[:, :, 0]).astype(np.uint8)
-    inpainted = cv2.inpaint(img, inpaint_mask, 3, cv2.INPAINT_TELEA)
-    out = np.concatenate([inpainted, alpha], 2)  # (H,W,4)
+        holes = (predicted[:, 0:1] > 0.2) | (alpha < 255)
+        inpainted = fill_holes(img, holes, fill_backend)
+        out = torch.cat([inpainted, alpha], 1)[0].permute(1, 2, 0).cpu().numpy()  # (H,W,4)
 
-    char_dir.mkdir(parents=True, exist_ok=True)
-    out_path = char_dir / f"{save_name}_inpainted.png"
-    cv2.imwrite(str(out_path), cv2.cvtColor(out, cv2.COLOR_BGRA2RGBA))
+    with stage("write"):
+        char_dir.mkdir(parents=True, exist_ok=True)
+        out_path = char_dir / f"{save_name}_inpainted.png"
+        cv2.imwrite(str(out_path), cv2.cvtColor(out, cv2.COLOR_BGRA2RGBA))
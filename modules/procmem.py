@@ -0,0 +1,33 @@
+"""
+프로세스 메모리 (Linux /proc). 워커들이 페이지를 공유할 때 RSS 는 공유분을 워커마다 다 세므로
+PSS(공유분을 나눠 셈)·USS(그 프로세스만의 페이지)를 같이 본다.
+"""
+from __future__ import annotations
+
+import os
+
+_SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared",
+    "Shared_Dirty": "shared",
+    "Private_Clean": "uss",
+    "Private_Dirty": "uss",
+}
+
+
+def memory_usage(pid: int | None = None) -> dict[str, int]:
+    """bytes 단위 {rss, pss, uss, shared}. smaps_rollup 이 없으면 statm 의 rss 만."""
+    pid = pid or os.getpid()
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                key = _SMAPS_FIELDS.get(parts[0].rstrip(":"))
+                if key is not None:
+                    usage[key] = usage.get(key, 0) + int(parts[1]) * 1024
+    except (FileNotFoundError, PermissionError):
+        with open(f"/proc/{pid}/statm") as f:
+            usage["rss"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    return usage
@@ -0,0 +1,76 @@
+"""
+키(업로드 sha256)별 single-flight 구간.
+flock 기반이라 같은 프로세스의 스레드끼리도, 같은 호스트의 다른 uvicorn 워커 프로세스끼리도 배타적이다.
+(flock 은 open() 마다 독립이므로 획득할 때마다 파일을 새로 연다)
+"""
+from __future__ import annotations
+
+import fcntl
+import os
+from pathlib import Path
+
+
+class FileLock:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fd: int | None = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if self._fd is not None:
+            raise RuntimeError(f"lock already held: {self.path}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class SingleFlight:
+    """
+    키(16진 해시)를 lock_dir/<key[0:2]>/<key[2:4]>.lock 줄무늬(stripe) 락에 나눠 건다 — 파일은 최대 65536 개로 고정.
+    락 파일은 지우지 않는다 (지우면 다른 프로세스와 inode 가 갈린다). 키마다 파일을 두면 업로드 수만큼 쌓인다.
+    서로 다른 키가 같은 줄무늬를 쓸 수 있다 (배타성은 그대로, 가끔 불필요하게 기다릴 뿐) — 그래서 한 스레드가
+    락 두 개를 겹쳐 잡으면 안 된다 (같은 줄무늬면 스스로를 기다린다).
+    """
+
+    def __init__(self, lock_dir: Path):
+        self.lock_dir = Path(lock_dir)
+
+    def path(self, key: str) -> Path:
+        return self.lock_dir / key[0:2] / f"{key[2:4]}.lock"
+
+    def lock(self, key: str) -> FileLock:
+        return FileLock(self.path(key))
+
+
+def pid_alive(pid: int | None) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,344 @@
+"""
+characters/ 저장소 레이아웃과 메타데이터 색인.
+
+레이아웃: characters/<h[0:2]>/<h[2:4]>/<h>/ (input.<ext>, char/input.png, char/<kind>_inpainted.png, job.json, logs.txt)
+  평평한 characters/<h>/ 는 항목이 수백만 개가 되면 목록/정리 때마다 디렉토리 하나를 통째로 scandir 해야 한다.
+  두 단계 fan-out 이면 디렉토리 하나에 최대 256 개.
+락: characters/.locks/<h[0:2]>/<h[2:4]>.lock — 해시별 single-flight 줄무늬 (modules/singleflight.py). 예전 해시별
+  .locks/<h>.lock 은 migrate 가 한꺼번에, gc 가 지우는 항목 것을 지운다.
+색인: characters/.store.sqlite3 — 해시별 크기, 상태, 시간, 모델 버전, 마지막 접근 시각.
+  캐시 조회, GC, 재처리 대상 선택을 파일시스템을 훑지 않고 한다.
+  상태의 원본은 job.json 이고 색인은 그 사본이다 (JobQueue 가 job.json 을 쓸 때마다 같이 갱신).
+
+    python -m modules.store migrate [--store characters] [--dry-run]   # 평평한 레이아웃 → fan-out, 색인 채우기 (서버 정지 후)
+    python -m modules.store reindex                                     # 디스크에서 색인 다시 만들기
+    python -m modules.store gc --older-than-days 30 [--dry-run]         # 오래 안 쓴 끝난 항목 삭제
+    python -m modules.store reprocess --status failed [--limit 100]     # 색인으로 고른 항목 LaMa 다시 돌리기
+    python -m modules.store reprocess --stale-model
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Iterable, Optional
+
+from modules.pixel_index import PIXEL_INDEX_FILE, PixelIndex
+from modules.singleflight import SingleFlight
+
+INDEX_FILE = ".store.sqlite3"
+HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+_COLUMNS = ("ext", "input_bytes", "width", "height", "result_bytes", "status", "created", "started", "finished",
+            "model_version", "last_access")
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    hash TEXT PRIMARY KEY,
+    ext TEXT,
+    input_bytes INTEGER,
+    width INTEGER,
+    height INTEGER,
+    result_bytes INTEGER,
+    status TEXT,
+    created REAL,
+    started REAL,
+    finished REAL,
+    model_version TEXT,
+    last_access REAL
+);
+CREATE INDEX IF NOT EXISTS entries_by_status ON entries (status);
+CREATE INDEX IF NOT EXISTS entries_by_access ON entries (last_access);
+"""
+
+
+def entry_dir(store_dir: Path, h: str) -> Path:
+    """해시 h 의 디렉토리: <store>/<h[0:2]>/<h[2:4]>/<h>."""
+    return Path(store_dir) / h[:2] / h[2:4] / h
+
+
+class StoreIndex:
+    """entries 테이블. 연결은 호출마다 새로 연다 (스레드/프로세스 어디서나, 동시 쓰기는 WAL 잠금)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def upsert(self, h: str, **fields) -> None:
+        """주어진 칼럼만 쓴다 (없는 행이면 만든다)."""
+        unknown = set(fields) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown index columns: {sorted(unknown)}")
+        names = list(fields)
+        updates = ", ".join(f"{name} = excluded.{name}" for name in names) or "hash = hash"
+        with closing(self._connect()) as db:
+            db.execute(f"INSERT INTO entries (hash{''.join(', ' + n for n in names)}) "
+                       f"VALUES (?{', ?' * len(names)}) ON CONFLICT (hash) DO UPDATE SET {updates}",
+                       (h, *fields.values()))
+
+    def record_job(self, job) -> None:
+        """job.json 과 같은 상태/시간을 색인에 (modules/jobs.Job)."""
+        self.upsert(job.id, status=job.state, created=job.created, started=job.started, finished=job.finished)
+
+    def touch(self, h: str, when: Optional[float] = None) -> None:
+        with closing(self._connect()) as db:
+            db.execute("UPDATE entries SET last_access = ? WHERE hash = ?", (when or time.time(), h))
+
+    def get(self, h: str) -> Optional[dict]:
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT * FROM entries WHERE hash = ?", (h,)).fetchone()
+        return dict(row) if row else None
+
+    def remove(self, h: str) -> None:
+        with closing(self._connect()) as db:
+            db.execute("DELETE FROM entries WHERE hash = ?", (h,))
+
+    def select(self, statuses: Iterable[str] = (), accessed_before: Optional[float] = None,
+               model_version_not: Optional[str] = None, limit: Optional[int] = None) -> list[str]:
+        """조건에 맞는 해시들 (마지막 접근이 오래된 순)."""
+        where, params = [], []
+        statuses = list(statuses)
+        if statuses:
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params += statuses
+        if accessed_before is not None:
+            where.append("COALESCE(last_access, finished, created, 0) < ?")
+            params.append(accessed_before)
+        if model_version_not is not None:
+            where.append("(model_version IS NULL OR model_version != ?)")
+            params.append(model_version_not)
+        sql = "SELECT hash FROM entries"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY COALESCE(last_access, finished, created, 0)"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with closing(self._connect()) as db:
+            return [row[0] for row in db.execute(sql, params)]
+
+
+# ===== 유지보수 도구 =====
+def _flat_entries(store_dir: Path):
+    with os.scandir(store_dir) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False) and HASH_RE.match(entry.name):
+                yield Path(entry.path)
+
+
+def _sharded_entries(store_dir: Path):
+    for first in sorted(store_dir.glob("[0-9a-f][0-9a-f]")):
+        for second in sorted(first.glob("[0-9a-f][0-9a-f]")):
+            for path in sorted(second.iterdir()):
+                if HASH_RE.match(path.name):
+                    yield path
+
+
+def index_entry(index: StoreIndex, path: Path) -> None:
+    """디렉토리 하나의 내용(입력 파일, job.json, 결과)으로 색인 행을 채운다."""
+    fields = {}
+    inputs = sorted(path.glob("input.*"))
+    if inputs:
+        fields.update(ext=inputs[0].suffix[1:], input_bytes=inputs[0].stat().st_size)
+    lama_input = path / "char" / "input.png"
+    if lama_input.exists():
+        from PIL import Image
+
+        with Image.open(lama_input) as im:
+            fields.update(width=im.width, height=im.height)
+    try:
+        job = json.loads((path / "job.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        job = None
+    if job:
+        fields.update(status=job.get("state"), created=job.get("created"), started=job.get("started"),
+                      finished=job.get("finished"))
+        if job.get("result") and (path / job["result"]).exists():
+            fields["result_bytes"] = (path / job["result"]).stat().st_size
+    index.upsert(path.name, **fields)
+
+
+def remove_legacy_locks(store_dir: Path, hashes: Optional[Iterable[str]] = None) -> int:
+    """
+    예전 해시별 락 파일 .locks/<h>.lock 삭제 (지금은 .locks/ab/cd.lock 줄무늬만 쓰므로 아무도 잡지 않는다).
+    hashes 가 None 이면 전부, 아니면 그 해시들 것만.
+    """
+    lock_dir = store_dir / ".locks"
+    if hashes is None:
+        paths = [path for path in lock_dir.glob("*.lock") if HASH_RE.match(path.stem)] if lock_dir.is_dir() else []
+    else:
+        paths = [lock_dir / f"{h}.lock" for h in hashes]
+    removed = 0
+    for path in paths:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        removed += 1
+    return removed
+
+
+def migrate(store_dir: Path, dry_run=False) -> int:
+    """
+    characters/<h>/ → characters/ab/cd/<h>/ (같은 파일시스템 rename), 옮긴 항목은 색인에도 기록.
+    예전 해시별 락 파일(.locks/<h>.lock)도 지운다.
+    """
+    index = None if dry_run else StoreIndex(store_dir / INDEX_FILE)
+    flights = SingleFlight(store_dir / ".locks")
+    moved = 0
+    for src in list(_flat_entries(store_dir)):
+        dst = entry_dir(store_dir, src.name)
+        if dry_run:
+            print(f"{src} -> {dst}")
+            moved += 1
+            continue
+        with flights.lock(src.name):
+            if dst.exists():
+                print(f"skip {src.name}: {dst} already exists", file=sys.stderr)
+                continue
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(src, dst)
+        index_entry(index, dst)
+        moved += 1
+    if not dry_run:
+        removed = remove_legacy_locks(store_dir)
+        if removed:
+            print(f"{removed} legacy lock files removed", file=sys.stderr)
+    return moved
+
+
+def reindex(store_dir: Path) -> int:
+    index = StoreIndex(store_dir / INDEX_FILE)
+    count = 0
+    for path in _sharded_entries(store_dir):
+        index_entry(index, path)
+        count += 1
+    return count
+
+
+def gc(store_dir: Path, older_than_days: float, dry_run=False, limit=None) -> list[str]:
+    """
+    마지막 접근이 older_than_days 보다 오래된 done/failed 항목 삭제. 해시별 single-flight 락 안에서 지운다.
+    줄무늬 락 파일은 다른 해시와 같이 쓰므로 남기고, 그 항목의 예전 락 파일(.locks/<h>.lock)만 지운다.
+    """
+    index = StoreIndex(store_dir / INDEX_FILE)
+    flights = SingleFlight(store_dir / ".locks")
+    pixels = PixelIndex(store_dir / PIXEL_INDEX_FILE) if (store_dir / PIXEL_INDEX_FILE).exists() else None
+    cutoff = time.time() - older_than_days * 86400
+    removed = []
+    for h in index.select(statuses=("done", "failed"), accessed_before=cutoff, limit=limit):
+        if dry_run:
+            removed.append(h)
+            continue
+        with flights.lock(h):
+            row = index.get(h)
+            # 락을 기다리는 사이 다시 쓰였으면 건너뛴다
+            if row is None or (row["last_access"] or 0) >= cutoff:
+                continue
+            path = entry_dir(store_dir, h)
+            shutil.rmtree(path, ignore_errors=True)
+            for parent in (path.parent, path.parent.parent):  # 비면 ab/cd, ab 도 지운다
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+            index.remove(h)
+            if pixels is not None:
+                pixels.remove(h)
+            remove_legacy_locks(store_dir, [h])
+        removed.append(h)
+    return removed
+
+
+def reprocess(store_dir: Path, config_path: str, hashes: list[str]) -> dict[str, str]:
+    """색인으로 고른 항목들을 이 프로세스에서 다시 돌리고 job.json 과 색인을 갱신한다 (서버와 같은 single-flight 락)."""
+    from modules.jobs import DONE, FAILED, JOB_FILE, Job
+    from modules.predict_lama import model_version, run_lama_for_uid
+
+    index = StoreIndex(store_dir / INDEX_FILE)
+    flights = SingleFlight(store_dir / ".locks")
+    version = model_version(config_path)
+    outcome = {}
+    for h in hashes:
+        path = entry_dir(store_dir, h)
+        with flights.lock(h):
+            job = Job(id=h, state=DONE, created=time.time(), started=time.time(), owner=os.getpid())
+            try:
+                result = run_lama_for_uid(config_path=config_path, indir=str(path.parent), uid=h)
+            except Exception as e:
+                job.state, job.error = FAILED, f"{type(e).__name__}: {e}"
+            else:
+                job.result = str(result.relative_to(path))
+                index.upsert(h, result_bytes=result.stat().st_size, model_version=version)
+            job.finished = time.time()
+            tmp = path / f"{JOB_FILE}.{os.getpid()}.tmp"
+            tmp.write_text(json.dumps(job.to_dict()), encoding="utf-8")
+            os.replace(tmp, path / JOB_FILE)
+            index.record_job(job)
+            outcome[h] = job.state if job.error is None else f"{job.state}: {job.error}"
+    return outcome
+
+
+def main():
+    parser = argparse.ArgumentParser(description="characters/ 저장소 레이아웃/색인 도구")
+    parser.add_argument("--store", default=os.environ.get("CHARACTERS_STORE_DIR", "characters"))
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("migrate", help="평평한 characters/<h>/ 를 fan-out 레이아웃으로 옮기고 색인")
+    p.add_argument("--dry-run", action="store_true")
+    sub.add_parser("reindex", help="fan-out 레이아웃을 한 번 훑어 색인을 다시 만든다")
+    p = sub.add_parser("gc", help="오래 접근하지 않은 done/failed 항목 삭제")
+    p.add_argument("--older-than-days", type=float, required=True)
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--dry-run", action="store_true")
+    p = sub.add_parser("reprocess", help="색인 조건으로 고른 항목 LaMa 재실행")
+    p.add_argument("--config", default=os.environ.get("LAMA_CONFIG_PATH"), help="기본: LAMA_CONFIG_PATH")
+    p.add_argument("--status", nargs="+", default=[])
+    p.add_argument("--stale-model", action="store_true", help="현재 설정과 모델 버전이 다른 결과")
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    store_dir = Path(args.store)
+    if args.command == "migrate":
+        print(f"{migrate(store_dir, args.dry_run)} entries {'to move' if args.dry_run else 'moved'}")
+    elif args.command == "reindex":
+        print(f"{reindex(store_dir)} entries indexed")
+    elif args.command == "gc":
+        removed = gc(store_dir, args.older_than_days, args.dry_run, args.limit)
+        for h in removed:
+            print(h)
+        print(f"{len(removed)} entries {'to remove' if args.dry_run else 'removed'}", file=sys.stderr)
+    elif args.command == "reprocess":
+        if not args.config:
+            parser.error("reprocess needs --config (or LAMA_CONFIG_PATH)")
+        if not args.status and not args.stale_model:
+            parser.error("reprocess needs --status and/or --stale-model")
+        version = None
+        if args.stale_model:
+            from modules.predict_lama import model_version
+            version = model_version(args.config)
+        hashes = StoreIndex(store_dir / INDEX_FILE).select(statuses=args.status, model_version_not=version,
+                                                           limit=args.limit)
+        if args.dry_run:
+            for h in hashes:
+                print(h)
+            return
+        for h, outcome in reprocess(store_dir, args.config, hashes).items():
+            print(f"{h} {outcome}")
+
+
+if __name__ == "__main__":
+    main()
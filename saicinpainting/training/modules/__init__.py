@@ -1,31 +1,43 @@
+import importlib
 import logging
 
-from saicinpainting.training.modules.ffc import FFCResNetGenerator
-from saicinpainting.training.modules.pix2pixhd import GlobalGenerator, MultiDilatedGlobalGenerator, \
-    NLayerDiscriminator, MultidilatedNLayerDiscriminator
+# kind -> (module, class); each kind imports its module (and that module's dependencies) only when requested
+_GENERATORS = {
+    'pix2pixhd_multidilated': ('saicinpainting.training.modules.pix2pixhd', 'MultiDilatedGlobalGenerator'),
+    'pix2pixhd_global': ('saicinpainting.training.modules.pix2pixhd', 'GlobalGenerator'),
+    'ffc_resnet': ('saicinpainting.training.modules.ffc', 'FFCResNetGenerator'),
+}
+
+_DISCRIMINATORS = {
+    'pix2pixhd_nlayer_multidilated': ('saicinpainting.training.modules.pix2pixhd', 'MultidilatedNLayerDiscriminator'),
+    'pix2pixhd_nlayer': ('saicinpainting.training.modules.pix2pixhd', 'NLayerDiscriminator'),
+}
+
+_EXPORTS = {cls: module for module, cls in list(_GENERATORS.values()) + list(_DISCRIMINATORS.values())}
 
-def make_generator(kind, **kwargs):
-    logging.info(f'Make generator {kind}')
 
-    if kind == 'pix2pixhd_multidilated':
-        return MultiDilatedGlobalGenerator(**kwargs)
-    
-    if kind == 'pix2pixhd_global':
-        return GlobalGenerator(**kwargs)
+def _load(module, cls):
+    return getattr(importlib.import_module(module), cls)
 
-    if kind == 'ffc_resnet':
-        return FFCResNetGenerator(**kwargs)
 
-    raise ValueError(f'Unknown generator kind {kind}')
+def make_generator(kind, **kwargs):
+    logging.info(f'Make generator {kind}')
+
+    if kind not in _GENERATORS:
+        raise ValueError(f'Unknown generator kind {kind}')
+    return _load(*_GENERATORS[kind])(**kwargs)
 
 
 def make_discriminator(kind, **kwargs):
     logging.info(f'Make discriminator {kind}')
 
-    if kind == 'pix2pixhd_nlayer_multidilated':
-        return MultidilatedNLayerDiscriminator(**kwargs)
+    if kind not in _DISCRIMINATORS:
+        raise ValueError(f'Unknown discriminator kind {kind}')
+    return _load(*_DISCRIMINATORS[kind])(**kwargs)
 
-    if kind == 'pix2pixhd_nlayer':
-        return NLayerDiscriminator(**kwargs)
 
-    raise ValueError(f'Unknown discriminator kind {kind}')
+def __getattr__(name):
+    # keep `from saicinpainting.training.modules import FFCResNetGenerator` working without eager imports
+    if name in _EXPORTS:
+        return _load(_EXPORTS[name], name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,4 +1,6 @@
+import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 class DepthWiseSeperableConv(nn.Module):
     def __init__(self, in_dim, out_dim, *args, **kwargs):
@@ -13,4 +15,87 @@ class DepthWiseSeperableConv(nn.Module):
     def forward(self, x):
         out = self.depthwise(x)
         out = self.pointwise(out)
-        return out
\ No newline at end of file
+        return out
+
+
+# bilinear x2 upsampling (align_corners=False) on a replicate-padded input, per output phase:
+# row t+1 holds the weights of low-res offsets (-1, 0, 1) for high-res offset t from the phase position
+_UPSAMPLE_PHASES = (
+    torch.tensor([[0.75, 0.25, 0.], [0.25, 0.75, 0.], [0., 0.75, 0.25]]),  # even output positions
+    torch.tensor([[0.25, 0.75, 0.], [0., 0.75, 0.25], [0., 0.25, 0.75]]),  # odd output positions
+)
+
+
+class FastDepthWiseSeperableConv(nn.Module):
+    """
+    Inference implementation of DepthWiseSeperableConv, built from a loaded one (weights are shared, parameter
+    names are kept). Runs channels_last and, with upsample=True, replaces a preceding
+    nn.Upsample(scale_factor=2, mode='bilinear'): the upsampling is folded into four per-phase depthwise kernels
+    applied to the low-res input, so the upsampled intermediate is never materialized.
+    """
+    def __init__(self, conv, upsample=False, channels_last=True):
+        super().__init__()
+        self.depthwise = conv.depthwise
+        self.pointwise = conv.pointwise
+        self.upsample = upsample
+        self.channels_last = channels_last
+        if channels_last:
+            self.to(memory_format=torch.channels_last)
+
+    @staticmethod
+    def can_fuse_upsample(upsample, conv):
+        if not isinstance(upsample, nn.Upsample) or not isinstance(conv, DepthWiseSeperableConv):
+            return False
+        scale = upsample.scale_factor
+        dw = conv.depthwise
+        return (upsample.mode == 'bilinear' and not upsample.align_corners and upsample.size is None
+                and scale in (2, 2., (2, 2), (2., 2.))
+                and dw.kernel_size == (3, 3) and dw.stride == (1, 1) and dw.padding == (1, 1)
+                and dw.dilation == (1, 1) and dw.padding_mode == 'zeros')
+
+    def forward(self, x):
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        out = self._upsample_depthwise(x) if self.upsample else self.depthwise(x)
+        return self.pointwise(out)
+
+    def _phase_weight(self):
+        # K_(py, px) = U_py^T D U_px, laid out as channel c * 4 + py * 2 + px to match pixel_shuffle
+        weight = self.depthwise.weight[:, 0]
+        phases = [u.to(weight) for u in _UPSAMPLE_PHASES]
+        kernels = [u_y.t() @ weight @ u_x for u_y in phases for u_x in phases]
+        return torch.stack(kernels, dim=1).reshape(-1, 1, 3, 3)
+
+    def _upsample_depthwise(self, x):
+        bias = self.depthwise.bias
+        if bias is not None:
+            bias = bias.repeat_interleave(4)
+        out = F.conv2d(F.pad(x, [1, 1, 1, 1], mode='replicate'), self._phase_weight(), bias,
+                       groups=self.depthwise.in_channels)
+        out = F.pixel_shuffle(out, 2)
+
+        # replicate padding of the low-res input acts as replicate padding of the upsampled one, while the depthwise
+        # conv zero-pads: recompute the outermost rows and columns exactly from two-pixel strips
+        def border(strip):
+            return self.depthwise(F.interpolate(strip, scale_factor=2, mode='bilinear', align_corners=False))
+
+        out[:, :, :1] = border(x[:, :, :2])[:, :, :1]
+        out[:, :, -1:] = border(x[:, :, -2:])[:, :, -1:]
+        out[:, :, :, :1] = border(x[:, :, :, :2])[:, :, :, :1]
+        out[:, :, :, -1:] = border(x[:, :, :, -2:])[:, :, :, -1:]
+        return out
+
+
+def fuse_depthwise_convs(model, channels_last=True):
+    """Swap DepthWiseSeperableConv (and Upsample + DepthWiseSeperableConv pairs in nn.Sequential) for the fast path."""
+    for module in list(model.modules()):
+        children = list(module.named_children())
+        for i, (name, child) in enumerate(children):
+            if not isinstance(child, DepthWiseSeperableConv):
+                continue
+            prev_name, prev = children[i - 1] if i > 0 else (None, None)
+            upsample = isinstance(module, nn.Sequential) and FastDepthWiseSeperableConv.can_fuse_upsample(prev, child)
+            if upsample:
+                setattr(module, prev_name, nn.Identity())
+            setattr(module, name, FastDepthWiseSeperableConv(child, upsample=upsample, channels_last=channels_last))
+    return model
@@ -201,6 +201,32 @@ class FFC(nn.Module):
         module = nn.Identity if in_cg == 0 or out_cl == 0 or not self.gated else nn.Conv2d
         self.gate = module(in_channels, 2, 1)
 
+        # set by fuse_local_convs()
+        self.convl2lg = None
+        self.local_out_num = out_cl
+
+    def fuse_local_convs(self):
+        """
+        Inference-time rewrite: convl2l and convl2g read the same x_l, so concatenate their weights along
+        the output dimension into a single convl2lg and split its result in forward.
+        Apply after the checkpoint is loaded; the state dict keys change afterwards.
+        """
+        l2l, l2g = self.convl2l, self.convl2g
+        if not (isinstance(l2l, nn.Conv2d) and isinstance(l2g, nn.Conv2d)) or l2l.groups != 1:
+            return self
+
+        fused = nn.Conv2d(l2l.in_channels, l2l.out_channels + l2g.out_channels, l2l.kernel_size,
+                          l2l.stride, l2l.padding, l2l.dilation, l2l.groups, l2l.bias is not None,
+                          padding_mode=l2l.padding_mode).to(l2l.weight)
+        with torch.no_grad():
+            fused.weight.copy_(torch.cat([l2l.weight, l2g.weight], dim=0))
+            if fused.bias is not None:
+                fused.bias.copy_(torch.cat([l2l.bias, l2g.bias], dim=0))
+        self.convl2lg = fused
+        self.convl2l = nn.Identity()
+        self.convl2g = nn.Identity()
+        return self
+
     def forward(self, x):
         x_l, x_g = x if type(x) is tuple else (x, 0)
         out_xl, out_xg = 0, 0
@@ -216,6 +242,13 @@ class FFC(nn.Module):
         else:
             g2l_gate, l2g_gate = 1, 1
 
+        if self.convl2lg is not None:
+            l2l, l2g = self.convl2lg(x_l).split(
+                [self.local_out_num, self.convl2lg.out_channels - self.local_out_num], dim=1)
+            out_xl = l2l + self.convg2l(x_g) * g2l_gate
+            out_xg = l2g * l2g_gate + self.convg2g(x_g)
+            return out_xl, out_xg
+
         if self.ratio_gout != 1:
             out_xl = self.convl2l(x_l) + self.convg2l(x_g) * g2l_gate
         if self.ratio_gout != 0:
@@ -224,6 +257,13 @@ class FFC(nn.Module):
         return out_xl, out_xg
 
 
+def fuse_ffc_local_convs(model):
+    for module in model.modules():
+        if isinstance(module, FFC):
+            module.fuse_local_convs()
+    return model
+
+
 class FFC_BN_ACT(nn.Module):
 
     def __init__(self, in_channels, out_channels,
@@ -254,20 +294,53 @@ class FFC_BN_ACT(nn.Module):
         return x_l, x_g
 
 
+class LocalFFC_BN_ACT(FFC_BN_ACT):
+    """
+    FFC_BN_ACT with ratio_gin == ratio_gout == 0: only ffc.convl2l carries weights, so forward is a plain
+    conv -> norm -> activation on tensors. Returns a tensor instead of an (x_l, 0) tuple.
+    The module tree is inherited unchanged, so state dicts are interchangeable with FFC_BN_ACT.
+    """
+    def forward(self, x):
+        if type(x) is tuple:
+            x = x[0]
+        return self.act_l(self.bn_l(self.ffc.convl2l(x)))
+
+
+class GlobalFFC_BN_ACT(FFC_BN_ACT):
+    """
+    FFC_BN_ACT with ratio_gin == ratio_gout == 1: only ffc.convg2g carries weights.
+    Keeps the (0, x_g) tuple contract, since a bare tensor would be taken as the local part downstream.
+    """
+    def forward(self, x):
+        _, x_g = x
+        return 0, self.act_g(self.bn_g(self.ffc.convg2g(x_g)))
+
+
+def make_ffc_bn_act(in_channels, out_channels, kernel_size, ratio_gin, ratio_gout, **kwargs):
+    if ratio_gin == 0 and ratio_gout == 0:
+        return LocalFFC_BN_ACT(in_channels, out_channels, kernel_size, ratio_gin, ratio_gout, **kwargs)
+    if ratio_gin == 1 and ratio_gout == 1:
+        return GlobalFFC_BN_ACT(in_channels, out_channels, kernel_size, ratio_gin, ratio_gout, **kwargs)
+    return FFC_BN_ACT(in_channels, out_channels, kernel_size, ratio_gin, ratio_gout, **kwargs)
+
+
 class FFCResnetBlock(nn.Module):
     def __init__(self, dim, padding_type, norm_layer, activation_layer=nn.ReLU, dilation=1,
                  spatial_transform_kwargs=None, inline=False, **conv_kwargs):
         super().__init__()
-        self.conv1 = FFC_BN_ACT(dim, dim, kernel_size=3, padding=dilation, dilation=dilation,
-                                norm_layer=norm_layer,
-                                activation_layer=activation_layer,
-                                padding_type=padding_type,
-                                **conv_kwargs)
-        self.conv2 = FFC_BN_ACT(dim, dim, kernel_size=3, padding=dilation, dilation=dilation,
-                                norm_layer=norm_layer,
-                                activation_layer=activation_layer,
-                                padding_type=padding_type,
-                                **conv_kwargs)
+        # pure-local/pure-global bodies get the specialised modules; the spatial transform wrapper maps over
+        # (x_l, x_g) tuples, so wrapped convs keep the generic FFC_BN_ACT
+        conv_type = make_ffc_bn_act if spatial_transform_kwargs is None else FFC_BN_ACT
+        self.conv1 = conv_type(dim, dim, kernel_size=3, padding=dilation, dilation=dilation,
+                               norm_layer=norm_layer,
+                               activation_layer=activation_layer,
+                               padding_type=padding_type,
+                               **conv_kwargs)
+        self.conv2 = conv_type(dim, dim, kernel_size=3, padding=dilation, dilation=dilation,
+                               norm_layer=norm_layer,
+                               activation_layer=activation_layer,
+                               padding_type=padding_type,
+                               **conv_kwargs)
         if spatial_transform_kwargs is not None:
             self.conv1 = LearnableSpatialTransformWrapper(self.conv1, **spatial_transform_kwargs)
             self.conv2 = LearnableSpatialTransformWrapper(self.conv2, **spatial_transform_kwargs)
@@ -281,8 +354,8 @@ class FFCResnetBlock(nn.Module):
 
         id_l, id_g = x_l, x_g
 
-        x_l, x_g = self.conv1((x_l, x_g))
-        x_l, x_g = self.conv2((x_l, x_g))
+        out = self.conv2(self.conv1((x_l, x_g)))
+        x_l, x_g = out if type(out) is tuple else (out, 0)  # LocalFFC_BN_ACT returns a bare tensor
 
         x_l, x_g = id_l + x_l, id_g + x_g
         out = x_l, x_g
@@ -293,11 +366,15 @@ class FFCResnetBlock(nn.Module):
 
 class ConcatTupleLayer(nn.Module):
     def forward(self, x):
+        if torch.is_tensor(x):
+            return x
         assert isinstance(x, tuple)
         x_l, x_g = x
         assert torch.is_tensor(x_l) or torch.is_tensor(x_g)
         if not torch.is_tensor(x_g):
             return x_l
+        if not torch.is_tensor(x_l):  # pure-global body
+            return x_g
         return torch.cat(x, dim=1)
 
 
@@ -312,8 +389,8 @@ class FFCResNetGenerator(nn.Module):
         super().__init__()
 
         model = [nn.ReflectionPad2d(3),
-                 FFC_BN_ACT(input_nc, ngf, kernel_size=7, padding=0, norm_layer=norm_layer,
-                            activation_layer=activation_layer, **init_conv_kwargs)]
+                 make_ffc_bn_act(input_nc, ngf, kernel_size=7, padding=0, norm_layer=norm_layer,
+                                 activation_layer=activation_layer, **init_conv_kwargs)]
 
         ### downsample
         for i in range(n_downsampling):
@@ -323,12 +400,12 @@ class FFCResNetGenerator(nn.Module):
                 cur_conv_kwargs['ratio_gout'] = resnet_conv_kwargs.get('ratio_gin', 0)
             else:
                 cur_conv_kwargs = downsample_conv_kwargs
-            model += [FFC_BN_ACT(min(max_features, ngf * mult),
-                                 min(max_features, ngf * mult * 2),
-                                 kernel_size=3, stride=2, padding=1,
-                                 norm_layer=norm_layer,
-                                 activation_layer=activation_layer,
-                                 **cur_conv_kwargs)]
+            model += [make_ffc_bn_act(min(max_features, ngf * mult),
+                                      min(max_features, ngf * mult * 2),
+                                      kernel_size=3, stride=2, padding=1,
+                                      norm_layer=norm_layer,
+                                      activation_layer=activation_layer,
+                                      **cur_conv_kwargs)]
 
         mult = 2 ** n_downsampling
         feats_num_bottleneck = min(max_features, ngf * mult)
@@ -377,8 +454,8 @@ class FFCNLayerDiscriminator(BaseDiscriminator):
 
         kw = 3
         padw = int(np.ceil((kw-1.0)/2))
-        sequence = [[FFC_BN_ACT(input_nc, ndf, kernel_size=kw, padding=padw, norm_layer=norm_layer,
-                                activation_layer=_act_ctor, **init_conv_kwargs)]]
+        sequence = [[make_ffc_bn_act(input_nc, ndf, kernel_size=kw, padding=padw, norm_layer=norm_layer,
+                                     activation_layer=_act_ctor, **init_conv_kwargs)]]
 
         nf = ndf
         for n in range(1, n_layers):
@@ -386,11 +463,11 @@ class FFCNLayerDiscriminator(BaseDiscriminator):
             nf = min(nf * 2, max_features)
 
             cur_model = [
-                FFC_BN_ACT(nf_prev, nf,
-                           kernel_size=kw, stride=2, padding=padw,
-                           norm_layer=norm_layer,
-                           activation_layer=_act_ctor,
-                           **conv_kwargs)
+                make_ffc_bn_act(nf_prev, nf,
+                                kernel_size=kw, stride=2, padding=padw,
+                                norm_layer=norm_layer,
+                                activation_layer=_act_ctor,
+                                **conv_kwargs)
             ]
             sequence.append(cur_model)
 
@@ -398,11 +475,11 @@ class FFCNLayerDiscriminator(BaseDiscriminator):
         nf = min(nf * 2, 512)
 
         cur_model = [
-            FFC_BN_ACT(nf_prev, nf,
-                       kernel_size=kw, stride=1, padding=padw,
-                       norm_layer=norm_layer,
-                       activation_layer=lambda *args, **kwargs: nn.LeakyReLU(*args, negative_slope=0.2, **kwargs),
-                       **conv_kwargs),
+            make_ffc_bn_act(nf_prev, nf,
+                            kernel_size=kw, stride=1, padding=padw,
+                            norm_layer=norm_layer,
+                            activation_layer=lambda *args, **kwargs: nn.LeakyReLU(*args, negative_slope=0.2, **kwargs),
+                            **conv_kwargs),
             ConcatTupleLayer()
         ]
         sequence.append(cur_model)
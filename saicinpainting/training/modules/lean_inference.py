@@ -0,0 +1,347 @@
+"""
+Inference-only executor for the Sequential generators (FFCResNetGenerator and the pix2pixhd GlobalGenerator family,
+whose forward is `self.model(input)`) that keeps fewer activations alive than calling the module:
+
+- BatchNorm (eval) and activations run in place on tensors the executor produced itself, residual adds go into
+  the freshly computed branch instead of a new tensor, and FFC branch sums skip the `* 1` gate copy;
+- reflection/replication padding in front of a conv (ReflectionPad2d + Conv2d, or padding_mode='reflect') is applied
+  strip by strip over output rows when the input is large, so the padded copy of a full-resolution activation is
+  never materialized;
+- FourierUnit writes its spectra into buffers shared by every FourierUnit of the same shape (rfftn/irfftn out=,
+  view_as_real/view_as_complex instead of stack/complex copies); a buffer is released once a top-level layer runs
+  without asking for it.
+
+Each intermediate is dropped as soon as the next layer has consumed it. Module types without a lean path (and
+training-mode norms) fall back to module(x), so the result is always the module's forward up to float rounding.
+Forward hooks are not called for modules the executor runs itself.
+"""
+import sys
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from saicinpainting.training.modules.ffc import (ConcatTupleLayer, FFC, FFC_BN_ACT, FFCResnetBlock, FourierUnit,
+                                                 GlobalFFC_BN_ACT, LocalFFC_BN_ACT, SpectralTransform)
+
+DEFAULT_TILE_BYTES = 8 * 2 ** 20
+_PAD_MODES = {nn.ReflectionPad2d: 'reflect', nn.ReplicationPad2d: 'replicate'}
+_INPLACE_ACTIVATIONS = {nn.ReLU: torch.relu_, nn.Sigmoid: torch.sigmoid_, nn.Tanh: torch.tanh_}
+
+
+def lean_forward(model, input, tile_bytes=DEFAULT_TILE_BYTES):
+    """
+    model(input) for a generator with a Sequential `model` attribute, with lower peak activation memory.
+    tile_bytes bounds the padded strip of a row-tiled conv; inputs under twice that are padded whole.
+    """
+    assert not model.training, 'lean_forward is inference-only; call model.eval() first'
+    with torch.no_grad():
+        return _LeanRun(tile_bytes).top_level(model.model, input)
+
+
+def _storages(x):
+    if torch.is_tensor(x):
+        return {x.untyped_storage().data_ptr()}
+    if isinstance(x, (tuple, list)):
+        return set().union(*(_storages(elem) for elem in x))
+    return set()
+
+
+def _add(a, a_owned, b, b_owned):
+    """a + b, written into whichever operand the executor owns; int 0 stands for a missing FFC branch."""
+    if not torch.is_tensor(a):
+        return b, b_owned
+    if not torch.is_tensor(b):
+        return a, a_owned
+    if a_owned:
+        return a.add_(b), True
+    if b_owned:
+        return b.add_(a), True
+    return a + b, True
+
+
+def _pix2pixhd_residual_blocks():
+    # a model can only contain these once pix2pixhd is imported; don't import it for ffc_resnet
+    module = sys.modules.get('saicinpainting.training.modules.pix2pixhd')
+    if module is None:
+        return ()
+    return module.ResnetBlock, module.ResnetBlock5x5, module.MultidilatedResnetBlock
+
+
+class _LeanRun:
+    """
+    State of one lean_forward call. Every runner takes (module, x, owned) and returns (output, owned):
+    owned means no one outside the executor references the tensors, so they may be modified in place.
+    """
+    def __init__(self, tile_bytes):
+        self.tile_bytes = tile_bytes
+        self._buffers = {}
+        self._requested = set()
+        self._runners = {
+            nn.Sequential: self.sequential,
+            nn.BatchNorm2d: self.batch_norm,
+            nn.Identity: lambda module, x, owned: (x, owned),
+            nn.Conv2d: lambda module, x, owned: (self.conv(module, x), True),
+            ConcatTupleLayer: self.concat_tuple,
+            FFC_BN_ACT: self.ffc_bn_act,
+            LocalFFC_BN_ACT: self.local_ffc_bn_act,
+            GlobalFFC_BN_ACT: self.global_ffc_bn_act,
+            FFCResnetBlock: self.ffc_resnet_block,
+        }
+        self._runners.update(dict.fromkeys(_INPLACE_ACTIVATIONS, self.activation))
+        self._runners[nn.LeakyReLU] = self.activation
+        self._runners.update(dict.fromkeys(_pix2pixhd_residual_blocks(), self.resnet_block))
+
+    def top_level(self, sequential, x):
+        owned = False
+        layers = list(sequential)
+        i = 0
+        while i < len(layers):
+            x, owned, i = self._step(layers, i, x, owned)
+            # buffers no longer asked for belong to another stage of the network (other shapes)
+            for key in self._buffers.keys() - self._requested:
+                del self._buffers[key]
+            self._requested.clear()
+        self._buffers.clear()
+        return x
+
+    def run(self, module, x, owned):
+        runner = self._runners.get(type(module))
+        if runner is not None:
+            return runner(module, x, owned)
+        out = module(x)
+        return out, owned or not (_storages(out) & _storages(x))
+
+    def sequential(self, sequential, x, owned):
+        layers = list(sequential)
+        i = 0
+        while i < len(layers):
+            x, owned, i = self._step(layers, i, x, owned)
+        return x, owned
+
+    def _step(self, layers, i, x, owned):
+        layer = layers[i]
+        following = layers[i + 1] if i + 1 < len(layers) else None
+        if type(layer) in _PAD_MODES and type(following) is nn.Conv2d and following.padding == (0, 0):
+            # pad + conv as one strip-wise padded conv: the padded copy is never built in full
+            return self.conv(following, x, layer.padding, _PAD_MODES[type(layer)]), True, i + 2
+        x, owned = self.run(layer, x, owned)
+        return x, owned, i + 1
+
+    # ----- convolutions -----
+
+    def conv(self, conv, x, padding=None, mode=None):
+        """conv(x) after padding (left, right, top, bottom) in mode; defaults to the conv's own padding_mode."""
+        if padding is None and conv.padding_mode in ('reflect', 'replicate'):
+            padding, mode = conv._reversed_padding_repeated_twice, conv.padding_mode
+        if padding is None:
+            return conv(x)
+        if x.numel() * x.element_size() < 2 * self.tile_bytes:
+            return F.conv2d(F.pad(x, padding, mode=mode), conv.weight, conv.bias, conv.stride, 0,
+                            conv.dilation, conv.groups)
+        return self._conv_in_strips(conv, x, padding, mode)
+
+    def _conv_in_strips(self, conv, x, padding, mode):
+        left, right, top, bottom = padding
+        batch, channels, height, width = x.shape
+        stride = conv.stride[0]
+        kernel = conv.dilation[0] * (conv.kernel_size[0] - 1) + 1
+        out_height = (height + top + bottom - kernel) // stride + 1
+        out_width = (width + left + right - conv.dilation[1] * (conv.kernel_size[1] - 1) - 1) // conv.stride[1] + 1
+        row_bytes = batch * channels * (width + left + right) * stride * x.element_size()
+        # reflect padding needs more rows in a strip than it pads
+        rows = max(self.tile_bytes // row_bytes, top + bottom + kernel, 1)
+        out = x.new_empty(batch, conv.out_channels, out_height, out_width)
+        for first in range(0, out_height, rows):
+            last = min(out_height, first + rows)
+            # padded input rows [begin, end) feed output rows [first, last)
+            begin, end = first * stride - top, (last - 1) * stride + kernel - top
+            strip = F.pad(x[:, :, max(0, begin):min(height, end)],
+                          (left, right, max(0, -begin), max(0, end - height)), mode=mode)
+            out[:, :, first:last] = F.conv2d(strip, conv.weight, conv.bias, conv.stride, 0,
+                                             conv.dilation, conv.groups)
+        return out
+
+    # ----- norms and activations -----
+
+    def batch_norm(self, bn, x, owned):
+        if bn.training or not bn.track_running_stats or not owned:
+            return bn(x), True
+        scale = torch.rsqrt(bn.running_var + bn.eps)
+        if bn.affine:
+            scale = scale * bn.weight
+        shift = -bn.running_mean * scale
+        if bn.affine:
+            shift = shift + bn.bias
+        return x.mul_(scale[:, None, None]).add_(shift[:, None, None]), True
+
+    def activation(self, act, x, owned):
+        if not owned:
+            return act(x), not getattr(act, 'inplace', False)
+        if type(act) is nn.LeakyReLU:
+            return F.leaky_relu_(x, act.negative_slope), True
+        return _INPLACE_ACTIVATIONS[type(act)](x), True
+
+    def _norm_act(self, bn, act, x, owned):
+        if not torch.is_tensor(x):
+            return x, owned
+        x, owned = self.run(bn, x, owned)
+        return self.run(act, x, owned)
+
+    # ----- FFC -----
+
+    def ffc(self, ffc, x):
+        """(out_l, out_g) and whether each is owned; x is only read."""
+        x_l, x_g = x if type(x) is tuple else (x, 0)
+        if ffc.gated:
+            out_l, out_g = ffc((x_l, x_g))
+            return out_l, True, out_g, True
+        if ffc.convl2lg is not None:
+            l2l, l2g = self.conv(ffc.convl2lg, x_l).split(
+                [ffc.local_out_num, ffc.convl2lg.out_channels - ffc.local_out_num], dim=1)
+            out_l, l_owned = _add(l2l, True, *self._branch(ffc.convg2l, x_g))
+            out_g, g_owned = _add(l2g, True, *self._branch(ffc.convg2g, x_g))
+            return out_l, l_owned, out_g, g_owned
+        out_l, l_owned, out_g, g_owned = 0, True, 0, True
+        if ffc.ratio_gout != 1:
+            out_l, l_owned = _add(*self._branch(ffc.convl2l, x_l), *self._branch(ffc.convg2l, x_g))
+        if ffc.ratio_gout != 0:
+            out_g, g_owned = _add(*self._branch(ffc.convl2g, x_l), *self._branch(ffc.convg2g, x_g))
+        return out_l, l_owned, out_g, g_owned
+
+    def _branch(self, module, x):
+        if type(module) is nn.Identity:
+            return x, False
+        if type(module) is nn.Conv2d:
+            return self.conv(module, x), True
+        if type(module) is SpectralTransform and not module.enable_lfu:
+            return self.spectral_transform(module, x), True
+        return module(x), True
+
+    def ffc_bn_act(self, block, x, owned):
+        if type(block.ffc) is not FFC:
+            return block(x), True
+        out_l, l_owned, out_g, g_owned = self.ffc(block.ffc, x)
+        del x
+        out_l, l_owned = self._norm_act(block.bn_l, block.act_l, out_l, l_owned)
+        out_g, g_owned = self._norm_act(block.bn_g, block.act_g, out_g, g_owned)
+        return (out_l, out_g), l_owned and g_owned
+
+    def local_ffc_bn_act(self, block, x, owned):
+        if type(x) is tuple:
+            x = x[0]
+        out = self.conv(block.ffc.convl2l, x)
+        del x
+        return self._norm_act(block.bn_l, block.act_l, out, True)
+
+    def global_ffc_bn_act(self, block, x, owned):
+        out, out_owned = self._branch(block.ffc.convg2g, x[1])
+        del x
+        out, out_owned = self._norm_act(block.bn_g, block.act_g, out, out_owned)
+        return (0, out), out_owned
+
+    def spectral_transform(self, transform, x):
+        x, owned = self.run(transform.downsample, x, False)
+        x, owned = self.sequential(transform.conv1, x, owned)
+        out = self.fourier_unit(transform.fu, x)
+        # x + fu(x) (+ 0 without lfu) summed into fu's output
+        out += x
+        del x
+        return transform.conv2(out)
+
+    def fourier_unit(self, unit, x):
+        """FourierUnit(x) into a shared buffer — valid until the next fourier_unit call."""
+        if unit.use_se or unit.spectral_pos_encoding or unit.spatial_scale_factor is not None or unit.ffc3d:
+            return unit(x)
+        batch, channels, height, width = x.shape
+        spectrum_width = width // 2 + 1
+        ffted = torch.fft.rfftn(x, dim=(-2, -1), norm=unit.fft_norm,
+                                out=self._buffer('rfft', (batch, channels, height, spectrum_width), x,
+                                                 x.dtype.to_complex()))
+        stacked = self._buffer('stacked', (batch, channels, 2, height, spectrum_width), x)
+        stacked.copy_(torch.view_as_real(ffted).permute(0, 1, 4, 2, 3))
+        ffted = unit.conv_layer(stacked.view(batch, -1, height, spectrum_width))
+        ffted, _ = self._norm_act(unit.bn, unit.relu, ffted, True)
+        out_channels = ffted.shape[1] // 2
+        unstacked = self._buffer('unstacked', (batch, out_channels, height, spectrum_width, 2), x)
+        unstacked.copy_(ffted.view(batch, out_channels, 2, height, spectrum_width).permute(0, 1, 3, 4, 2))
+        del ffted
+        return torch.fft.irfftn(torch.view_as_complex(unstacked), s=(height, width), dim=(-2, -1),
+                                norm=unit.fft_norm,
+                                out=self._buffer('irfft', (batch, out_channels, height, width), x))
+
+    def _buffer(self, name, shape, like, dtype=None):
+        dtype = dtype or like.dtype
+        key = (name, tuple(shape), dtype, like.device)
+        self._requested.add(key)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = torch.empty(shape, dtype=dtype, device=like.device)
+        return buffer
+
+    # ----- residual blocks -----
+
+    def ffc_resnet_block(self, block, x, owned):
+        if block.inline:
+            return block(x), True
+        x_l, x_g = x if type(x) is tuple else (x, 0)
+        del x
+        out, out_owned = self.run(block.conv1, (x_l, x_g), False)
+        out, out_owned = self.run(block.conv2, out, out_owned)
+        out_l, out_g = out if type(out) is tuple else (out, 0)  # LocalFFC_BN_ACT returns a bare tensor
+        del out
+        out_l, l_owned = _add(out_l, out_owned, x_l, owned)
+        out_g, g_owned = _add(out_g, out_owned, x_g, owned)
+        return (out_l, out_g), l_owned and g_owned
+
+    def resnet_block(self, block, x, owned):
+        if getattr(block, 'in_dim', None) is not None:
+            identity, identity_owned = block.input_conv(x), True
+        else:
+            identity, identity_owned = x, owned
+        out, out_owned = self.sequential(block.conv_block, x, False)
+        del x
+        return _add(out, out_owned, identity, identity_owned)
+
+    def concat_tuple(self, layer, x, owned):
+        if torch.is_tensor(x):
+            return x, owned
+        x_l, x_g = x
+        if not torch.is_tensor(x_g):
+            return x_l, owned
+        if not torch.is_tensor(x_l):
+            return x_g, owned
+        return torch.cat(x, dim=1), True
+
+
+if __name__ == '__main__':
+    # regression check against module(x): small FFCResNetGenerators shaped like lama-fourier.yaml (pure-local stem,
+    # mixed local/global resnet body) plus pure-local and pure-global bodies, random norm statistics, with and
+    # without fused FFC convs and row tiling
+    from saicinpainting.training.modules.ffc import FFCResNetGenerator, fuse_ffc_local_convs
+
+    torch.manual_seed(0)
+    for ratio in (0.75, 0, 1):
+        model = FFCResNetGenerator(4, 1, ngf=8, n_downsampling=2, n_blocks=2, add_out_act='sigmoid',
+                                   init_conv_kwargs=dict(ratio_gin=0, ratio_gout=0, enable_lfu=False),
+                                   downsample_conv_kwargs=dict(ratio_gin=0, ratio_gout=0, enable_lfu=False),
+                                   resnet_conv_kwargs=dict(ratio_gin=ratio, ratio_gout=ratio, enable_lfu=False)).eval()
+        for module in model.modules():
+            if isinstance(module, nn.BatchNorm2d):
+                module.running_mean.uniform_(-0.1, 0.1)
+                module.running_var.uniform_(0.5, 1.5)
+                module.weight.data.uniform_(0.5, 1.5)
+                module.bias.data.uniform_(-0.1, 0.1)
+        for fused in (False, True):
+            if fused:
+                fuse_ffc_local_convs(model)
+            for shape, tile_bytes in [((1, 4, 64, 64), DEFAULT_TILE_BYTES), ((2, 4, 48, 80), DEFAULT_TILE_BYTES),
+                                      ((1, 4, 96, 64), 4096)]:  # tiny tiles force the strip-by-strip padded convs
+                x = torch.rand(shape)
+                with torch.no_grad():
+                    expected = model(x)
+                actual = lean_forward(model, x, tile_bytes)
+                assert actual.shape == expected.shape, (ratio, shape, actual.shape, expected.shape)
+                diff = (actual - expected).abs().max().item()
+                assert diff < 1e-5, (ratio, fused, shape, tile_bytes, diff)
+    print('lean_forward matches module(x)', file=sys.stderr)
@@ -15,7 +15,7 @@ class MultidilatedConv(nn.Module):
             if equal_dim:
                 assert out_dim % dilation_num == 0
                 out_dims = [out_dim // dilation_num] * dilation_num
-                self.index = sum([[i + j * (out_dims[0]) for j in range(dilation_num)] for i in range(out_dims[0])], [])
+                index = sum([[i + j * (out_dims[0]) for j in range(dilation_num)] for i in range(out_dims[0])], [])
             else:
                 out_dims = [out_dim // 2 ** (i + 1) for i in range(dilation_num - 1)]
                 out_dims.append(out_dim - sum(out_dims))
@@ -26,8 +26,9 @@ class MultidilatedConv(nn.Module):
                     for j in range(dilation_num):
                         index += list(range(starts[j], starts[j] + lengths[j]))
                         starts[j] += lengths[j]
-                self.index = index
                 assert(len(index) == out_dim)
+            # not persistent: derived from the constructor args, so checkpoints stay unchanged
+            self.register_buffer('index', torch.tensor(index), persistent=False)
             self.out_dims = out_dims
         else:
             self.cat_out = False
@@ -61,6 +62,7 @@ class MultidilatedConv(nn.Module):
                 convs[-1].bias = convs[0].bias
             dilation *= 2
         self.convs = nn.ModuleList(convs)
+        self.shuffle_folded = False
 
         self.shuffle_in_channels = shuffle_in_channels
         if self.shuffle_in_channels:
@@ -70,9 +72,46 @@ class MultidilatedConv(nn.Module):
             # save as buffer so it is saved and loaded with checkpoint
             self.register_buffer('in_channels_permute', torch.tensor(in_channels_permute))
 
+    def fold_channel_shuffle(self):
+        """
+        Inference-time rewrite: permuting input channels before a conv is the same as permuting the input
+        dimension of its weight, so fold in_channels_permute into the weights once and skip the gather.
+        Only possible when every conv reads the whole input (no cat_in) and is a plain nn.Conv2d.
+        A state_dict saved after folding carries a shuffle_folded marker, so loading it restores the flag.
+        """
+        if not self.shuffle_in_channels or self.shuffle_folded or self.cat_in:
+            return self
+        if not all(type(conv) is nn.Conv2d and conv.groups == 1 for conv in self.convs):
+            return self
+
+        inverse = torch.argsort(self.in_channels_permute)
+        seen = set()  # shared_weights: fold each parameter only once
+        with torch.no_grad():
+            for conv in self.convs:
+                if id(conv.weight) in seen:
+                    continue
+                seen.add(id(conv.weight))
+                conv.weight.copy_(conv.weight[:, inverse.to(conv.weight.device)])
+        self.shuffle_folded = True
+        return self
+
+    def _save_to_state_dict(self, destination, prefix, keep_vars):
+        super()._save_to_state_dict(destination, prefix, keep_vars)
+        if self.shuffle_folded:
+            # folded weights are only right without the gather: mark them so a fresh module that loads this
+            # state skips the permutation instead of applying it twice (unfolded state dicts stay unchanged)
+            destination[prefix + 'shuffle_folded'] = torch.tensor(True)
+
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                              error_msgs):
+        # load_state_dict hands each module its own copy of the dict, so the marker can be popped here
+        self.shuffle_folded = bool(state_dict.pop(prefix + 'shuffle_folded', False))
+        super()._load_from_state_dict(state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys,
+                                      error_msgs)
+
     def forward(self, x):
-        if self.shuffle_in_channels:
-            x = x[:, self.in_channels_permute]
+        if self.shuffle_in_channels and not self.shuffle_folded:
+            x = x.index_select(1, self.in_channels_permute)
 
         outs = []
         if self.cat_in:
@@ -85,14 +124,30 @@ class MultidilatedConv(nn.Module):
                     new_x.append(x[:, start:start+dim])
                     start += dim
                 x = new_x
+        if not self.cat_out:
+            # sum mode: accumulate into the first output instead of allocating per addition
+            out = None
+            for i, conv in enumerate(self.convs):
+                cur = conv(x[i] if self.cat_in else x)
+                out = cur if out is None else out.add_(cur)
+            return out
+
         for i, conv in enumerate(self.convs):
             if self.cat_in:
                 input = x[i]
             else:
                 input = x
             outs.append(conv(input))
-        if self.cat_out:
-            out = torch.cat(outs, dim=1)[:, self.index]
+        if self.equal_dim:
+            # self.index interleaves the convs channel by channel, which is exactly a stack on a new dim 2
+            out = torch.stack(outs, dim=2).flatten(1, 2)
         else:
-            out = sum(outs)
+            out = torch.cat(outs, dim=1).index_select(1, self.index)
         return out
+
+
+def fold_multidilated_shuffles(model):
+    for module in model.modules():
+        if isinstance(module, MultidilatedConv):
+            module.fold_channel_shuffle()
+    return model
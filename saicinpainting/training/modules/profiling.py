@@ -0,0 +1,183 @@
+import json
+import math
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+
+from saicinpainting.training.modules.ffc import FourierUnit
+
+
+def _tensors(x):
+    if torch.is_tensor(x):
+        return [x]
+    if isinstance(x, (tuple, list)):
+        return [t for elem in x for t in _tensors(elem)]
+    return []
+
+
+def _shape(x):
+    if torch.is_tensor(x):
+        return list(x.shape)
+    if isinstance(x, (tuple, list)):
+        return [_shape(elem) for elem in x]
+    return x
+
+
+def estimate_flops(module, inputs, output):
+    """
+    Rough FLOPs of the module's own work (multiply-add = 2), not counting its children.
+    Unknown module types report 0; the report adds children up into total_flops.
+    """
+    ins, outs = _tensors(inputs), _tensors(output)
+    if not ins or not outs:
+        return 0
+    x, y = ins[0], outs[0]
+    if isinstance(module, nn.Conv2d):
+        kh, kw = module.kernel_size
+        return 2 * y.numel() * (module.in_channels // module.groups) * kh * kw
+    if isinstance(module, nn.ConvTranspose2d):
+        kh, kw = module.kernel_size
+        return 2 * x.numel() * (module.out_channels // module.groups) * kh * kw
+    if isinstance(module, nn.Linear):
+        return 2 * y.numel() * module.in_features
+    if isinstance(module, FourierUnit):
+        # rfftn + irfftn, ~2.5 N log2 N real FLOPs each over the spatial dims of every channel
+        spatial = x.shape[-2] * x.shape[-1]
+        return 2 * int(2.5 * x.numel() * math.log2(max(spatial, 2)))
+    if isinstance(module, (nn.BatchNorm2d, nn.InstanceNorm2d)):
+        return 2 * y.numel()
+    if isinstance(module, (nn.ReLU, nn.LeakyReLU, nn.Sigmoid, nn.Tanh)):
+        return y.numel()
+    return 0
+
+
+class LayerProfiler:
+    """
+    Forward hooks on every submodule of a generator: wall time (inclusive), FLOP estimate, output shapes and
+    peak allocated memory (CUDA only; on CPU the output size in bytes is recorded instead).
+    Stats are aggregated by module name across calls, so one profiler can follow the model over many requests.
+    Nothing is registered unless attach() is called, so a disabled profiler costs nothing.
+    Safe to share between threads running the same model: attach() is idempotent per model (attach once, keep the
+    hooks), the per-forward module stack is thread-local and stats are updated under a lock. CUDA peak memory is
+    process-wide, so peaks of overlapping forwards still mix.
+    """
+    def __init__(self, max_trace_events=200000):
+        self.stats = defaultdict(lambda: {'type': None, 'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'flops': 0,
+                                          'output_shape': None, 'output_bytes': 0, 'peak_allocated': None})
+        self.trace_events = []
+        self.max_trace_events = max_trace_events
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._handles = weakref.WeakKeyDictionary()  # model -> hook handles
+        self._origin = time.perf_counter()
+
+    @property
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def attach(self, model, prefix='generator'):
+        """Register hooks on model unless they already are."""
+        with self._lock:
+            if model in self._handles:
+                return self
+            handles = []
+            for name, module in model.named_modules():
+                full_name = f'{prefix}.{name}' if name else prefix
+                handles.append(module.register_forward_pre_hook(self._make_pre_hook(full_name)))
+                handles.append(module.register_forward_hook(self._make_post_hook(full_name)))
+            self._handles[model] = handles
+        return self
+
+    def detach(self, model=None):
+        """Remove the hooks from model, or from every attached model."""
+        with self._lock:
+            models = list(self._handles) if model is None else [model]
+            for attached in models:
+                for handle in self._handles.pop(attached, []):
+                    handle.remove()
+
+    def _make_pre_hook(self, name):
+        def hook(module, inputs):
+            cuda = any(t.is_cuda for t in _tensors(inputs))
+            if cuda:
+                torch.cuda.synchronize()
+                if self._stack:
+                    # keep the parent's peak seen so far before the counter is reset for this child
+                    parent = self._stack[-1]
+                    parent['peak'] = max(parent['peak'], torch.cuda.max_memory_allocated())
+                torch.cuda.reset_peak_memory_stats()
+            self._stack.append({'name': name, 'start': time.perf_counter(), 'peak': 0, 'cuda': cuda})
+        return hook
+
+    def _make_post_hook(self, name):
+        def hook(module, inputs, output):
+            frame = self._stack.pop()
+            if frame['cuda']:
+                torch.cuda.synchronize()
+                frame['peak'] = max(frame['peak'], torch.cuda.max_memory_allocated())
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], frame['peak'])
+            end = time.perf_counter()
+            elapsed_ms = (end - frame['start']) * 1000
+            flops = estimate_flops(module, inputs, output)
+            output_shape = _shape(output)
+            output_bytes = sum(t.numel() * t.element_size() for t in _tensors(output))
+
+            with self._lock:
+                entry = self.stats[name]
+                entry['type'] = type(module).__name__
+                entry['calls'] += 1
+                entry['total_ms'] += elapsed_ms
+                entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+                entry['flops'] += flops
+                entry['output_shape'] = output_shape
+                entry['output_bytes'] = output_bytes
+                if frame['cuda']:
+                    entry['peak_allocated'] = max(entry['peak_allocated'] or 0, frame['peak'])
+
+                if len(self.trace_events) < self.max_trace_events:
+                    self.trace_events.append({
+                        'name': name, 'cat': entry['type'], 'ph': 'X', 'pid': os.getpid(),
+                        'tid': threading.get_ident(), 'ts': (frame['start'] - self._origin) * 1e6,
+                        'dur': elapsed_ms * 1000, 'args': {'output_shape': output_shape},
+                    })
+        return hook
+
+    def report(self):
+        """Rows sorted by total time, slowest first."""
+        with self._lock:
+            rows = [dict(name=name, **entry) for name, entry in self.stats.items()]
+        for row in rows:
+            row['mean_ms'] = row['total_ms'] / max(row['calls'], 1)
+            prefix = row['name'] + '.'
+            row['total_flops'] = sum(other['flops'] for other in rows
+                                     if other['name'] == row['name'] or other['name'].startswith(prefix))
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def format_report(self, limit=None):
+        lines = [f'{"module":<50} {"type":<24} {"calls":>6} {"total ms":>10} {"mean ms":>9} {"GFLOP":>9} '
+                 f'{"peak MB":>9}  output shape']
+        for row in self.report()[:limit]:
+            peak = '-' if row['peak_allocated'] is None else f'{row["peak_allocated"] / 2 ** 20:.1f}'
+            lines.append(f'{row["name"]:<50} {row["type"]:<24} {row["calls"]:>6} {row["total_ms"]:>10.2f} '
+                         f'{row["mean_ms"]:>9.2f} {row["total_flops"] / 1e9:>9.3f} {peak:>9}  {row["output_shape"]}')
+        return '\n'.join(lines)
+
+    def dump(self, out_dir):
+        """Write report.txt, report.json and a Chrome trace (chrome://tracing, Perfetto) to out_dir."""
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:  # concurrent requests dump to the same files
+            (out_dir / 'report.txt').write_text(self.format_report() + '\n', encoding='utf-8')
+            (out_dir / 'report.json').write_text(json.dumps(self.report()), encoding='utf-8')
+            (out_dir / 'trace.json').write_text(json.dumps({'traceEvents': self.trace_events}), encoding='utf-8')
+        return out_dir
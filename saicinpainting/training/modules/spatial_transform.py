@@ -1,46 +1,128 @@
+import math
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from kornia.geometry.transform import rotate
+
+# kornia is imported where it is used: building a generator without spatial transform layers
+# (or importing ffc at all) should not pay for it
+
+
+def rotate(x, angle):
+    from kornia.geometry.transform import rotate as kornia_rotate
+    return kornia_rotate(x, angle=angle)
+
+
+def _rotation_grid(angle, height, width):
+    """The sampling grid kornia's rotate(x, angle) builds for a (height, width) input, shape (1, H, W, 2)."""
+    from kornia.geometry.conversions import convert_affinematrix_to_homography, normalize_homography
+    from kornia.geometry.transform import get_rotation_matrix2d
+
+    center = torch.tensor([[(width - 1) / 2, (height - 1) / 2]], device=angle.device, dtype=angle.dtype)
+    matrix = get_rotation_matrix2d(center, angle.view(1), torch.ones_like(center))
+    dst_norm_trans_src_norm = normalize_homography(convert_affinematrix_to_homography(matrix),
+                                                   (height, width), (height, width))
+    src_norm_trans_dst_norm = torch.inverse(dst_norm_trans_src_norm)
+    return F.affine_grid(src_norm_trans_dst_norm[:, :2, :], [1, 1, height, width], align_corners=True)
 
 
 class LearnableSpatialTransformWrapper(nn.Module):
-    def __init__(self, impl, pad_coef=0.5, angle_init_range=80, train_angle=True):
+    def __init__(self, impl, pad_coef=0.5, angle_init_range=80, train_angle=True, tight_padding=False,
+                 cache_grids=True):
         super().__init__()
         self.impl = impl
         self.angle = torch.rand(1) * angle_init_range
         if train_angle:
             self.angle = nn.Parameter(self.angle, requires_grad=True)
         self.pad_coef = pad_coef
+        # pad just enough to hold the rotated canvas instead of pad_coef on each side
+        self.tight_padding = tight_padding
+        # with a frozen angle the pads and both sampling grids only depend on (shape, device, dtype)
+        self.cache_grids = cache_grids
+        self._grid_cache = {}
 
     def forward(self, x):
         if torch.is_tensor(x):
             return self.inverse_transform(self.impl(self.transform(x)), x)
         elif isinstance(x, tuple):
-            x_trans = tuple(self.transform(elem) for elem in x)
+            # local and global halves share the spatial shape, hence the cached pads and grids;
+            # int elements are the FFC placeholders for an absent part
+            x_trans = tuple(self.transform(elem) if torch.is_tensor(elem) else elem for elem in x)
             y_trans = self.impl(x_trans)
-            return tuple(self.inverse_transform(elem, orig_x) for elem, orig_x in zip(y_trans, x))
+            orig_x = next(elem for elem in x if torch.is_tensor(elem))
+            return tuple(self.inverse_transform(elem, orig_x) if torch.is_tensor(elem) else elem
+                         for elem in y_trans)
         else:
             raise ValueError(f'Unexpected input type {type(x)}')
 
+    def train(self, mode=True):
+        self._grid_cache.clear()
+        return super().train(mode)
+
+    def _load_from_state_dict(self, *args, **kwargs):
+        self._grid_cache.clear()
+        super()._load_from_state_dict(*args, **kwargs)
+
     def transform(self, x):
-        height, width = x.shape[2:]
-        pad_h, pad_w = int(height * self.pad_coef), int(width * self.pad_coef)
+        pad_h, pad_w, grids = self._get_pads_and_grids(x)
         x_padded = F.pad(x, [pad_w, pad_w, pad_h, pad_h], mode='reflect')
-        x_padded_rotated = rotate(x_padded, angle=self.angle.to(x_padded))
-        return x_padded_rotated
+        if grids is None:
+            return rotate(x_padded, angle=self.angle.to(x_padded))
+        return self._sample(x_padded, grids[0])
 
     def inverse_transform(self, y_padded_rotated, orig_x):
-        height, width = orig_x.shape[2:]
-        pad_h, pad_w = int(height * self.pad_coef), int(width * self.pad_coef)
+        pad_h, pad_w, grids = self._get_pads_and_grids(orig_x)
 
-        y_padded = rotate(y_padded_rotated, angle=-self.angle.to(y_padded_rotated))
+        if grids is None:
+            y_padded = rotate(y_padded_rotated, angle=-self.angle.to(y_padded_rotated))
+        else:
+            y_padded = self._sample(y_padded_rotated, grids[1])
         y_height, y_width = y_padded.shape[2:]
         y = y_padded[:, :, pad_h : y_height - pad_h, pad_w : y_width - pad_w]
         return y
 
+    def _get_pads(self, height, width):
+        if not self.tight_padding:
+            return int(height * self.pad_coef), int(width * self.pad_coef)
+        angle = math.radians(float(self.angle.detach()))
+        cos, sin = abs(math.cos(angle)), abs(math.sin(angle))
+        # half the growth of the rotated bounding box; reflect padding must stay below the input size, and a
+        # non-square input at a steep angle shrinks along one axis (negative growth would crop the output)
+        pad_h = max(0, min(math.ceil((width * sin + height * cos - height) / 2), height - 1))
+        pad_w = max(0, min(math.ceil((width * cos + height * sin - width) / 2), width - 1))
+        return pad_h, pad_w
+
+    def _get_pads_and_grids(self, x):
+        height, width = x.shape[2:]
+        frozen = not self.training and not (torch.is_grad_enabled() and self.angle.requires_grad)
+        if not (self.cache_grids and frozen):
+            return self._get_pads(height, width) + (None,)
+
+        key = (height, width, x.device, x.dtype)
+        if key not in self._grid_cache:
+            pad_h, pad_w = self._get_pads(height, width)
+            angle = self.angle.detach().to(device=x.device, dtype=torch.float32)
+            padded_height, padded_width = height + 2 * pad_h, width + 2 * pad_w
+            grids = tuple(_rotation_grid(a, padded_height, padded_width).to(x.dtype) for a in (angle, -angle))
+            self._grid_cache[key] = (pad_h, pad_w, grids)
+        return self._grid_cache[key]
+
+    @staticmethod
+    def _sample(x, grid):
+        return F.grid_sample(x, grid.expand(x.shape[0], -1, -1, -1), mode='bilinear', padding_mode='zeros',
+                             align_corners=True)
+
 
 if __name__ == '__main__':
+    # tight padding keeps the output shape for non-square inputs at every angle
+    tight = LearnableSpatialTransformWrapper(nn.Identity(), tight_padding=True, train_angle=False).eval()
+    for shape in [(1, 3, 20, 28), (1, 3, 28, 20), (2, 3, 7, 31)]:
+        x = torch.rand(shape)
+        for angle in range(0, 181, 5):
+            tight.angle = torch.tensor([float(angle)])
+            tight._grid_cache.clear()
+            assert tight(x).shape == x.shape, (shape, angle, tight(x).shape)
+
     layer = LearnableSpatialTransformWrapper(nn.Identity())
     x = torch.arange(2* 3 * 15 * 15).view(2, 3, 15, 15).float()
     y = layer(x)
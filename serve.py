@@ -0,0 +1,206 @@
+"""
+멀티 프로세스 서빙 — 모델 가중치는 한 벌만.
+부모가 main 앱을 import 하고 generator 를 미리 로드해 가중치를 공유 메모리로 옮긴 뒤, 리슨 소켓을 열고 워커를 fork 한다.
+워커들은 같은 가중치 페이지를 보므로 워커 수를 늘려도 모델 메모리는 거의 그대로다.
+(uvicorn --workers 는 워커를 spawn 해서 각자 체크포인트를 로드한다)
+
+    python serve.py --workers 4 --port 8000
+    python serve.py --workers 4 --report-interval 30 --report-json worker_memory.json
+
+워커마다 메트릭 레지스트리가 따로라, 워커 번호(0..N-1, 다시 fork 해도 같은 번호)를 worker 라벨로 붙이고
+--metrics-dir 로 값을 나눠 /metrics 를 어느 워커가 받든 전 워커 시리즈가 나오게 한다 (modules/metrics.py).
+"""
+from __future__ import annotations
+
+import argparse
+import ctypes
+import gc
+import json
+import os
+import signal
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import traceback
+
+import torch
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=None, help="워커당 torch 스레드 수 (기본: 코어 수 / 워커 수)")
+    parser.add_argument("--no-share", action="store_true", help="가중치를 공유 메모리로 옮기지 않음 (fork CoW 만)")
+    parser.add_argument("--per-worker-load", action="store_true",
+                        help="비교용: 부모에서 로드하지 않고 워커마다 따로 로드 (uvicorn --workers 와 같은 메모리 모양)")
+    parser.add_argument("--report-interval", type=float, default=60.0, help="워커 메모리 리포트 주기(초), 0 이면 끔")
+    parser.add_argument("--report-json", default=None, help="최근 리포트를 쓸 JSON 경로")
+    parser.add_argument("--metrics-dir", default=None,
+                        help="워커 메트릭을 나누는 디렉토리 (기본: 임시 디렉토리, 끝나면 지움)")
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args()
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, config_path: str, sock: socket.socket, args, slot: int) -> None:
+    import uvicorn
+
+    from modules.metrics import REGISTRY
+
+    REGISTRY.share(args.metrics_dir, str(slot))
+    torch.set_num_threads(args.threads)
+    if args.per_worker_load:
+        from modules.predict_lama import preload_model
+        preload_model(config_path)
+        _trim_heap()
+    # 표준 크기 워밍업을 accept 전에 끝낸다 — 공유 소켓이라 뜨자마자 accept 하면 첫 요청이 그 비용을 낸다
+    from main import warm_up
+    warm_up()
+    server = uvicorn.Server(uvicorn.Config(app, log_level=args.log_level))
+    server.run(sockets=[sock])
+
+
+def _fork_worker(app, config_path: str, sock: socket.socket, args, slot: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            _run_worker(app, config_path, sock, args, slot)
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+        os._exit(0)
+    return pid
+
+
+def _trim_heap() -> None:
+    """로드 중에 쓰고 버린 힙(체크포인트 state dict, 공유 메모리로 옮기기 전 가중치)을 OS 에 돌려준다 (glibc)."""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def memory_report(pids) -> dict:
+    """
+    부모·워커별 rss/pss/uss/shared (bytes) 와 합계 (부모 포함).
+    공유 가중치는 RSS 에는 프로세스마다 잡히고, PSS 합계에는 한 번만 잡힌다.
+    """
+    from modules.procmem import memory_usage
+
+    workers = {}
+    for pid in pids:
+        try:
+            workers[pid] = memory_usage(pid)
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    parent = memory_usage()
+    total = {}
+    for usage in [parent, *workers.values()]:
+        for key, value in usage.items():
+            total[key] = total.get(key, 0) + value
+    return {"time": time.time(), "parent": parent, "workers": workers, "total": total}
+
+
+def _print_report(report) -> None:
+    mb = 2 ** 20
+    lines = [f"{'pid':>8} {'rss MB':>9} {'pss MB':>9} {'uss MB':>9} {'shared MB':>10}"]
+    rows = [("parent", report["parent"]), *sorted(report["workers"].items()), ("total", report["total"])]
+    for pid, usage in rows:
+        lines.append(f"{pid:>8} {usage.get('rss', 0) / mb:>9.1f} {usage.get('pss', 0) / mb:>9.1f} "
+                     f"{usage.get('uss', 0) / mb:>9.1f} {usage.get('shared', 0) / mb:>10.1f}")
+    print("\n".join(lines), file=sys.stderr, flush=True)
+
+
+def main():
+    args = _parse_args()
+    if args.threads is None:
+        args.threads = max(1, (os.cpu_count() or 1) // args.workers)
+    # 부모는 로드만 하므로 스레드 풀을 만들지 않는다 (fork 전에 OpenMP 풀이 생기면 워커에서 멈출 수 있음)
+    torch.set_num_threads(1)
+
+    import main as app_module
+    from modules.predict_lama import preload_model
+
+    config_path = str(app_module.LAMA_CONFIG_PATH)
+    if not args.per_worker_load:
+        preload_model(config_path, share_memory=not args.no_share)
+        _trim_heap()
+
+    own_metrics_dir = args.metrics_dir is None
+    if own_metrics_dir:
+        args.metrics_dir = tempfile.mkdtemp(prefix="characters-metrics-")
+    else:
+        # 지난 실행의 워커 덤프가 남아 있으면 지금 워커 수보다 많은 시리즈가 나온다
+        os.makedirs(args.metrics_dir, exist_ok=True)
+        for name in os.listdir(args.metrics_dir):
+            if name.endswith(".json"):
+                os.unlink(os.path.join(args.metrics_dir, name))
+
+    sock = _bind(args.host, args.port)
+    workers = {_fork_worker(app_module.app, config_path, sock, args, slot): slot for slot in range(args.workers)}
+    print(f"serving on {args.host}:{args.port} with workers {sorted(workers)}", file=sys.stderr, flush=True)
+
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    next_report = time.monotonic() + args.report_interval
+    while not stopping:
+        # 죽은 워커는 다시 fork (가중치는 여전히 부모의 공유 메모리)
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if not pid:
+                break
+            if pid in workers:
+                slot = workers.pop(pid)
+                workers[_fork_worker(app_module.app, config_path, sock, args, slot)] = slot
+
+        if args.report_interval > 0 and time.monotonic() >= next_report:
+            next_report += args.report_interval
+            report = memory_report(workers)
+            _print_report(report)
+            if args.report_json:
+                with open(args.report_json, "w", encoding="utf-8") as f:
+                    json.dump(report, f, indent=2)
+        time.sleep(0.2)
+
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in workers:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+    if own_metrics_dir:
+        shutil.rmtree(args.metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()